@@ -0,0 +1,299 @@
+"""Benchmark das etapas críticas do painel sobre bases sintéticas.
+
+Gera bases no mesmo formato de ``kc_house_data_updat.csv`` (20 mil,
+1 milhão ou 10 milhões de vendas, sorteadas da base real com ruído) e
+mede, para cada etapa, o tempo de parede (melhor de N repetições), o pico
+de memória alocada (tracemalloc) e o tamanho do payload enviado ao
+navegador (mapa e PNGs). O resultado pode ser gravado como linha de base
+e comparado com ela nas execuções seguintes.
+
+A linha de base versionada em ``baseline.json`` guarda só o pico de
+memória e o payload, que não dependem da máquina; o tempo é informativo.
+Para acusar regressões de tempo, grave uma linha de base na própria
+máquina com ``--tempo`` (fora do repositório, via ``--baseline``) e compare
+com ela. Sem linha de base para alguma etapa medida, a execução termina
+com erro, a menos que ``--salvar-baseline`` seja passado.
+
+Uso:
+    python benchmarks/benchmark.py --tamanhos 20k 1m
+    python benchmarks/benchmark.py --tamanhos 20k --salvar-baseline
+    python benchmarks/benchmark.py --tempo --baseline ~/house_rocket_tempos.json --salvar-baseline
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+PASTA_DADOS = Path(__file__).resolve().parent / ".dados"
+BASELINE_PADRAO = Path(__file__).resolve().parent / "baseline.json"
+TAMANHOS = {"20k": 20_000, "1m": 1_000_000, "10m": 10_000_000}
+# Muda quando ``gerar_base`` passa a gerar outra base (as já geradas são refeitas)
+VERSAO_GERADOR = 2
+# Aumento de pico abaixo deste valor não é regressão (ruído de etapas que quase não alocam)
+FOLGA_PICO_MB = 1.0
+
+# O cache Arrow das bases sintéticas não deve se misturar ao do painel
+os.environ.setdefault("HOUSE_ROCKET_CACHE", str(Path(tempfile.gettempdir()) / "house_rocket_benchmark"))
+sys.path.insert(0, str(RAIZ))
+
+from house_rocket import graficos  # noqa: E402
+from house_rocket.agregados import construir_agregados  # noqa: E402
+from house_rocket.analise import selecao_geografica  # noqa: E402
+from house_rocket.cache import cache_compartilhado  # noqa: E402
+from house_rocket.dados import CSV_PADRAO, FORMATO_DATA, carregar_dados, garantir_cache, ler_csv  # noqa: E402
+from house_rocket.mapa import LIMITE_PONTOS, camada_mapa  # noqa: E402
+from house_rocket.reforma import MotorReforma, ajustar_modelo_reforma, estimar_uplift  # noqa: E402
+from house_rocket.sazonalidade import construir_cubo  # noqa: E402
+from house_rocket.triagem import CriteriosCompra, MotorTriagem  # noqa: E402
+
+
+# =========================================
+#           Bases sintéticas
+# =========================================
+
+def gerar_base(linhas, destino, semente=0, bloco=1_000_000):
+    """Grava ``linhas`` vendas sintéticas em ``destino`` no formato do CSV original."""
+    base = pd.read_csv(CSV_PADRAO)
+    datas = pd.to_datetime(base["date"], format=FORMATO_DATA)
+    inicio, dias = datas.min(), (datas.max() - datas.min()).days
+    rng = np.random.default_rng(semente)
+    tmp = destino.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for i, n in enumerate(range(0, linhas, bloco)):
+            n = min(bloco, linhas - n)
+            parte = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+            parte["date"] = (inicio + pd.to_timedelta(rng.integers(0, dias + 1, n), unit="D")).strftime(FORMATO_DATA)
+            parte["price"] = np.round(parte["price"] * rng.lognormal(0, 0.1, n), -2)
+            living = parte["sqft_living"].to_numpy()
+            for c in ("sqft_living", "sqft_lot"):
+                parte[c] = np.maximum(np.round(parte[c] * rng.lognormal(0, 0.05, n)), 300).astype("int64")
+            # porão e área acima do solo acompanham a área útil, mantendo a soma igual a ela
+            fator = parte["sqft_living"].to_numpy() / living
+            parte["sqft_basement"] = np.round(parte["sqft_basement"] * fator).astype("int64")
+            parte["sqft_above"] = parte["sqft_living"] - parte["sqft_basement"]
+            parte["lat"] = np.round(parte["lat"] + rng.normal(0, 0.002, n), 4)
+            parte["long"] = np.round(parte["long"] + rng.normal(0, 0.002, n), 3)
+            parte["log_price"] = np.log(parte["price"])
+            parte["log_sqft_living"] = np.log(parte["sqft_living"])
+            parte["log_sqft_lot"] = np.log(parte["sqft_lot"])
+            parte.to_csv(f, header=i == 0, index=False)
+    os.replace(tmp, destino)
+
+
+def base_sintetica(tamanho, semente=0):
+    """Caminho da base sintética do ``tamanho`` pedido, gerada uma única vez."""
+    PASTA_DADOS.mkdir(exist_ok=True)
+    destino = PASTA_DADOS / f"vendas_{tamanho}_{semente}_v{VERSAO_GERADOR}.csv"
+    if not destino.exists():
+        print(f"Gerando {destino.name} ...", flush=True)
+        gerar_base(TAMANHOS[tamanho], destino, semente)
+    return destino
+
+
+# =========================================
+#                 Etapas
+# =========================================
+# Cada etapa recebe o contexto (base carregada e objetos já montados) e
+# devolve o número de bytes do payload que produz (0 se não se aplica).
+
+def etapa_leitura_csv(ctx):
+    ler_csv(ctx["caminho"])
+    return 0
+
+
+def etapa_carga_arrow(ctx):
+    carregar_dados(ctx["caminho"])
+    return 0
+
+
+def etapa_agregados(ctx):
+    construir_agregados(ctx["df"])
+    return 0
+
+
+def etapa_triagem(ctx):
+    motor = MotorTriagem(ctx["df"], ctx["agregados"].mapear(ctx["df"]["zipcode"], "log_price_mean"))
+    motor.selecionar(CriteriosCompra(zipcodes=(98001,), limite=20))
+    motor.selecionar(CriteriosCompra(limite=0))
+    return 0
+
+
+def etapa_reforma(ctx):
+    ag = ctx["agregados"]
+    motor = MotorReforma(ctx["df"], ag.por_condicao["price_mean"], ag.por_grade["price_mean"])
+    motor.top_incrementos(10)
+    motor.top_cenario(1, 1, 10)
+    return 0
+
+
+def etapa_modelo_reforma(ctx):
+    estimar_uplift(ajustar_modelo_reforma(ctx["df"]), ctx["df"], 0, 1)
+    return 0
+
+
+def etapa_sazonalidade(ctx):
+    construir_cubo(ctx["df"], ctx["modelo"], "mes")
+    construir_cubo(ctx["df"], ctx["modelo"], "semana")
+    return 0
+
+
+def etapa_mapa(ctx):
+    import pydeck as pdk
+    df = ctx["df"]
+    casas = selecao_geografica(df, ctx["agregados"].mapear(df["zipcode"], "price_mean"))
+    layer, tooltip = camada_mapa(casas, LIMITE_PONTOS)
+    return len(pdk.Deck(layers=[layer], tooltip=tooltip).to_json().encode())
+
+
+def etapa_graficos(ctx):
+    ag = ctx["agregados"]
+    selecao = ctx["selecao"]
+    regioes = ag.por_zipcode["price_mean"].rename("price").reset_index().nlargest(10, "price")
+    cache_compartilhado().limpar()
+    futuros = [
+        graficos.renderizar(graficos.grafico_roi, selecao["ROI (%)"].to_numpy(), selecao.index.to_numpy()),
+        graficos.renderizar(graficos.grafico_top_regioes, regioes, 98001),
+        graficos.renderizar(graficos.grafico_preco_medio, ag.por_condicao.index, ag.por_condicao["price_mean"],
+                            "skyblue", "Preço Médio por Condição", "Condição"),
+        graficos.renderizar(graficos.grafico_incrementos, ctx["incrementos"]),
+    ]
+    return sum(len(f.result()) for f in futuros)
+
+
+ETAPAS = {
+    "leitura_csv": etapa_leitura_csv,
+    "carga_arrow": etapa_carga_arrow,
+    "agregados": etapa_agregados,
+    "triagem": etapa_triagem,
+    "reforma": etapa_reforma,
+    "modelo_reforma": etapa_modelo_reforma,
+    "sazonalidade": etapa_sazonalidade,
+    "mapa": etapa_mapa,
+    "graficos": etapa_graficos,
+}
+
+
+def preparar_contexto(caminho):
+    garantir_cache(caminho)
+    df = carregar_dados(caminho)
+    agregados = construir_agregados(df)
+    motor = MotorTriagem(df, agregados.mapear(df["zipcode"], "log_price_mean"))
+    reforma = MotorReforma(df, agregados.por_condicao["price_mean"], agregados.por_grade["price_mean"])
+    return {
+        "caminho": caminho,
+        "df": df,
+        "agregados": agregados,
+        "modelo": ajustar_modelo_reforma(df),
+        "selecao": motor.selecionar(CriteriosCompra(zipcodes=(98001,), limite=20)),
+        "incrementos": reforma.top_incrementos(10),
+    }
+
+
+def medir(etapa, ctx, repeticoes):
+    """Melhor tempo de ``repeticoes`` execuções, pico de memória e bytes do payload."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        payload = etapa(ctx)
+        tempos.append(time.perf_counter() - inicio)
+    tracemalloc.start()
+    etapa(ctx)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"tempo_s": min(tempos), "pico_mb": pico / 2**20, "payload_bytes": payload}
+
+
+# =========================================
+#          Comparação e relatório
+# =========================================
+
+def _razao(atual, ref, medida):
+    return atual[medida] / ref[medida] if ref and ref.get(medida) else None
+
+
+def comparar(resultados, baseline, tolerancia, com_tempo=False):
+    """Linhas do relatório e lista de regressões (ou etapas sem linha de base).
+
+    Pico de memória e payload são sempre comparados; o tempo, só com
+    ``com_tempo`` (linha de base gravada na mesma máquina).
+    """
+    linhas, regressoes = [], []
+    for tamanho, etapas in resultados.items():
+        for nome, atual in etapas.items():
+            ref = baseline.get(tamanho, {}).get(nome)
+            if ref is None:
+                regressoes.append(f"{tamanho}/{nome}: sem linha de base (use --salvar-baseline)")
+            razao_tempo = _razao(atual, ref, "tempo_s")
+            razao_pico = _razao(atual, ref, "pico_mb")
+            razao_payload = _razao(atual, ref, "payload_bytes")
+            linhas.append((tamanho, nome, atual, razao_tempo, razao_pico))
+            if razao_pico is not None and atual["pico_mb"] - ref["pico_mb"] <= FOLGA_PICO_MB:
+                razao_pico = None
+            verificar = [("memória", razao_pico), ("payload", razao_payload)]
+            if com_tempo:
+                if ref is not None and razao_tempo is None:
+                    regressoes.append(f"{tamanho}/{nome}: linha de base sem tempo (grave-a com --tempo)")
+                verificar.append(("tempo", razao_tempo))
+            for medida, razao in verificar:
+                if razao is not None and razao > 1 + tolerancia:
+                    regressoes.append(f"{tamanho}/{nome}: {medida} {razao:.2f}x a linha de base")
+    return linhas, regressoes
+
+
+def imprimir(linhas):
+    print(f"{'base':>5} {'etapa':<15} {'tempo (s)':>10} {'pico (MB)':>10} {'payload (KB)':>13} {'x tempo':>8} {'x pico':>7}")
+    for tamanho, nome, r, razao_tempo, razao_pico in linhas:
+        print(f"{tamanho:>5} {nome:<15} {r['tempo_s']:>10.3f} {r['pico_mb']:>10.1f} {r['payload_bytes'] / 1024:>13.1f}"
+              f" {razao_tempo or float('nan'):>8.2f} {razao_pico or float('nan'):>7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tamanhos", nargs="+", choices=TAMANHOS, default=["20k"])
+    parser.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS))
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PADRAO)
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava os resultados como nova linha de base")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="aumento relativo aceito antes de acusar regressão")
+    parser.add_argument("--tempo", action="store_true",
+                        help="grava e compara também o tempo (use uma linha de base desta máquina)")
+    parser.add_argument("--saida", type=Path, help="grava os resultados desta execução em JSON")
+    args = parser.parse_args(argv)
+
+    resultados = {}
+    for tamanho in args.tamanhos:
+        ctx = preparar_contexto(base_sintetica(tamanho, args.semente))
+        resultados[tamanho] = {nome: medir(ETAPAS[nome], ctx, args.repeticoes) for nome in args.etapas}
+        del ctx
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    linhas, regressoes = comparar(resultados, baseline, args.tolerancia, args.tempo)
+    imprimir(linhas)
+
+    if args.saida:
+        args.saida.write_text(json.dumps(resultados, indent=2))
+    if args.salvar_baseline:
+        # tempos absolutos só valem na máquina em que foram medidos
+        campos = ["pico_mb", "payload_bytes"] + (["tempo_s"] if args.tempo else [])
+        for tamanho, etapas in resultados.items():
+            baseline.setdefault(tamanho, {}).update(
+                {nome: {c: r[c] for c in campos} for nome, r in etapas.items()})
+        args.baseline.write_text(json.dumps(baseline, indent=2))
+        print(f"Linha de base gravada em {args.baseline}")
+        return 0
+    for r in regressoes:
+        print("REGRESSÃO:", r)
+    return 1 if regressoes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
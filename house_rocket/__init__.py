@@ -0,0 +1,5 @@
+"""Núcleo de análise do House Rocket.
+
+Os módulos deste pacote não dependem do Streamlit: o painel (index.py)
+apenas os chama e exibe os resultados.
+"""
@@ -0,0 +1,160 @@
+"""Agregados de preço por CEP, condição, qualidade e mês.
+
+Os agregados são guardados como somas (contagem, soma, soma dos quadrados,
+soma dos logs), de modo que podem ser combinados entre partes dos dados e
+atualizados quando novas vendas chegam; médias e desvios são derivados
+dessas somas. A mediana por CEP não é combinável e é guardada à parte.
+Junto das somas fica o esboço de quantis por CEP (``qualidade``), também
+combinável, de onde saem a média aparada e os percentis 10 e 90.
+
+Mediana, média aparada e percentis deixam de fora as vendas marcadas por
+``qualidade`` (impossíveis, duplicadas e de preço extremo). Médias, desvios
+e contagens usam todas as vendas: são a base de comparação original e
+continuam somas simples, atualizadas sem reavaliar as marcas.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from house_rocket.qualidade import (
+    esboco_por_zipcode,
+    media_aparada_do_esboco,
+    quantis_do_esboco,
+    verificar_qualidade,
+)
+
+
+COLUNAS_SOMA = ["n", "soma_price", "soma_price2", "soma_log_price", "soma_price_sqft"]
+
+# Estatística regional de preço -> coluna de ``Agregados.por_zipcode``
+ESTATISTICAS_REGIONAIS = {
+    "media": "price_mean",
+    "mediana": "price_median",
+    "media_aparada": "price_trimmed_mean",
+}
+
+# Agrupamentos mantidos como somas
+CHAVES = {
+    "zipcode": ["zipcode"],
+    "zipcode_ano": ["zipcode", "year"],
+    "zipcode_mes": ["zipcode", "month"],
+    "condition": ["condition"],
+    "grade": ["grade"],
+    "mes": ["month"],
+}
+
+
+def _com_mes(df):
+    if "month" in df.columns:
+        return df
+    return df.assign(month=df["date"].dt.month.astype("int8"))
+
+
+def somas_por_grupo(df, chaves):
+    """Contagem e somas de preço agrupadas por ``chaves``."""
+    chaves = [chaves] if isinstance(chaves, str) else list(chaves)
+    price = df["price"].to_numpy(dtype="float64")
+    base = pd.DataFrame({
+        "n": np.ones(len(df), dtype="int64"),
+        "soma_price": price,
+        "soma_price2": price * price,
+        # log1p, igual ao usado na seleção de compra
+        "soma_log_price": np.log1p(price),
+        "soma_price_sqft": price / df["sqft_living"].to_numpy(dtype="float64"),
+    })
+    somas = base.groupby([df[c].to_numpy() for c in chaves]).sum()
+    somas.index.names = chaves
+    return somas
+
+
+def calcular_somas(df):
+    """Somas de todos os agrupamentos de ``CHAVES`` e o esboço de quantis por CEP."""
+    df = _com_mes(df)
+    somas = {nome: somas_por_grupo(df, chaves) for nome, chaves in CHAVES.items()}
+    somas["esboco_zipcode"] = esboco_por_zipcode(df)
+    return somas
+
+
+def combinar_somas(a, b):
+    """Soma dois conjuntos de somas (ex.: base armazenada + vendas novas)."""
+    return {
+        nome: a[nome].add(b[nome], fill_value=0).astype(a[nome].dtypes.to_dict())
+        for nome in a
+    }
+
+
+def medianas_por_zipcode(df):
+    """Mediana do preço por CEP, sem as vendas excluídas ou de preço extremo."""
+    marcas = verificar_qualidade(df)
+    validas = ~(marcas["excluir"] | marcas["preco_extremo"]).to_numpy()
+    return df.loc[validas].groupby("zipcode")["price"].median()
+
+
+def estatisticas(somas):
+    """Deriva contagem, média, desvio padrão, média do log e preço/sqft das somas."""
+    n = somas["n"]
+    media = somas["soma_price"] / n
+    var = (somas["soma_price2"] - n * media ** 2) / (n - 1)
+    return pd.DataFrame({
+        "count": n,
+        "price_mean": media,
+        "price_std": np.sqrt(var.clip(lower=0)),
+        "log_price_mean": somas["soma_log_price"] / n,
+        "price_sqft_mean": somas["soma_price_sqft"] / n,
+    })
+
+
+@dataclass
+class Agregados:
+    """Tabelas de agregados compartilhadas pelas abas do painel.
+
+    ``por_zipcode`` é indexada por zipcode; ``por_ano`` e ``por_mes`` por
+    (zipcode, year) e (zipcode, month), com o mês do ano da venda;
+    ``por_condicao``, ``por_grade`` e ``por_mes_geral`` por condition, grade
+    e month.
+    """
+    por_zipcode: pd.DataFrame
+    por_ano: pd.DataFrame
+    por_mes: pd.DataFrame
+    por_condicao: pd.DataFrame
+    por_grade: pd.DataFrame
+    por_mes_geral: pd.DataFrame
+
+    def mapear(self, zipcodes, coluna):
+        """Valor de ``coluna`` de ``por_zipcode`` para cada zipcode informado."""
+        return self.por_zipcode[coluna].reindex(zipcodes).to_numpy()
+
+    def referencia(self, zipcodes, estatistica="media"):
+        """Preço de referência do CEP de cada venda pela ``estatistica`` regional."""
+        return self.mapear(zipcodes, ESTATISTICAS_REGIONAIS[estatistica])
+
+    def referencia_log(self, zipcodes, estatistica="media"):
+        """log1p do preço de referência; na média, a média do log1p (como na triagem original)."""
+        if estatistica == "media":
+            return self.mapear(zipcodes, "log_price_mean")
+        return np.log1p(self.referencia(zipcodes, estatistica))
+
+
+def agregados_de_somas(somas, medianas):
+    """Monta os ``Agregados`` a partir das somas e das medianas por CEP."""
+    por_zipcode = estatisticas(somas["zipcode"])
+    por_zipcode.insert(2, "price_median", medianas.reindex(por_zipcode.index))
+    esboco = somas["esboco_zipcode"]
+    por_zipcode.insert(3, "price_trimmed_mean", media_aparada_do_esboco(esboco).reindex(por_zipcode.index))
+    quantis = quantis_do_esboco(esboco, (0.1, 0.9)).reindex(por_zipcode.index)
+    por_zipcode.insert(4, "price_p10", quantis[0.1])
+    por_zipcode.insert(5, "price_p90", quantis[0.9])
+    return Agregados(
+        por_zipcode=por_zipcode,
+        por_ano=estatisticas(somas["zipcode_ano"])[["count", "price_mean"]],
+        por_mes=estatisticas(somas["zipcode_mes"])[["count", "price_mean"]],
+        por_condicao=estatisticas(somas["condition"]),
+        por_grade=estatisticas(somas["grade"]),
+        por_mes_geral=estatisticas(somas["mes"]),
+    )
+
+
+def construir_agregados(df):
+    """Calcula todos os agregados a partir do conjunto de vendas."""
+    return agregados_de_somas(calcular_somas(df), medianas_por_zipcode(df))
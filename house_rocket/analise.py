@@ -0,0 +1,101 @@
+"""Análise completa sem interface: triagem, agregados, sazonalidade,
+valorização por reforma e seleção geográfica.
+
+Usado pela linha de comando (``python -m house_rocket``) e pelo painel.
+Nada aqui importa Streamlit, plotly, pydeck ou seaborn.
+"""
+import numpy as np
+
+from house_rocket.agregados import ESTATISTICAS_REGIONAIS
+from house_rocket.comparaveis import AvaliadorComparaveis
+from house_rocket.dados import CSV_PADRAO, carregar_dados
+from house_rocket.espacial import IndiceEspacial
+from house_rocket.ingestao import agregados_armazenados
+from house_rocket.instrumentacao import etapa
+from house_rocket.qualidade import verificar_qualidade
+from house_rocket.reforma import MotorReforma, ajustar_modelo_reforma, estimar_uplift
+from house_rocket.sazonalidade import construir_cubo
+from house_rocket.triagem import COLUNAS_SAIDA, CriteriosCompra, MotorTriagem
+
+
+BASES_ROI = tuple(ESTATISTICAS_REGIONAIS) + ("comparaveis",)
+
+MARCAS_QUALIDADE = ["valor_impossivel", "duplicada", "revenda", "preco_extremo"]
+
+
+def referencia_roi(df, agregados, base_roi="media"):
+    """log1p do preço de referência do ROI: estatística regional do CEP ou valor dos comparáveis."""
+    if base_roi in ESTATISTICAS_REGIONAIS:
+        return agregados.referencia_log(df["zipcode"], base_roi)
+    if base_roi == "comparaveis":
+        return np.log1p(AvaliadorComparaveis(df).avaliar(df, excluir_proprio=True)["valor_justo"].to_numpy())
+    raise ValueError(f"base do ROI desconhecida: {base_roi!r}")
+
+
+def selecao_geografica(df, media_regional, janela=None, indice=None, condition_min=3, grade_min=7):
+    """Casas abaixo do preço médio do CEP, em boas condições, dentro da janela.
+
+    ``janela`` é (lat_min, lat_max, long_min, long_max); sem janela, vale a
+    região toda. ``indice`` é um ``IndiceEspacial`` já montado sobre ``df``.
+    """
+    media_regional = np.asarray(media_regional, dtype="float64")
+    mascara = df["price"].to_numpy() < media_regional
+    mascara &= df["condition"].to_numpy() >= condition_min
+    mascara &= df["grade"].to_numpy() >= grade_min
+    if janela is not None:
+        indice = indice or IndiceEspacial(df["lat"], df["long"])
+        na_area = np.zeros(len(df), dtype=bool)
+        na_area[indice.janela(*janela)] = True
+        mascara &= na_area
+    return df[mascara].assign(avg_price_region=media_regional[mascara])
+
+
+def vendas_marcadas(df, marcas):
+    """Vendas com alguma marca de qualidade, com data, preço e CEP."""
+    marcadas = marcas[marcas[MARCAS_QUALIDADE].any(axis=1)]
+    return df.loc[marcadas.index, ["date", "price", "zipcode"]].join(marcadas)
+
+
+def executar_analise(caminho=CSV_PADRAO, criterios=CriteriosCompra(), base_roi="media",
+                     janela=None, niveis_condicao=0, niveis_grade=1):
+    """Todas as tabelas da análise para as vendas em ``caminho``.
+
+    Devolve um dicionário nome -> DataFrame. A seleção geográfica usa a
+    mesma estatística regional do ROI (a média, com a base de comparáveis).
+    """
+    with etapa("carga"):
+        df = carregar_dados(caminho)
+    with etapa("qualidade"):
+        marcas = verificar_qualidade(df)
+    with etapa("agregados"):
+        agregados = agregados_armazenados(caminho)
+    with etapa("triagem"):
+        candidatos = MotorTriagem(df, referencia_roi(df, agregados, base_roi)).selecionar(criterios)
+
+    with etapa("modelo_hedonico"):
+        modelo = ajustar_modelo_reforma(df)
+    with etapa("sazonalidade"):
+        cubo = construir_cubo(df, modelo, "mes")
+    with etapa("reforma"):
+        uplift = estimar_uplift(modelo, df, niveis_condicao, niveis_grade)
+        uplift.insert(0, "zipcode", df["zipcode"].to_numpy())
+        uplift.insert(1, "condition", df["condition"].to_numpy())
+        uplift.insert(2, "grade", df["grade"].to_numpy())
+        reforma = MotorReforma(df, agregados.por_condicao["price_mean"], agregados.por_grade["price_mean"])
+    with etapa("selecao_geografica"):
+        estatistica = base_roi if base_roi in ESTATISTICAS_REGIONAIS else "media"
+        geografica = selecao_geografica(df, agregados.referencia(df["zipcode"], estatistica), janela)
+
+    return {
+        "candidatos": candidatos,
+        "agregados_zipcode": agregados.por_zipcode,
+        "agregados_condicao": agregados.por_condicao,
+        "agregados_grade": agregados.por_grade,
+        "sazonalidade_mercado": cubo.serie(),
+        "sazonalidade_zipcode": cubo.tabela(),
+        "perfil_sazonal": cubo.perfil_mes_do_ano().to_frame(),
+        "incrementos_reforma": reforma.top_incrementos(10),
+        "uplift_reforma": uplift,
+        "selecao_geografica": geografica[COLUNAS_SAIDA],
+        "qualidade": vendas_marcadas(df, marcas),
+    }
@@ -0,0 +1,397 @@
+"""Cache de resultados derivados, com limite de memória, LRU e TTL.
+
+Guarda agregados, candidatos da triagem, estimativas e PNGs de gráficos
+numa memória limitada em bytes, com despejo do item menos usado e validade
+opcional. As chaves incluem a versão dos dados quando o chamador a passa
+como argumento (como fazem todos os carregadores do painel). Com a camada
+em disco ligada, os resultados também são gravados em pickle numa pasta
+comum, de modo que vários processos do painel no mesmo servidor
+reaproveitam o que um deles já calculou.
+
+Os valores em memória são compartilhados entre sessões, sem cópia: quem
+os recebe não deve alterá-los (com o copy-on-write do pandas, alterações
+em DataFrames derivados não os afetam).
+
+O tamanho de cada item (``tamanho_de``) não inclui o que ele só referencia
+e que vive fora do cache: objetos marcados com ``compartilhado`` (o
+DataFrame mapeado do painel) e arrays que apontam para as páginas do
+arquivo Arrow.
+"""
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from house_rocket.dados import DIR_CACHE
+
+
+LIMITE_MB_PADRAO = int(os.environ.get("HOUSE_ROCKET_CACHE_MB", 512))
+TTL_PADRAO = float(os.environ["HOUSE_ROCKET_CACHE_TTL"]) if os.environ.get("HOUSE_ROCKET_CACHE_TTL") else None
+PASTA_DISCO = DIR_CACHE / "resultados"
+LIMITE_DISCO_MB_PADRAO = int(os.environ.get("HOUSE_ROCKET_CACHE_DISCO_MB", 2048))
+LIMITE_MEMO_MB_PADRAO = 16
+
+# id -> referência fraca dos objetos marcados com ``compartilhado``
+_compartilhados = {}
+
+# Bytes por nó de uma árvore ``cKDTree`` (estrutura C ``ckdtreenode``)
+BYTES_NO_KDTREE = 72
+
+
+def assinatura(*valores):
+    """Hash estável de dados (DataFrame/Series/array) e parâmetros simples."""
+    h = hashlib.sha1()
+    for valor in valores:
+        if isinstance(valor, (pd.DataFrame, pd.Series)):
+            h.update(pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes())
+            nomes = valor.columns if isinstance(valor, pd.DataFrame) else [valor.name]
+            h.update(repr(list(nomes)).encode())
+        elif isinstance(valor, np.ndarray):
+            h.update(repr((valor.dtype.str, valor.shape)).encode())
+            h.update(np.ascontiguousarray(valor).tobytes())
+        elif isinstance(valor, (list, tuple)):
+            h.update(assinatura(*valor).encode())
+        else:
+            h.update(repr(valor).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def compartilhado(valor):
+    """Marca ``valor`` como mantido fora do cache: ``tamanho_de`` não o conta nos itens que o referenciam."""
+    chave = id(valor)
+    _compartilhados[chave] = weakref.ref(valor, lambda _: _compartilhados.pop(chave, None))
+    return valor
+
+
+def _memoria_externa(array):
+    """Se ``array`` aponta para memória fora do NumPy (buffer Arrow mapeado, mmap)."""
+    base = array
+    while isinstance(base, np.ndarray):
+        if base.base is None:
+            return False
+        base = base.base
+    return not isinstance(base, (bytes, bytearray))
+
+
+def _tamanho_nativo(valor, vistos):
+    """Bytes de tipos com armazenamento em C que ``__dict__`` não mostra; None para os demais."""
+    tipo = type(valor)
+    if tipo.__module__.startswith("scipy.spatial") and hasattr(valor, "indices"):
+        # cKDTree: cópia dos pontos, permutação dos índices e os nós da árvore
+        return (sys.getsizeof(valor) + tamanho_de(valor.data, vistos) + valor.indices.nbytes
+                + valor.size * BYTES_NO_KDTREE)
+    return None
+
+
+def tamanho_de(valor, _vistos=None):
+    """Bytes aproximados ocupados por ``valor`` na memória.
+
+    Objetos referenciados mais de uma vez contam uma vez; os marcados com
+    ``compartilhado`` e os arrays sobre memória externa não contam.
+    """
+    vistos = set() if _vistos is None else _vistos
+    if id(valor) in vistos or id(valor) in _compartilhados:
+        return 0
+    vistos.add(id(valor))
+    if isinstance(valor, MemoLimitado):
+        # o memo cresce depois que o dono entra no cache: conta o limite inteiro
+        return valor.limite_bytes
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True, index=True)
+        return int(uso.sum() if hasattr(uso, "sum") else uso)
+    if isinstance(valor, pd.Index):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return 0 if _memoria_externa(valor) else valor.nbytes
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return len(valor)
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamanho_de(v, vistos) for v in valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_de(v, vistos) for v in valor.values())
+    nativo = _tamanho_nativo(valor, vistos)
+    if nativo is not None:
+        return nativo
+    if hasattr(valor, "__dict__"):
+        return sys.getsizeof(valor) + tamanho_de(vars(valor), vistos)
+    return sys.getsizeof(valor)
+
+
+class MemoLimitado:
+    """Memo LRU limitado em bytes e seguro entre threads.
+
+    Para resultados intermediários de objetos guardados no cache e usados
+    por todas as sessões ao mesmo tempo (ex.: ``MotorCenarios``). Oferece
+    ``get``, atribuição, ``len`` e ``clear``, como um dicionário; ao ser
+    copiado (pickle), vai vazio.
+    """
+
+    def __init__(self, limite_mb=LIMITE_MEMO_MB_PADRAO):
+        self.limite_bytes = int(limite_mb * 2**20)
+        self._itens = OrderedDict()      # chave -> (valor, bytes)
+        self._bytes = 0
+        self._trava = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return padrao
+            self._itens.move_to_end(chave)
+            return item[0]
+
+    def __setitem__(self, chave, valor):
+        tamanho = tamanho_de(valor)
+        with self._trava:
+            if chave in self._itens:
+                self._bytes -= self._itens.pop(chave)[1]
+            if tamanho > self.limite_bytes:
+                return
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while self._bytes > self.limite_bytes:
+                _, (_, removido) = self._itens.popitem(last=False)
+                self._bytes -= removido
+
+    def __len__(self):
+        with self._trava:
+            return len(self._itens)
+
+    def clear(self):
+        with self._trava:
+            self._itens.clear()
+            self._bytes = 0
+
+    def __getstate__(self):
+        return {"limite_bytes": self.limite_bytes}
+
+    def __setstate__(self, estado):
+        self.__init__(estado["limite_bytes"] / 2**20)
+
+
+class CacheResultados:
+    """Cache LRU limitado em bytes, com TTL e camada opcional em disco."""
+
+    def __init__(self, limite_mb=LIMITE_MB_PADRAO, ttl=TTL_PADRAO, pasta=None, limite_disco_mb=LIMITE_DISCO_MB_PADRAO):
+        self.limite_bytes = int(limite_mb * 2**20)
+        self.ttl = ttl
+        self.pasta = pasta
+        self.limite_disco_bytes = int(limite_disco_mb * 2**20)
+        self._itens = OrderedDict()      # chave -> (valor, bytes, expira_em)
+        self._bytes = 0
+        self._trava = threading.RLock()
+        self._calculando = {}            # chave -> trava, para não calcular duas vezes
+        self.estatisticas = {"acertos": 0, "acertos_disco": 0, "falhas": 0, "despejos": 0}
+        if pasta is not None:
+            os.makedirs(pasta, exist_ok=True)
+
+    # -------------------------------------------------------------
+    # Memória
+    # -------------------------------------------------------------
+    def _expirado(self, expira_em):
+        return expira_em is not None and expira_em < time.monotonic()
+
+    def _despejar(self):
+        while self._bytes > self.limite_bytes and self._itens:
+            _, (_, tamanho, _) = self._itens.popitem(last=False)
+            self._bytes -= tamanho
+            self.estatisticas["despejos"] += 1
+
+    def _remover(self, chave):
+        _, tamanho, _ = self._itens.pop(chave)
+        self._bytes -= tamanho
+
+    def guardar(self, chave, valor, em_disco=True):
+        """Guarda ``valor``; itens maiores que o limite só vão para o disco."""
+        tamanho = tamanho_de(valor)
+        expira_em = time.monotonic() + self.ttl if self.ttl else None
+        with self._trava:
+            if chave in self._itens:
+                self._remover(chave)
+            if tamanho <= self.limite_bytes:
+                self._itens[chave] = (valor, tamanho, expira_em)
+                self._bytes += tamanho
+                self._despejar()
+        if em_disco and self.pasta is not None:
+            self._gravar_disco(chave, valor)
+
+    def _buscar(self, chave):
+        """(origem, valor): origem "memoria", "disco" ou None."""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None and not self._expirado(item[2]):
+                self._itens.move_to_end(chave)
+                return "memoria", item[0]
+            if item is not None:
+                self._remover(chave)
+        valor = self._ler_disco(chave)
+        if valor is not None:
+            self.guardar(chave, valor, em_disco=False)
+            return "disco", valor
+        return None, None
+
+    def _contar(self, origem):
+        chave = {"memoria": "acertos", "disco": "acertos_disco", None: "falhas"}[origem]
+        with self._trava:
+            self.estatisticas[chave] += 1
+
+    def obter(self, chave, padrao=None):
+        """Valor guardado em ``chave`` (memória, depois disco) ou ``padrao``."""
+        origem, valor = self._buscar(chave)
+        self._contar(origem)
+        return valor if origem is not None else padrao
+
+    def __contains__(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            return item is not None and not self._expirado(item[2])
+
+    def obter_ou_calcular(self, chave, funcao, *args, **kwargs):
+        """Valor em cache ou ``funcao(*args, **kwargs)``, calculado uma vez por chave."""
+        return self._obter_ou_calcular(chave, funcao, args, kwargs)
+
+    def _obter_ou_calcular(self, chave, funcao, args, kwargs, em_disco=True):
+        origem, valor = self._buscar(chave)
+        if origem is None:
+            with self._trava:
+                trava = self._calculando.setdefault(chave, threading.Lock())
+            with trava:
+                # outra thread pode ter calculado enquanto esta esperava
+                origem, valor = self._buscar(chave)
+                if origem is None:
+                    valor = funcao(*args, **kwargs)
+                    self.guardar(chave, valor, em_disco)
+            with self._trava:
+                self._calculando.pop(chave, None)
+        self._contar(origem)
+        return valor
+
+    def memorizar(self, funcao=None, *, nome=None, em_disco=True):
+        """Decorador: guarda o resultado pela assinatura dos argumentos.
+
+        As chaves começam por ``"<nome>:"``, e ``.clear()`` da função
+        decorada apaga só os resultados dela. Com ``em_disco=False`` o
+        resultado fica só na memória (objetos que guardam o DataFrame ou
+        estado alterado depois, como motores e modelos).
+        """
+        def decorar(funcao):
+            prefixo = f"{nome or f'{funcao.__module__}.{funcao.__qualname__}'}:"
+
+            @functools.wraps(funcao)
+            def chamada(*args, **kwargs):
+                chave = prefixo + assinatura(args, sorted(kwargs.items()))
+                return self._obter_ou_calcular(chave, funcao, args, kwargs, em_disco)
+            chamada.clear = functools.partial(self.limpar, prefixo)
+            return chamada
+        return decorar(funcao) if funcao is not None else decorar
+
+    def limpar(self, prefixo=None):
+        """Apaga tudo da memória ou, com ``prefixo``, só as chaves que começam por ele (memória e disco)."""
+        with self._trava:
+            if prefixo is None:
+                self._itens.clear()
+                self._bytes = 0
+                return
+            for chave in [c for c in self._itens if isinstance(c, str) and c.startswith(prefixo)]:
+                self._remover(chave)
+        if self.pasta is not None:
+            inicio = self._prefixo_arquivo(prefixo)
+            with os.scandir(self.pasta) as entradas:
+                for e in entradas:
+                    if e.name.startswith(inicio):
+                        try:
+                            os.remove(e.path)
+                        except OSError:
+                            pass
+
+    def uso(self):
+        """Bytes ocupados, limite e contadores."""
+        with self._trava:
+            return {"itens": len(self._itens), "bytes": self._bytes, "limite_bytes": self.limite_bytes,
+                    **self.estatisticas}
+
+    # -------------------------------------------------------------
+    # Disco (compartilhado entre processos)
+    # -------------------------------------------------------------
+    @staticmethod
+    def _prefixo_arquivo(prefixo):
+        return hashlib.sha1(prefixo.encode()).hexdigest()[:12] + "-"
+
+    def _arquivo(self, chave):
+        chave = str(chave)
+        # chaves de ``memorizar`` levam o hash do prefixo no nome, para ``limpar(prefixo)`` achá-las
+        inicio = self._prefixo_arquivo(chave[:chave.index(":") + 1]) if ":" in chave else ""
+        return os.path.join(self.pasta, inicio + hashlib.sha1(chave.encode()).hexdigest() + ".pkl")
+
+    def _ler_disco(self, chave):
+        if self.pasta is None:
+            return None
+        arquivo = self._arquivo(chave)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(arquivo) > self.ttl:
+                os.remove(arquivo)
+                return None
+            with open(arquivo, "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _gravar_disco(self, chave, valor):
+        arquivo = self._arquivo(chave)
+        tmp = f"{arquivo}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, arquivo)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._limitar_disco()
+
+    def _limitar_disco(self):
+        """Apaga os arquivos mais antigos enquanto a pasta passar do limite."""
+        arquivos = []
+        with os.scandir(self.pasta) as entradas:
+            for e in entradas:
+                if e.name.endswith(".pkl"):
+                    st = e.stat()
+                    arquivos.append((st.st_mtime, st.st_size, e.path))
+        total = sum(t for _, t, _ in arquivos)
+        for _, t, caminho in sorted(arquivos):
+            if total <= self.limite_disco_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            total -= t
+
+
+_compartilhado = None
+_trava_compartilhado = threading.Lock()
+
+
+def cache_compartilhado():
+    """Cache único do processo, configurado pelas variáveis de ambiente.
+
+    ``HOUSE_ROCKET_CACHE_MB`` (limite em memória, padrão 512),
+    ``HOUSE_ROCKET_CACHE_TTL`` (segundos, sem validade por padrão) e
+    ``HOUSE_ROCKET_CACHE_DISCO=1`` para ligar a camada em disco em
+    ``DIR_CACHE/resultados`` (limite ``HOUSE_ROCKET_CACHE_DISCO_MB``).
+    """
+    global _compartilhado
+    with _trava_compartilhado:
+        if _compartilhado is None:
+            disco = os.environ.get("HOUSE_ROCKET_CACHE_DISCO", "").lower() in ("1", "true", "sim")
+            _compartilhado = CacheResultados(pasta=PASTA_DISCO if disco else None)
+        return _compartilhado
@@ -0,0 +1,79 @@
+"""Escolha da carteira de compra sob orçamento e limite de concentração.
+
+Dado o conjunto de candidatos da triagem, a decisão é qual subconjunto
+comprar: cada casa tem custo (preço) e lucro esperado na revenda, o
+capital total é limitado e cada CEP pode receber no máximo um número de
+casas. É uma mochila com restrições de grupo; o solver guloso pela razão
+lucro/custo, comparado com o melhor item isolado, garante ao menos metade
+do ótimo quando não há limite por CEP e roda em O(n log n) sobre dezenas
+de milhares de candidatos.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class Carteira:
+    """Posições escolhidas (na ordem de entrada) e totais da carteira."""
+    posicoes: np.ndarray
+    custo_total: float
+    lucro_total: float
+
+
+def otimizar_carteira(custo, lucro, grupos, orcamento, max_por_grupo=0):
+    """Subconjunto de itens com maior lucro dentro do orçamento.
+
+    ``grupos`` identifica o CEP de cada item; ``max_por_grupo`` limita
+    quantos itens de um mesmo grupo entram (0 = sem limite). Itens sem lucro
+    positivo ou mais caros que o orçamento são descartados.
+    """
+    custo = np.asarray(custo, dtype="float64")
+    lucro = np.asarray(lucro, dtype="float64")
+    _, grupo = np.unique(np.asarray(grupos), return_inverse=True)
+
+    elegiveis = np.flatnonzero((lucro > 0) & (custo > 0) & (custo <= orcamento))
+    if len(elegiveis) == 0:
+        return Carteira(np.empty(0, dtype="int64"), 0.0, 0.0)
+    if max_por_grupo <= 0 and custo[elegiveis].sum() <= orcamento:
+        # todos cabem: nada a escolher
+        return Carteira(elegiveis, float(custo[elegiveis].sum()), float(lucro[elegiveis].sum()))
+
+    # Guloso pela razão lucro/custo (desempate pelo maior lucro)
+    ordem = elegiveis[np.lexsort((-lucro[elegiveis], -lucro[elegiveis] / custo[elegiveis]))]
+    limite = max_por_grupo if max_por_grupo > 0 else len(custo)
+    por_grupo = np.zeros(grupo.max() + 1, dtype="int64")
+    # menor custo ainda disponível a partir de cada posição, para parar cedo
+    menor_restante = np.minimum.accumulate(custo[ordem][::-1])[::-1]
+    restante = float(orcamento)
+    escolhidos = []
+    for i, pos in enumerate(ordem.tolist()):
+        if restante < menor_restante[i]:
+            break
+        if custo[pos] <= restante and por_grupo[grupo[pos]] < limite:
+            escolhidos.append(pos)
+            restante -= custo[pos]
+            por_grupo[grupo[pos]] += 1
+
+    escolhidos = np.sort(np.array(escolhidos, dtype="int64"))
+    melhor_item = elegiveis[np.argmax(lucro[elegiveis])]
+    if lucro[melhor_item] > lucro[escolhidos].sum():
+        escolhidos = np.array([melhor_item])
+    return Carteira(escolhidos, float(custo[escolhidos].sum()), float(lucro[escolhidos].sum()))
+
+
+def carteira_de_candidatos(candidatos, orcamento, max_por_zipcode=0, fator_revenda=1.0):
+    """Carteira a partir do resultado de ``MotorTriagem.selecionar``.
+
+    O valor de revenda é o preço de referência (``avg_price_region``)
+    multiplicado por ``fator_revenda``, o índice sazonal do mês de revenda.
+    Devolve as linhas escolhidas com ``lucro_esperado`` e a ``Carteira``.
+    """
+    price = candidatos["price"].to_numpy(dtype="float64")
+    revenda = candidatos["avg_price_region"].to_numpy(dtype="float64") * fator_revenda
+    lucro = revenda - price
+    carteira = otimizar_carteira(price, lucro, candidatos["zipcode"].to_numpy(), orcamento, max_por_zipcode)
+    escolhidas = candidatos.iloc[carteira.posicoes].copy()
+    escolhidas["lucro_esperado"] = lucro[carteira.posicoes]
+    return escolhidas, carteira
@@ -0,0 +1,163 @@
+"""Cenários "e se": reavaliação rápida da carteira quando os parâmetros mudam.
+
+Um ``Cenario`` reúne os critérios de compra, o capital da carteira e o
+plano de reforma. O ``MotorCenarios`` mantém em memória o que não depende
+do cenário (motor de triagem e tabelas de reforma) e guarda os resultados
+intermediários: a triagem de cada faixa de CEP por filtro (``memo`` de
+``MotorTriagem.aprovadas``) e o ganho de reforma de cada caminho de
+níveis. Mudar só o ROI mínimo, o capital ou os CEPs reaproveita as faixas
+já avaliadas; mudar um filtro reavalia apenas as faixas dos CEPs pedidos.
+O motor fica no cache compartilhado e atende todas as sessões, então os
+dois memos são ``MemoLimitado`` (LRU limitado em bytes, com trava).
+
+``HistoricoCenarios`` guarda os cenários avaliados, um deles como base, e
+compara qualquer cenário com ela.
+"""
+import time
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from house_rocket.cache import MemoLimitado
+from house_rocket.carteira import otimizar_carteira
+from house_rocket.triagem import CriteriosCompra, top_k_decrescente
+
+
+@dataclass(frozen=True)
+class Cenario:
+    """Parâmetros de um cenário. Capitais iguais a 0 significam "sem limite"."""
+    criterios: CriteriosCompra = CriteriosCompra()
+    orcamento: float = 0.0
+    max_por_zipcode: int = 0
+    fator_revenda: float = 1.0
+    niveis_condicao: int = 0
+    niveis_grade: int = 0
+    orcamento_reforma: float = 0.0
+    custo_reforma: float = 0.0
+    nome: str = ""
+
+
+@dataclass
+class ResultadoCenario:
+    """Carteira escolhida no cenário, seus totais e o tempo de avaliação."""
+    cenario: Cenario
+    carteira: pd.DataFrame
+    resumo: dict
+    tempo_s: float = field(default=0.0)
+
+
+class MotorCenarios:
+    """Avalia cenários sobre um ``MotorTriagem`` (e um ``MotorReforma``, opcional)."""
+
+    def __init__(self, motor_triagem, motor_reforma=None):
+        self.triagem = motor_triagem
+        self.reforma = motor_reforma
+        self._memo_triagem = MemoLimitado()
+        self._ganhos = MemoLimitado()
+        self._posicao_reforma = pd.Index(motor_reforma.indice) if motor_reforma is not None else None
+
+    def ganho_reforma(self, indices, niveis_condicao, niveis_grade):
+        """Ganho esperado da reforma para as vendas ``indices`` (NaN sem nível de destino)."""
+        if self.reforma is None or (niveis_condicao == 0 and niveis_grade == 0):
+            return np.zeros(len(indices))
+        chave = (niveis_condicao, niveis_grade)
+        ganhos = self._ganhos.get(chave)
+        if ganhos is None:
+            ganhos = self.reforma.ganho_cenario(niveis_condicao, niveis_grade)
+            self._ganhos[chave] = ganhos
+        return ganhos[self._posicao_reforma.get_indexer(indices)]
+
+    def avaliar(self, cenario=Cenario()):
+        """Carteira do ``cenario`` com compra, reforma e lucro de cada casa."""
+        inicio = time.perf_counter()
+        sel, price, referencia, roi = self.triagem.pontuar(cenario.criterios, self._memo_triagem)
+        if cenario.criterios.limite > 0:
+            ordem = top_k_decrescente(roi, cenario.criterios.limite)
+            sel, price, referencia, roi = sel[ordem], price[ordem], referencia[ordem], roi[ordem]
+
+        # Carteira sobre os arrays; o DataFrame é montado só para as casas escolhidas
+        lucro_compra = referencia * cenario.fator_revenda - price
+        carteira = otimizar_carteira(price, lucro_compra, self.triagem.colunas["zipcode"][sel],
+                                     cenario.orcamento or np.inf, cenario.max_por_zipcode)
+        p = carteira.posicoes
+        escolhidas = self.triagem.tabela(sel[p], price[p], referencia[p], roi[p])
+        lucro_compra = lucro_compra[p]
+
+        # Reforma: casas da carteira cujo ganho supera o custo, as melhores que cabem no capital de reforma
+        ganho = self.ganho_reforma(escolhidas.index, cenario.niveis_condicao, cenario.niveis_grade)
+        lucro_reforma = np.nan_to_num(ganho, nan=-np.inf) - cenario.custo_reforma
+        reformaveis = np.flatnonzero(lucro_reforma > 0)
+        if cenario.orcamento_reforma > 0 and cenario.custo_reforma > 0:
+            quantas = int(cenario.orcamento_reforma // cenario.custo_reforma)
+            reformaveis = reformaveis[top_k_decrescente(lucro_reforma[reformaveis], quantas)] if quantas else reformaveis[:0]
+        reformar = np.zeros(len(escolhidas), dtype=bool)
+        reformar[reformaveis] = True
+
+        lucro = lucro_compra + np.where(reformar, lucro_reforma, 0.0)
+        resultado = escolhidas.assign(
+            lucro_compra=lucro_compra,
+            reformar=reformar,
+            ganho_reforma=np.where(reformar, ganho, 0.0),
+            lucro_esperado=lucro,
+        )
+        custo_reformas = reformar.sum() * cenario.custo_reforma
+        investido = carteira.custo_total + custo_reformas
+        resumo = {
+            "candidatos": len(sel),
+            "casas_carteira": len(resultado),
+            "casas_reformadas": int(reformar.sum()),
+            "capital_investido": float(investido),
+            "custo_reformas": float(custo_reformas),
+            "lucro_esperado": float(lucro.sum()),
+            "retorno_pct": float(lucro.sum() / investido * 100) if investido else 0.0,
+        }
+        return ResultadoCenario(cenario, resultado, resumo, time.perf_counter() - inicio)
+
+
+class HistoricoCenarios:
+    """Cenários avaliados, na ordem, com um deles marcado como base."""
+
+    def __init__(self):
+        self.resultados = []
+        self.base = None
+
+    def registrar(self, resultado, como_base=False):
+        self.resultados.append(resultado)
+        if como_base or self.base is None:
+            self.base = resultado
+        return resultado
+
+    def comparar(self, resultado, base=None):
+        """Totais lado a lado com a base e as casas que entraram e saíram da carteira.
+
+        Devolve (tabela, entraram, sairam); ``entraram``/``sairam`` são
+        índices das vendas.
+        """
+        base = base or self.base
+        if base is None:
+            base = resultado
+        tabela = pd.DataFrame({"base": pd.Series(base.resumo), "cenario": pd.Series(resultado.resumo)})
+        tabela["diferenca"] = tabela["cenario"] - tabela["base"]
+        entraram = resultado.carteira.index.difference(base.carteira.index)
+        sairam = base.carteira.index.difference(resultado.carteira.index)
+        return tabela, entraram, sairam
+
+    def tabela(self):
+        """Uma linha por cenário: nome, parâmetros que diferem do padrão, totais e tempo."""
+        padrao_cenario, padrao_criterios = asdict(Cenario()), asdict(CriteriosCompra())
+        linhas = []
+        for i, r in enumerate(self.resultados, 1):
+            parametros = asdict(r.cenario)
+            criterios = parametros.pop("criterios")
+            nome = parametros.pop("nome") or f"Cenário {i}"
+            mudancas = {k: v for k, v in criterios.items() if v != padrao_criterios[k]}
+            mudancas.update({k: v for k, v in parametros.items() if v != padrao_cenario[k]})
+            linhas.append({
+                "cenario": nome,
+                "base": r is self.base,
+                "parametros": ", ".join(f"{k}={v}" for k, v in mudancas.items()),
+                **r.resumo,
+                "tempo_ms": r.tempo_s * 1000,
+            })
+        return pd.DataFrame(linhas)
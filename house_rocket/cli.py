@@ -0,0 +1,122 @@
+"""Linha de comando: ``python -m house_rocket --entrada vendas.csv --saida resultados/``.
+
+Roda a análise completa sem interface e grava uma tabela por arquivo
+(Parquet, CSV ou JSON) na pasta de saída.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from house_rocket.analise import BASES_ROI, executar_analise
+from house_rocket.dados import CSV_PADRAO, PASTA_NOVAS_VENDAS
+from house_rocket.fora_da_memoria import TAMANHO_BLOCO, executar_analise_em_blocos
+from house_rocket.ingestao import ingerir_novas_vendas
+from house_rocket.instrumentacao import Medicoes, etapa
+from house_rocket.triagem import CriteriosCompra
+
+FORMATOS = ("parquet", "csv", "json")
+
+# Níveis de condição e de qualidade da valorização por reforma
+NIVEIS_PADRAO = (0, 1)
+
+
+def gravar_tabela(tabela, arquivo, formato):
+    """Grava ``tabela`` com o índice como coluna comum."""
+    tabela = tabela.reset_index()
+    if formato == "parquet":
+        tabela.to_parquet(arquivo, index=False)
+    elif formato == "csv":
+        tabela.to_csv(arquivo, index=False)
+    else:
+        tabela.to_json(arquivo, orient="records", date_format="iso")
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m house_rocket",
+        description="Gera as tabelas de análise da House Rocket sem abrir o painel.",
+    )
+    parser.add_argument("--entrada", type=Path, default=CSV_PADRAO,
+                        help="CSV de vendas no formato de kc_house_data_updat.csv")
+    parser.add_argument("--saida", type=Path, required=True, help="pasta onde as tabelas são gravadas")
+    parser.add_argument("--formato", choices=FORMATOS, default="parquet")
+    parser.add_argument("--novas-vendas", type=Path, nargs="?", const=PASTA_NOVAS_VENDAS, default=None,
+                        help="ingerir antes as vendas novas desta pasta (padrão: %(const)s)")
+    parser.add_argument("--em-blocos", type=int, nargs="?", const=TAMANHO_BLOCO, default=None, metavar="TAMANHO",
+                        help="ler a entrada (CSV, Parquet ou Arrow) em blocos de TAMANHO vendas, para bases "
+                             "maiores que a memória; gera triagem, agregados, sazonalidade e incrementos de reforma")
+    parser.add_argument("--metricas", type=Path, help="anexar tempo e memória de cada etapa a este arquivo JSONL")
+
+    triagem = parser.add_argument_group("critérios de compra")
+    triagem.add_argument("--base-roi", choices=BASES_ROI, default="media")
+    triagem.add_argument("--grade-min", type=int, default=7)
+    triagem.add_argument("--condition-min", type=int, default=3)
+    triagem.add_argument("--quartos", type=int, nargs="*", default=[3, 4])
+    triagem.add_argument("--banheiros-min", type=int, default=2)
+    triagem.add_argument("--zipcodes", type=int, nargs="*", default=[98001], help="vazio = todos os CEPs")
+    triagem.add_argument("--top-k-por-zipcode", type=int, default=0)
+    triagem.add_argument("--limite", type=int, default=20, help="0 = todas as casas aprovadas")
+
+    # Sem valor padrão no parser, para saber se foram passados (--em-blocos não os aceita)
+    outros = parser.add_argument_group("reforma e seleção geográfica (não disponíveis com --em-blocos)")
+    outros.add_argument("--niveis-condicao", type=int, help=f"padrão: {NIVEIS_PADRAO[0]}")
+    outros.add_argument("--niveis-grade", type=int, help=f"padrão: {NIVEIS_PADRAO[1]}")
+    outros.add_argument("--janela", type=float, nargs=4, metavar=("LAT_MIN", "LAT_MAX", "LONG_MIN", "LONG_MAX"))
+    return parser
+
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    if args.em_blocos is not None:
+        if args.base_roi == "comparaveis":
+            parser.error("--em-blocos não aceita --base-roi comparaveis")
+        passados = [opcao for opcao, valor in (("--niveis-condicao", args.niveis_condicao),
+                                                ("--niveis-grade", args.niveis_grade),
+                                                ("--janela", args.janela)) if valor is not None]
+        if passados:
+            parser.error(f"--em-blocos não gera valorização por reforma nem seleção geográfica; "
+                         f"remova {', '.join(passados)}")
+    inicio = time.perf_counter()
+    medicoes = Medicoes("cli").iniciar()
+
+    if args.novas_vendas is not None:
+        with etapa("ingestao"):
+            linhas = ingerir_novas_vendas(args.entrada, args.novas_vendas)
+        print(f"{linhas} vendas novas ingeridas de {args.novas_vendas}")
+
+    criterios = CriteriosCompra(
+        grade_min=args.grade_min,
+        condition_min=args.condition_min,
+        quartos=tuple(args.quartos),
+        banheiros_min=args.banheiros_min,
+        zipcodes=tuple(args.zipcodes),
+        top_k_por_zipcode=args.top_k_por_zipcode,
+        limite=args.limite,
+    )
+    if args.em_blocos is not None:
+        tabelas = executar_analise_em_blocos(args.entrada, criterios, args.em_blocos, base_roi=args.base_roi)
+    else:
+        tabelas = executar_analise(
+            args.entrada, criterios, args.base_roi,
+            janela=tuple(args.janela) if args.janela else None,
+            niveis_condicao=NIVEIS_PADRAO[0] if args.niveis_condicao is None else args.niveis_condicao,
+            niveis_grade=NIVEIS_PADRAO[1] if args.niveis_grade is None else args.niveis_grade,
+        )
+
+    args.saida.mkdir(parents=True, exist_ok=True)
+    for nome, tabela in tabelas.items():
+        arquivo = args.saida / f"{nome}.{args.formato}"
+        with etapa(f"gravar:{nome}"):
+            gravar_tabela(tabela, arquivo, args.formato)
+        print(f"{arquivo}: {len(tabela)} linhas")
+    medicoes.finalizar()
+    if args.metricas:
+        medicoes.exportar(args.metricas)
+    print(f"Concluído em {time.perf_counter() - inicio:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Avaliação por vendas comparáveis (k vizinhos mais próximos).
+
+Cada imóvel é representado por um vetor de características dividido por
+uma escala por característica, de modo que a distância euclidiana nesse
+espaço é a distância ponderada entre imóveis. Uma árvore k-d responde
+às consultas de todos os imóveis de uma vez. O valor justo é o preço por
+sqft dos k vizinhos (ponderado pelo inverso da distância) multiplicado
+pela área do imóvel.
+"""
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from house_rocket.espacial import KM_POR_GRAU
+
+
+# Diferença que conta como uma unidade de distância em cada característica
+ESCALAS = {
+    "km": 1.0,
+    "sqft_living": 250.0,
+    "grade": 1.0,
+    "condition": 1.0,
+    "bathrooms": 1.0,
+    "yr_built": 10.0,
+}
+
+
+class AvaliadorComparaveis:
+    """Índice das vendas para avaliação em lote por comparáveis."""
+
+    def __init__(self, df, escalas=ESCALAS, k=10):
+        self.escalas = dict(escalas)
+        self.k = k
+        self._cos_lat = np.cos(np.radians(float(df["lat"].mean())))
+        self.price_sqft = (df["price"].to_numpy(dtype="float64")
+                           / df["sqft_living"].to_numpy(dtype="float64"))
+        self.arvore = cKDTree(self._vetores(df))
+
+    def _vetores(self, df):
+        e = self.escalas
+        colunas = [
+            df["lat"].to_numpy(dtype="float64") * (KM_POR_GRAU / e["km"]),
+            df["long"].to_numpy(dtype="float64") * (KM_POR_GRAU * self._cos_lat / e["km"]),
+        ]
+        for c in ("sqft_living", "grade", "condition", "bathrooms", "yr_built"):
+            colunas.append(df[c].to_numpy(dtype="float64") / e[c])
+        return np.column_stack(colunas)
+
+    def vizinhos(self, df, excluir_proprio=False):
+        """Posições e distâncias dos k comparáveis de cada linha de ``df``.
+
+        Com ``excluir_proprio``, ``df`` deve ser o próprio conjunto indexado
+        e cada imóvel não conta como comparável de si mesmo. Com menos vendas
+        indexadas que ``k`` (mais o próprio), usa todas as disponíveis.
+        """
+        disponiveis = self.arvore.n - 1 if excluir_proprio else self.arvore.n
+        if disponiveis < 1:
+            raise ValueError("vendas insuficientes para buscar comparáveis")
+        k_vizinhos = min(self.k, disponiveis)
+        k = k_vizinhos + 1 if excluir_proprio else k_vizinhos
+        dist, pos = self.arvore.query(self._vetores(df), k=k, workers=-1)
+        dist, pos = dist.reshape(len(df), k), pos.reshape(len(df), k)
+        if excluir_proprio:
+            descartar = pos == np.arange(len(df))[:, None]
+            # sem o próprio entre os vizinhos (duplicatas): descarta o último
+            descartar[~descartar.any(axis=1), -1] = True
+            manter = ~descartar
+            dist = dist[manter].reshape(len(df), k_vizinhos)
+            pos = pos[manter].reshape(len(df), k_vizinhos)
+        return pos, dist
+
+    def avaliar(self, df, excluir_proprio=False):
+        """Valor justo e ROI (%) de cada linha de ``df`` a partir dos comparáveis."""
+        pos, dist = self.vizinhos(df, excluir_proprio)
+        pesos = 1.0 / (dist + 0.5)
+        price_sqft = (self.price_sqft[pos] * pesos).sum(axis=1) / pesos.sum(axis=1)
+        valor_justo = price_sqft * df["sqft_living"].to_numpy(dtype="float64")
+        price = df["price"].to_numpy(dtype="float64")
+        return pd.DataFrame({
+            "valor_justo": valor_justo,
+            "roi_comparaveis": (valor_justo - price) / price * 100,
+            "distancia_media": dist.mean(axis=1),
+        }, index=df.index)
@@ -0,0 +1,213 @@
+"""Carregamento dos dados de vendas.
+
+O CSV é convertido uma única vez para um arquivo Arrow (IPC/Feather sem
+compressão) com tipos estreitos; as cargas seguintes apenas mapeiam esse
+arquivo em memória, sem parse de texto nem conversão de datas. O cache é
+invalidado quando o CSV de origem muda: o mtime/tamanho é conferido a cada
+carga e, quando diverge, o hash SHA-256 do conteúdo decide se é preciso
+reconstruir. Vendas novas entram pelo módulo ``ingestao`` e ficam guardadas
+numa pasta de vendas processadas própria de cada CSV de origem
+(``processadas/<nome do CSV>`` dentro da pasta de entrada, registrada nos
+metadados do cache), de onde são reaplicadas se o arquivo Arrow precisar ser
+reconstruído.
+
+As colunas numéricas e de data do DataFrame carregado são visões somente
+leitura das páginas do arquivo mapeado: todos os processos do painel no
+mesmo servidor compartilham a mesma cópia na memória do sistema
+operacional. Quem precisar de colunas derivadas deve criá-las em outro
+DataFrame (``assign``) em vez de alterar o carregado.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # sem pyarrow o CSV é lido a cada carga
+    pa = feather = None
+
+
+RAIZ = Path(__file__).resolve().parent.parent
+CSV_PADRAO = RAIZ / "kc_house_data_updat.csv"
+DIR_CACHE = Path(os.environ.get("HOUSE_ROCKET_CACHE", RAIZ / ".cache_house_rocket"))
+PASTA_NOVAS_VENDAS = Path(os.environ.get("HOUSE_ROCKET_NOVAS_VENDAS", RAIZ / "novas_vendas"))
+
+FORMATO_DATA = "%d-%m-%Y"
+
+# Tipos explícitos de cada coluna do CSV
+TIPOS = {
+    "price": "float64",
+    "bedrooms": "int8",
+    "bathrooms": "int8",
+    "sqft_living": "int32",
+    "sqft_lot": "int32",
+    "floors": "float32",
+    "waterfront": "int8",
+    "view": "int8",
+    "condition": "int8",
+    "grade": "int8",
+    "sqft_above": "int32",
+    "sqft_basement": "int32",
+    "yr_built": "int16",
+    "yr_renovated": "int16",
+    "zipcode": "int32",
+    "lat": "float32",
+    "long": "float32",
+    "sqft_living15": "int32",
+    "sqft_lot15": "int32",
+    "has_basement": pd.CategoricalDtype(["Com Porão", "Sem Porão"]),
+    "log_price": "float64",
+    "log_sqft_living": "float64",
+    "log_sqft_lot": "float64",
+}
+
+# Incrementar quando o formato do arquivo em cache mudar
+VERSAO_FORMATO = 3
+
+
+def preparar(df):
+    """Converte a data (se ainda for texto) e cria a coluna ``year``."""
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df["date"] = pd.to_datetime(df["date"], format=FORMATO_DATA)
+    df["year"] = df["date"].dt.year.astype("int16")
+    return df
+
+
+def ler_csv(caminho):
+    """Lê o CSV bruto aplicando os tipos estreitos e a conversão de datas."""
+    return preparar(pd.read_csv(caminho, dtype=TIPOS))
+
+
+def hash_arquivo(caminho):
+    """Hash SHA-256 do conteúdo de um arquivo."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def pasta_processadas(caminho, pasta=PASTA_NOVAS_VENDAS):
+    """Pasta padrão das vendas já ingeridas no CSV ``caminho``."""
+    return Path(pasta) / "processadas" / Path(caminho).stem
+
+
+@contextmanager
+def arquivo_temporario(destino):
+    """Caminho temporário único ao lado de ``destino``, que o substitui se o bloco terminar sem erro.
+
+    Cada processo grava no seu próprio arquivo; a troca por ``os.replace``
+    é atômica, então leitores nunca veem um arquivo pela metade.
+    """
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=destino.parent, prefix=f"{destino.name}.", suffix=".tmp",
+                                     delete=False) as f:
+        tmp = Path(f.name)
+    try:
+        yield tmp
+        os.replace(tmp, destino)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _caminhos_cache(caminho):
+    nome = Path(caminho).stem
+    return DIR_CACHE / f"{nome}.arrow", DIR_CACHE / f"{nome}.json"
+
+
+def _ler_meta(arquivo_meta):
+    try:
+        return json.loads(arquivo_meta.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_meta(arquivo_meta, meta):
+    with arquivo_temporario(arquivo_meta) as tmp:
+        tmp.write_text(json.dumps(meta))
+
+
+def garantir_cache(caminho=CSV_PADRAO):
+    """Garante que o arquivo Arrow está em dia com o CSV e devolve seus metadados."""
+    caminho = Path(caminho)
+    arquivo, arquivo_meta = _caminhos_cache(caminho)
+    stat = caminho.stat()
+    assinatura = {"mtime_ns": stat.st_mtime_ns, "tamanho": stat.st_size}
+
+    meta = _ler_meta(arquivo_meta)
+    if meta and meta.get("formato") == VERSAO_FORMATO and arquivo.exists():
+        if meta["origem"] == assinatura:
+            return meta
+        # mtime mudou (ex.: checkout/cópia) mas o conteúdo pode ser o mesmo
+        sha = hash_arquivo(caminho)
+        if meta["sha256"] == sha:
+            meta["origem"] = assinatura
+            _gravar_meta(arquivo_meta, meta)
+            return meta
+    else:
+        sha = hash_arquivo(caminho)
+
+    # Reconstrução: CSV de origem + vendas já ingeridas nele (só da pasta deste CSV)
+    registrada = meta.get("processadas") if meta else None
+    pasta = Path(registrada) if registrada else pasta_processadas(caminho)
+    processadas = sorted(pasta.glob("*.csv"))
+    deltas = [{"arquivo": p.name, "sha256": hash_arquivo(p)} for p in processadas]
+    df = pd.concat([ler_csv(caminho)] + [ler_csv(p) for p in processadas], ignore_index=True)
+    meta = {
+        "formato": VERSAO_FORMATO,
+        "origem": assinatura,
+        "sha256": sha,
+        # a pasta só é fixada quando há vendas ingeridas; até lá a ingestão escolhe a sua
+        "processadas": str(pasta) if registrada or processadas else None,
+        "deltas": deltas,
+    }
+    gravar_base(caminho, df, meta)
+    return meta
+
+
+def calcular_versao(meta):
+    """Versão dos dados: hash do CSV de origem e das vendas ingeridas."""
+    h = hashlib.sha256(meta["sha256"].encode())
+    for delta in meta["deltas"]:
+        h.update(delta["sha256"].encode())
+    return h.hexdigest()[:16]
+
+
+def gravar_base(caminho, df, meta):
+    """Grava o conjunto de vendas no arquivo Arrow e atualiza os metadados."""
+    arquivo, arquivo_meta = _caminhos_cache(caminho)
+    with arquivo_temporario(arquivo) as tmp:
+        # um único lote por coluna, para a carga mapear cada coluna sem concatenar
+        feather.write_feather(df, tmp, compression="uncompressed", chunksize=max(len(df), 1))
+    meta["versao"] = calcular_versao(meta)
+    meta["linhas"] = len(df)
+    _gravar_meta(arquivo_meta, meta)
+
+
+def versao_dados(caminho=CSV_PADRAO):
+    """Identificador da versão atual dos dados, usado como chave de cache."""
+    if feather is None:
+        stat = Path(caminho).stat()
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+    return garantir_cache(caminho)["versao"]
+
+
+def carregar_dados(caminho=CSV_PADRAO):
+    """Carrega o conjunto de vendas já tipado (date, year e colunas do CSV).
+
+    As colunas apontam direto para o arquivo Arrow mapeado em memória
+    (somente leitura, sem cópia); só ``has_basement`` é materializada.
+    """
+    if feather is None:
+        return ler_csv(caminho)
+    garantir_cache(caminho)
+    arquivo, _ = _caminhos_cache(caminho)
+    tabela = pa.ipc.open_file(pa.memory_map(str(arquivo))).read_all()
+    return tabela.to_pandas(split_blocks=True)
@@ -0,0 +1,92 @@
+"""Índice espacial sobre as coordenadas (lat/long) das vendas.
+
+Os pontos são distribuídos numa grade regular de células de ``celula_km``
+e ordenados pelo número da célula (linha * colunas + coluna). Como as
+células de uma mesma linha da grade ficam contíguas nessa ordem, uma
+consulta por raio ou por retângulo vira uma busca binária por linha da
+grade seguida do cálculo exato da distância apenas para os candidatos.
+"""
+import numpy as np
+
+
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU = np.pi * RAIO_TERRA_KM / 180
+
+
+def distancia_km(lat1, long1, lat2, long2):
+    """Distância de haversine, em km, entre pontos (aceita arrays)."""
+    lat1, long1, lat2, long2 = (np.radians(np.asarray(v, dtype="float64")) for v in (lat1, long1, lat2, long2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((long2 - long1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def concatenar_faixas(inicio, fim):
+    """Concatena as faixas [inicio[i], fim[i]) num único array de posições."""
+    tamanhos = np.maximum(fim - inicio, 0)
+    total = int(tamanhos.sum())
+    if total == 0:
+        return np.empty(0, dtype="int64")
+    deslocamento = np.repeat(inicio - (np.cumsum(tamanhos) - tamanhos), tamanhos)
+    return np.arange(total) + deslocamento
+
+
+class IndiceEspacial:
+    """Grade de células sobre lat/long para consultas por raio e por retângulo.
+
+    As consultas devolvem posições (0 .. n-1) na ordem dos arrays originais.
+    """
+
+    def __init__(self, lat, long, celula_km=1.0):
+        lat = np.asarray(lat, dtype="float64")
+        long = np.asarray(long, dtype="float64")
+        self.dlat = celula_km / KM_POR_GRAU
+        self.dlong = celula_km / (KM_POR_GRAU * np.cos(np.radians(lat.mean())))
+        self.lat0, self.long0 = lat.min(), long.min()
+        self.linhas = int((lat.max() - self.lat0) // self.dlat) + 1
+        self.colunas = int((long.max() - self.long0) // self.dlong) + 1
+
+        celula = self._linha(lat) * self.colunas + self._coluna(long)
+        self.ordem = np.argsort(celula, kind="stable")
+        self.celulas = celula[self.ordem]
+        self.lat = lat[self.ordem]
+        self.long = long[self.ordem]
+
+    def __len__(self):
+        return len(self.ordem)
+
+    def _linha(self, lat):
+        return np.clip((np.asarray(lat) - self.lat0) // self.dlat, 0, self.linhas - 1).astype("int64")
+
+    def _coluna(self, long):
+        return np.clip((np.asarray(long) - self.long0) // self.dlong, 0, self.colunas - 1).astype("int64")
+
+    def _candidatos(self, lat_min, lat_max, long_min, long_max):
+        """Posições (na ordem interna) dos pontos nas células que cobrem o retângulo."""
+        if lat_max < self.lat0 or long_max < self.long0:
+            return np.empty(0, dtype="int64")
+        linhas = np.arange(self._linha(lat_min), self._linha(lat_max) + 1)
+        c0, c1 = self._coluna(long_min), self._coluna(long_max)
+        inicio = np.searchsorted(self.celulas, linhas * self.colunas + c0, side="left")
+        fim = np.searchsorted(self.celulas, linhas * self.colunas + c1, side="right")
+        return concatenar_faixas(inicio, fim)
+
+    def janela(self, lat_min, lat_max, long_min, long_max):
+        """Posições dos pontos dentro do retângulo (ex.: a área visível do mapa)."""
+        cand = self._candidatos(lat_min, lat_max, long_min, long_max)
+        lat, long = self.lat[cand], self.long[cand]
+        dentro = (lat >= lat_min) & (lat <= lat_max) & (long >= long_min) & (long <= long_max)
+        return np.sort(self.ordem[cand[dentro]])
+
+    def raio(self, lat, long, km):
+        """Posições e distâncias (km) dos pontos a até ``km`` do ponto dado.
+
+        O resultado vem ordenado da menor para a maior distância.
+        """
+        dlat = km / KM_POR_GRAU
+        dlong = km / (KM_POR_GRAU * max(np.cos(np.radians(lat)), 1e-6))
+        cand = self._candidatos(lat - dlat, lat + dlat, long - dlong, long + dlong)
+        dist = distancia_km(lat, long, self.lat[cand], self.long[cand])
+        dentro = dist <= km
+        cand, dist = cand[dentro], dist[dentro]
+        ordem = np.argsort(dist, kind="stable")
+        return self.ordem[cand[ordem]], dist[ordem]
@@ -0,0 +1,151 @@
+"""Análise em blocos para bases maiores que a memória.
+
+As vendas são lidas em blocos (CSV em pedaços, Parquet por lotes, Arrow
+mapeado em memória por lotes) e cada etapa guarda só resultados parciais
+combináveis: somas por grupo, o esboço de quantis por CEP, X'X e X'y do
+modelo hedônico, o cubo sazonal e os melhores candidatos de cada bloco.
+O estado de cada etapa depende do número de CEPs e níveis, não do número de
+vendas. São três leituras da base:
+
+1. níveis, intervalo de datas, somas por grupo e esboço de quantis;
+2. equações normais do modelo, triagem de candidatos e incrementos de reforma;
+3. cubo sazonal (precisa do modelo ajustado).
+
+Os resultados são os mesmos de ``analise.executar_analise`` sobre a base
+inteira, a menos do arredondamento das somas em ordem diferente, das
+vendas duplicadas em blocos diferentes (só reconhecidas dentro de cada
+bloco) e da mediana por CEP, que sai do esboço e é aproximada (erro
+relativo de cerca de ``ALFA_ESBOCO``, 1%) em vez de exata.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from house_rocket.agregados import agregados_de_somas, calcular_somas, combinar_somas
+from house_rocket.dados import TIPOS, preparar
+from house_rocket.qualidade import mediana_do_esboco
+from house_rocket.reforma import MotorReforma
+from house_rocket.regressao import ModeloHedonico
+from house_rocket.sazonalidade import combinar_cubos, construir_cubo
+from house_rocket.triagem import CriteriosCompra, MotorTriagem, posicao_no_grupo, top_k_decrescente
+
+
+TAMANHO_BLOCO = 500_000
+
+
+def ler_em_blocos(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    """Gera DataFrames de até ``tamanho_bloco`` vendas, com índice global contínuo.
+
+    Aceita CSV, Parquet e Arrow/Feather.
+    """
+    caminho = Path(caminho)
+    sufixo = caminho.suffix.lower()
+    if sufixo == ".csv":
+        blocos = pd.read_csv(caminho, dtype=TIPOS, chunksize=tamanho_bloco)
+    elif sufixo == ".parquet":
+        import pyarrow.parquet as pq
+        blocos = (lote.to_pandas() for lote in pq.ParquetFile(caminho).iter_batches(batch_size=tamanho_bloco))
+    elif sufixo in (".arrow", ".feather"):
+        import pyarrow as pa
+        blocos = _lotes_arrow(pa, caminho, tamanho_bloco)
+    else:
+        raise ValueError(f"formato de entrada não suportado: {caminho.name}")
+
+    inicio = 0
+    for bloco in blocos:
+        bloco.index = pd.RangeIndex(inicio, inicio + len(bloco))
+        inicio += len(bloco)
+        yield preparar(bloco)
+
+
+def _lotes_arrow(pa, caminho, tamanho_bloco):
+    with pa.memory_map(str(caminho)) as fonte:
+        leitor = pa.ipc.open_file(fonte)
+        for i in range(leitor.num_record_batches):
+            lote = leitor.get_batch(i)
+            for inicio in range(0, lote.num_rows, tamanho_bloco):
+                yield lote.slice(inicio, tamanho_bloco).to_pandas()
+
+
+def mesclar_candidatos(partes, criterios):
+    """Aplica o limite por CEP e o limite total sobre os candidatos de vários blocos.
+
+    Os empates seguem a mesma ordem do ``MotorTriagem`` sobre a base inteira:
+    CEP, preço e posição original.
+    """
+    todos = pd.concat(partes)
+    if todos.empty:
+        return todos
+    todos = todos.iloc[np.lexsort((todos.index.to_numpy(), todos["price"].to_numpy(), todos["zipcode"].to_numpy()))]
+    roi = todos["ROI (%)"].to_numpy()
+    if criterios.top_k_por_zipcode > 0:
+        zipcodes = todos["zipcode"].to_numpy()
+        ordem = np.lexsort((-roi, zipcodes))
+        ok = np.sort(ordem[posicao_no_grupo(zipcodes[ordem]) < criterios.top_k_por_zipcode])
+        todos, roi = todos.iloc[ok], roi[ok]
+    return todos.iloc[top_k_decrescente(roi, criterios.limite)]
+
+
+def mesclar_incrementos(partes, k):
+    """As ``k`` maiores linhas de ``MotorReforma.top_incrementos`` de vários blocos."""
+    todos = pd.concat(partes).sort_index()
+    pos = top_k_decrescente(todos["price_increment_condition"].to_numpy(), k,
+                            desempate=todos["price_increment_grade"].to_numpy())
+    return todos.iloc[pos]
+
+
+def executar_analise_em_blocos(caminho, criterios=CriteriosCompra(), tamanho_bloco=TAMANHO_BLOCO, k_reforma=10,
+                               base_roi="media"):
+    """Tabelas de triagem, agregados, sazonalidade e reforma lendo ``caminho`` em blocos.
+
+    O ROI usa como referência a estatística regional ``base_roi`` do CEP
+    (``ESTATISTICAS_REGIONAIS``); a mediana é a aproximada do esboço. A base
+    de comparáveis exige todas as vendas em memória e não está disponível aqui.
+    """
+    # 1ª leitura: níveis, datas, somas e esboço de quantis
+    somas, niveis, data_min, data_max = None, {}, None, None
+    modelo = ModeloHedonico()
+    for bloco in ler_em_blocos(caminho, tamanho_bloco):
+        parcial = calcular_somas(bloco)
+        somas = parcial if somas is None else combinar_somas(somas, parcial)
+        for c in modelo.categoricas:
+            valores = np.unique(bloco[c].to_numpy())
+            niveis[c] = np.union1d(niveis[c], valores) if c in niveis else valores
+        if data_min is None:
+            data_min, data_max = bloco["date"].min(), bloco["date"].max()
+        else:
+            data_min, data_max = min(data_min, bloco["date"].min()), max(data_max, bloco["date"].max())
+    if somas is None:
+        raise ValueError(f"nenhuma venda em {caminho}")
+    agregados = agregados_de_somas(somas, mediana_do_esboco(somas["esboco_zipcode"]))
+    modelo.niveis = niveis
+    modelo._posicoes()
+
+    # 2ª leitura: equações normais, candidatos e incrementos de reforma
+    equacoes, candidatos, incrementos = None, [], []
+    for bloco in ler_em_blocos(caminho, tamanho_bloco):
+        parcial = modelo.acumular(bloco)
+        equacoes = parcial if equacoes is None else tuple(a + b for a, b in zip(equacoes, parcial))
+        motor = MotorTriagem(bloco, agregados.referencia_log(bloco["zipcode"], base_roi))
+        candidatos.append(motor.selecionar(criterios))
+        reforma = MotorReforma(bloco, agregados.por_condicao["price_mean"], agregados.por_grade["price_mean"])
+        incrementos.append(reforma.top_incrementos(k_reforma))
+    modelo.resolver(*equacoes)
+
+    # 3ª leitura: cubo sazonal com os resíduos do modelo
+    cubo = None
+    for bloco in ler_em_blocos(caminho, tamanho_bloco):
+        parcial = construir_cubo(bloco, modelo, "mes", agregados.por_zipcode.index.to_numpy(), data_min, data_max)
+        cubo = parcial if cubo is None else combinar_cubos(cubo, parcial)
+
+    return {
+        "candidatos": mesclar_candidatos(candidatos, criterios),
+        "agregados_zipcode": agregados.por_zipcode,
+        "agregados_condicao": agregados.por_condicao,
+        "agregados_grade": agregados.por_grade,
+        "sazonalidade_mercado": cubo.serie(),
+        "sazonalidade_zipcode": cubo.tabela(),
+        "perfil_sazonal": cubo.perfil_mes_do_ano().to_frame(),
+        "incrementos_reforma": mesclar_incrementos(incrementos, k_reforma),
+    }
@@ -0,0 +1,158 @@
+"""Gráficos matplotlib/seaborn do painel, renderizados com cache.
+
+Cada gráfico é uma função pura que recebe os dados e devolve uma
+``Figure``. ``renderizar`` gera o PNG numa thread auxiliar e guarda os
+bytes no cache compartilhado de resultados (``house_rocket.cache``) com
+chave no hash dos dados e dos parâmetros, de modo que reruns e sessões
+com as mesmas entradas não redesenham nada. As figuras
+são criadas fora do pyplot (``Figure`` direto, backend Agg), portanto
+nunca entram no gerenciador de figuras e são liberadas após o PNG.
+"""
+import io
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import seaborn as sns
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+from house_rocket.cache import assinatura, cache_compartilhado
+
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="graficos")
+
+
+def _png(funcao, args, kwargs):
+    fig = funcao(*args, **kwargs)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight", dpi=200)
+    fig.clear()
+    return buffer.getvalue()
+
+
+def renderizar(funcao, *args, **kwargs):
+    """PNG do gráfico ``funcao(*args, **kwargs)`` como ``Future`` de bytes.
+
+    Em cache, o resultado já vem pronto; senão a renderização é enviada a
+    uma thread auxiliar e o chamador pode seguir montando a página.
+    """
+    cache = cache_compartilhado()
+    chave = assinatura("grafico", funcao.__qualname__, args, sorted(kwargs.items()))
+    png = cache.obter(chave)
+    if png is not None:
+        pronto = Future()
+        pronto.set_result(png)
+        return pronto
+
+    futuro = _executor.submit(_png, funcao, args, kwargs)
+
+    def guardar(f):
+        if f.exception() is None:
+            cache.guardar(chave, f.result())
+
+    futuro.add_done_callback(guardar)
+    return futuro
+
+
+# =========================================
+#        Aba 2: Estratégia de Compra
+# =========================================
+
+def grafico_roi(roi, indices):
+    """Dispersão do ROI esperado por propriedade recomendada."""
+    roi = np.asarray(roi)
+    fig = Figure(figsize=(14, 6))
+    ax = fig.subplots()
+    ax.scatter(range(len(roi)), roi, color='#2ecc71', s=150, alpha=0.7, edgecolor='black')
+    for i, valor in enumerate(roi):
+        ax.text(x=i, y=valor + 1.5, s=f"{valor:.1f}%", ha='center', fontsize=10, fontweight='bold')
+
+    ax.set_ylim(0, (roi.max() if len(roi) else 0) + 10)
+    ax.set_title("Potencial de Retorno por Propriedade", fontsize=16, pad=20)
+    ax.set_xlabel("Índice da Propriedade", fontsize=12)
+    ax.set_ylabel("ROI Esperado (%)", fontsize=12)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    ax.set_facecolor('#f5f6fa')
+    ax.set_xticks(range(len(roi)), labels=list(indices), rotation=45, fontsize=10)
+    return fig
+
+
+def grafico_top_regioes(top_regioes, destaque):
+    """Barras do preço médio das regiões mais caras com o CEP ``destaque`` em vermelho."""
+    colors = ['#FF6B6B' if zipcode == destaque else '#4ECDC4' for zipcode in top_regioes['zipcode']]
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.bar(top_regioes['zipcode'].astype(str), top_regioes['price'], color=colors, edgecolor='grey')
+    ax.set_title(f'Top 10 Regiões com Maiores Preços Médios vs Região {destaque}', pad=20)
+    ax.set_xlabel('CEP da Região', labelpad=10)
+    ax.set_ylabel('Preço Médio (US$)', labelpad=10)
+    ax.grid(axis='y', alpha=0.3)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return fig
+
+
+def grafico_valorizacao(comparacao, media_destaque, destaque):
+    """Barras da valorização média anual com a linha de referência do CEP ``destaque``."""
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    sns.barplot(data=comparacao, x='zipcode', y='pct_change', palette='Blues_d', ax=ax)
+    ax.axhline(media_destaque, color='#FF6B6B', linestyle='--', linewidth=2,
+               label=f'CEP {destaque} ({media_destaque:.1%})')
+    ax.set_title('Taxa Média de Valorização Anual Comparativa', pad=15)
+    ax.set_xlabel('CEP da Região', labelpad=10)
+    ax.set_ylabel('Valorização Média Anual', labelpad=10)
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.0%}'))
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+# =========================================
+#        Aba 4: Impacto das Reformas
+# =========================================
+
+def grafico_preco_medio(x, y, cor, titulo, rotulo_x):
+    """Barras do preço médio por nível (condição ou qualidade)."""
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    ax.bar(x, y, color=cor)
+    ax.set_title(titulo)
+    ax.set_xlabel(rotulo_x)
+    ax.set_ylabel("Preço Médio (R$)")
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    ax.ticklabel_format(style='plain', axis='y')  # Remover notação científica
+    return fig
+
+
+def grafico_incrementos(top_improvements):
+    """Barras sobrepostas dos incrementos por condição e por qualidade."""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.barplot(data=top_improvements, x='condition', y='price_increment_condition',
+                color='skyblue', label='Incremento pela Condição', alpha=0.7, ax=ax)
+    sns.barplot(data=top_improvements, x='condition', y='price_increment_grade',
+                color='orange', label='Incremento pela Qualidade (Grau)', alpha=0.7, ax=ax)
+    ax.set_title('Incremento no Preço de Casas por Melhoria de Condição e Qualidade (Grau)', fontsize=14)
+    ax.set_xlabel('Condição', fontsize=12)
+    ax.set_ylabel('Incremento no Preço (R$)', fontsize=12)
+    ax.legend(title='Tipo de Melhoria')
+    fig.tight_layout()
+    return fig
+
+
+def grafico_pos_reforma(top_10_pos_reforma):
+    """Percentual de aumento pós-reforma, com o valor pós-reforma sobre cada barra."""
+    fig = Figure(figsize=(12, 6), dpi=80)
+    ax = fig.subplots()
+    sns.barplot(x=top_10_pos_reforma['indice'], y=top_10_pos_reforma['percentual_aumento'],
+                palette='viridis', dodge=False, ax=ax)
+    for i, row in top_10_pos_reforma.reset_index(drop=True).iterrows():
+        ax.text(i, row['percentual_aumento'] + 2, f"R${row['preco_pos_reforma']:,.0f}", ha='center', fontsize=9)
+    ax.set_title('Percentual de Aumento do Valor Potencial Pós-Reforma', fontsize=14)
+    ax.set_xlabel('Casas (Índice)', fontsize=12)
+    ax.set_ylabel('Percentual de Aumento (%)', fontsize=12)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    fig.tight_layout()
+    return fig
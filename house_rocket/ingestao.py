@@ -0,0 +1,209 @@
+"""Ingestão incremental de vendas novas.
+
+Arquivos CSV com o mesmo formato de ``kc_house_data_updat.csv`` colocados
+em ``PASTA_NOVAS_VENDAS`` (ex.: um arquivo por dia) são anexados ao conjunto
+armazenado e somados aos agregados persistidos, sem reler o histórico em
+CSV nem reagrupar todas as vendas. Depois de ingerido, cada arquivo é
+movido para a pasta de vendas processadas do CSV de origem (ver
+``dados.pasta_processadas``); se já houver lá um arquivo com o mesmo nome,
+o novo recebe parte do seu hash no nome. Arquivos ilegíveis ou sem as
+colunas esperadas vão para ``rejeitadas/`` e não interrompem a ingestão.
+
+Somas e medianas são atualizadas só com as vendas novas, mas o arquivo
+Arrow é regravado inteiro a cada ingestão: ele guarda um único lote por
+coluna, o que permite carregá-lo sem cópia (``dados.carregar_dados``), e o
+formato IPC não aceita anexar lotes a um arquivo fechado. A regravação é
+uma escrita sequencial, sem parse de CSV nem reagrupamento.
+"""
+import logging
+import os
+import pickle
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from house_rocket.agregados import (
+    agregados_de_somas,
+    calcular_somas,
+    combinar_somas,
+    medianas_por_zipcode,
+)
+from house_rocket.qualidade import esboco_por_zipcode
+from house_rocket.dados import (
+    CSV_PADRAO,
+    DIR_CACHE,
+    PASTA_NOVAS_VENDAS,
+    TIPOS,
+    arquivo_temporario,
+    carregar_dados,
+    garantir_cache,
+    gravar_base,
+    hash_arquivo,
+    ler_csv,
+    pasta_processadas,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+# Incrementar quando o conteúdo das somas persistidas mudar
+FORMATO_SOMAS = 3
+
+
+def _arquivo_somas(caminho):
+    return DIR_CACHE / f"{Path(caminho).stem}.somas.pkl"
+
+
+def _gravar_somas(caminho, versao, somas, medianas):
+    with arquivo_temporario(_arquivo_somas(caminho)) as tmp, open(tmp, "wb") as f:
+        pickle.dump({"formato": FORMATO_SOMAS, "versao": versao, "somas": somas, "medianas": medianas}, f)
+
+
+def carregar_somas(caminho=CSV_PADRAO):
+    """Somas e medianas por CEP da versão atual dos dados.
+
+    Só são recalculadas sobre o conjunto inteiro quando não há somas
+    persistidas para a versão atual (primeira carga ou CSV de origem trocado).
+    """
+    meta = garantir_cache(caminho)
+    try:
+        with open(_arquivo_somas(caminho), "rb") as f:
+            salvo = pickle.load(f)
+        if salvo.get("formato") == FORMATO_SOMAS and salvo["versao"] == meta["versao"]:
+            return salvo["somas"], salvo["medianas"]
+    except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+        pass
+
+    df = carregar_dados(caminho)
+    somas, medianas = calcular_somas(df), medianas_por_zipcode(df)
+    _gravar_somas(caminho, meta["versao"], somas, medianas)
+    return somas, medianas
+
+
+def agregados_armazenados(caminho=CSV_PADRAO):
+    """``Agregados`` da versão atual, montados a partir das somas persistidas."""
+    return agregados_de_somas(*carregar_somas(caminho))
+
+
+def _travar(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+@contextmanager
+def _trava(arquivo):
+    """Trava entre processos; devolve False se outro processo já a detém.
+
+    A trava é do sistema operacional (``flock``; ``msvcrt.locking`` no
+    Windows) e é liberada quando o arquivo é fechado, inclusive se o
+    processo morrer, então não há trava abandonada a recuperar.
+    """
+    arquivo.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(arquivo, os.O_CREAT | os.O_RDWR)
+    try:
+        yield _travar(fd)
+    finally:
+        os.close(fd)
+
+
+def _ler_novas_vendas(arquivo):
+    colunas = pd.read_csv(arquivo, nrows=0).columns
+    faltando = ({"date"} | set(TIPOS)) - set(colunas)
+    if faltando:
+        raise ValueError(f"{arquivo.name}: colunas ausentes {sorted(faltando)}")
+    return ler_csv(arquivo)
+
+
+def _destino_livre(pasta, arquivo, sha):
+    """``pasta/arquivo.name`` ou, se o nome já estiver em uso, o nome com parte do hash."""
+    pasta.mkdir(parents=True, exist_ok=True)
+    destino = pasta / arquivo.name
+    if destino.exists():
+        destino = pasta / f"{arquivo.stem}-{sha[:12]}{arquivo.suffix}"
+    return destino
+
+
+def _rejeitar(pasta, arquivo, sha, motivo):
+    logger.warning("vendas novas rejeitadas: %s (%s)", arquivo.name, motivo)
+    os.replace(arquivo, _destino_livre(pasta / "rejeitadas", arquivo, sha))
+
+
+def ingerir_novas_vendas(caminho=CSV_PADRAO, pasta=PASTA_NOVAS_VENDAS):
+    """Anexa os CSVs pendentes em ``pasta`` ao conjunto armazenado.
+
+    Devolve o número de vendas ingeridas (0 se não houver arquivos novos ou
+    se outro processo estiver ingerindo no momento).
+    """
+    pasta = Path(pasta)
+    if not any(pasta.glob("*.csv")):
+        return 0
+
+    with _trava(DIR_CACHE / "ingestao.lock") as obtida:
+        if not obtida:
+            return 0
+
+        somas, medianas = carregar_somas(caminho)
+        meta = garantir_cache(caminho)
+        # todas as vendas ingeridas neste CSV ficam numa só pasta, de onde a base é reconstruída
+        processadas = Path(meta.get("processadas") or pasta_processadas(caminho, pasta))
+        meta["processadas"] = str(processadas)
+        registrados = {d["sha256"]: d["arquivo"] for d in meta["deltas"]}
+
+        pendentes, novas = [], []
+        for arquivo in sorted(pasta.glob("*.csv")):
+            sha = hash_arquivo(arquivo)
+            if sha in registrados:
+                # já está na base: completa uma ingestão interrompida antes de mover o arquivo
+                destino = processadas / registrados[sha]
+                if destino.exists():
+                    _rejeitar(pasta, arquivo, sha, "já ingerido")
+                else:
+                    processadas.mkdir(parents=True, exist_ok=True)
+                    os.replace(arquivo, destino)
+                continue
+            try:
+                novas.append(_ler_novas_vendas(arquivo))
+            except (ValueError, TypeError) as erro:
+                _rejeitar(pasta, arquivo, sha, erro)
+                continue
+            destino = _destino_livre(processadas, arquivo, sha)
+            meta["deltas"].append({"arquivo": destino.name, "sha256": sha})
+            registrados[sha] = destino.name
+            pendentes.append((arquivo, destino))
+
+        if novas:
+            novas = pd.concat(novas, ignore_index=True)
+            df = pd.concat([carregar_dados(caminho), novas], ignore_index=True)
+            gravar_base(caminho, df, meta)
+
+            # Só as medianas e o esboço dos CEPs afetados precisam ser recalculados; refeito
+            # sobre todas as vendas desses CEPs, o esboço reconhece vendas novas que repetem antigas
+            somas = combinar_somas(somas, calcular_somas(novas))
+            zipcodes = np.unique(novas["zipcode"])
+            afetados = df[df["zipcode"].isin(zipcodes)]
+            medianas = medianas_por_zipcode(afetados).combine_first(medianas)
+            esboco = somas["esboco_zipcode"]
+            somas["esboco_zipcode"] = pd.concat([
+                esboco[~esboco.index.get_level_values("zipcode").isin(zipcodes)],
+                esboco_por_zipcode(afetados),
+            ]).sort_index()
+            _gravar_somas(caminho, meta["versao"], somas, medianas)
+
+        for arquivo, destino in pendentes:
+            os.replace(arquivo, destino)
+
+    return len(novas)
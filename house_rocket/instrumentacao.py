@@ -0,0 +1,282 @@
+"""Medição de tempo, memória e cache por etapa.
+
+Uma ``Medicoes`` acompanha uma execução (um rerun do painel ou uma rodada
+da linha de comando). ``etapa(nome)`` mede o bloco dentro dela: tempo de
+parede, aumento do pico de RSS do processo e, se ligado, o pico de memória
+alocada (tracemalloc, mais caro). Etapas podem ser aninhadas. A medição
+ativa fica numa ``ContextVar``, então tempos e contagens de sessões
+simultâneas do painel não se misturam; sem medição ativa, ``etapa`` não
+faz nada. ``medir`` abre uma medição própria quando não há uma ativa (ex.:
+fragmento do painel reexecutado sozinho).
+
+O tracemalloc é do processo: ele fica ligado enquanto alguma medição o
+pede (contagem de referências) e o pico de memória alocada é o do
+processo inteiro durante a etapa. Com outras medições em andamento ao
+mesmo tempo, o pico não é zerado no início da etapa e vale como limite
+superior.
+
+``com_contagem_de_cache`` envolve uma função cacheada (``st.cache_data``,
+``functools.lru_cache`` ...) e registra acertos e falhas do cache.
+Os totais de todas as execuções do processo ficam em ``acumulado`` e
+cada execução pode ser exportada como uma linha JSON.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: sem pico de RSS
+    resource = None
+
+
+logger = logging.getLogger("house_rocket.metricas")
+
+_atual = ContextVar("medicoes", default=None)
+
+# Medições que pediram o tracemalloc; o primeiro pedido o liga e o último pedido o desliga
+_trava_tracemalloc = threading.Lock()
+_usuarios_tracemalloc = 0
+_tracemalloc_nosso = False
+
+
+def _ligar_tracemalloc():
+    global _usuarios_tracemalloc, _tracemalloc_nosso
+    with _trava_tracemalloc:
+        if _usuarios_tracemalloc == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_nosso = True
+        _usuarios_tracemalloc += 1
+
+
+def _desligar_tracemalloc():
+    global _usuarios_tracemalloc, _tracemalloc_nosso
+    with _trava_tracemalloc:
+        _usuarios_tracemalloc -= 1
+        if _usuarios_tracemalloc == 0 and _tracemalloc_nosso:
+            tracemalloc.stop()
+            _tracemalloc_nosso = False
+
+
+def _zerar_pico():
+    """Zera o pico do tracemalloc se nenhuma outra medição o estiver usando."""
+    with _trava_tracemalloc:
+        if _usuarios_tracemalloc == 1:
+            tracemalloc.reset_peak()
+
+
+def _rss_pico_mb():
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _Quadro:
+    __slots__ = ("base", "pico")
+
+    def __init__(self, base):
+        self.base = base
+        self.pico = base
+
+
+class Medicoes:
+    """Etapas medidas e contagens de cache de uma execução."""
+
+    def __init__(self, rotulo="", medir_memoria=False):
+        self.rotulo = rotulo
+        self.medir_memoria = medir_memoria
+        self.inicio = time.perf_counter()
+        self.momento = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.etapas = []
+        self.cache = defaultdict(lambda: {"acertos": 0, "falhas": 0})
+        self._pilha = []
+        self._nivel = 0
+
+    def iniciar(self):
+        """Torna esta a medição ativa no contexto atual."""
+        if self.medir_memoria:
+            _ligar_tracemalloc()
+        self._token = _atual.set(self)
+        return self
+
+    def finalizar(self):
+        """Encerra a medição e soma seus números em ``acumulado``."""
+        _atual.reset(self._token)
+        self.total_s = time.perf_counter() - self.inicio
+        if self.medir_memoria:
+            _desligar_tracemalloc()
+        acumulado.registrar(self)
+        return self
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.finalizar()
+        return False
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco ``with`` como a etapa ``nome``."""
+        quadro = None
+        if self.medir_memoria and tracemalloc.is_tracing():
+            atual, pico = tracemalloc.get_traced_memory()
+            if self._pilha:
+                self._pilha[-1].pico = max(self._pilha[-1].pico, pico)
+            _zerar_pico()
+            quadro = _Quadro(atual)
+            self._pilha.append(quadro)
+        registro = {"etapa": nome, "nivel": self._nivel}
+        self.etapas.append(registro)
+        self._nivel += 1
+        rss = _rss_pico_mb()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._nivel -= 1
+            registro["tempo_s"] = time.perf_counter() - inicio
+            registro["rss_pico_mb"] = _rss_pico_mb() - rss
+            if quadro is not None:
+                quadro.pico = max(quadro.pico, tracemalloc.get_traced_memory()[1])
+                self._pilha.pop()
+                if self._pilha:
+                    self._pilha[-1].pico = max(self._pilha[-1].pico, quadro.pico)
+                registro["alocado_pico_processo_mb"] = (quadro.pico - quadro.base) / 2**20
+
+    def registrar_cache(self, nome, acerto):
+        self.cache[nome]["acertos" if acerto else "falhas"] += 1
+
+    def tabela_etapas(self):
+        """Etapas na ordem de início, com a indentação do aninhamento no nome."""
+        tabela = pd.DataFrame(self.etapas, columns=["etapa", "nivel", "tempo_s", "rss_pico_mb", "alocado_pico_processo_mb"])
+        tabela["etapa"] = ["  " * n + e for e, n in zip(tabela["etapa"], tabela["nivel"])]
+        return tabela.drop(columns="nivel")
+
+    def tabela_cache(self):
+        return pd.DataFrame.from_dict(dict(self.cache), orient="index", columns=["acertos", "falhas"]).rename_axis("funcao")
+
+    def para_dict(self):
+        return {
+            "rotulo": self.rotulo,
+            "momento": self.momento,
+            "total_s": getattr(self, "total_s", time.perf_counter() - self.inicio),
+            "etapas": self.etapas,
+            "cache": dict(self.cache),
+        }
+
+    def para_json(self):
+        return json.dumps(self.para_dict(), ensure_ascii=False)
+
+    def exportar(self, caminho=None):
+        """Registra a execução no logger ``house_rocket.metricas`` e, se pedido, num arquivo JSONL."""
+        linha = self.para_json()
+        logger.info(linha)
+        if caminho:
+            with open(caminho, "a", encoding="utf-8") as f:
+                f.write(linha + "\n")
+        return linha
+
+
+class Acumulado:
+    """Totais por etapa e por cache de todas as execuções do processo."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.limpar()
+
+    def limpar(self):
+        self.execucoes = 0
+        self.etapas = defaultdict(lambda: {"execucoes": 0, "tempo_total_s": 0.0, "tempo_max_s": 0.0})
+        self.cache = defaultdict(lambda: {"acertos": 0, "falhas": 0})
+
+    def registrar(self, medicoes):
+        with self._trava:
+            self.execucoes += 1
+            for registro in medicoes.etapas:
+                e = self.etapas[registro["etapa"]]
+                e["execucoes"] += 1
+                e["tempo_total_s"] += registro.get("tempo_s", 0.0)
+                e["tempo_max_s"] = max(e["tempo_max_s"], registro.get("tempo_s", 0.0))
+            for nome, contagem in medicoes.cache.items():
+                for chave, valor in contagem.items():
+                    self.cache[nome][chave] += valor
+
+    def tabela(self):
+        with self._trava:
+            tabela = pd.DataFrame.from_dict(dict(self.etapas), orient="index",
+                                            columns=["execucoes", "tempo_total_s", "tempo_max_s"])
+        tabela["tempo_medio_s"] = tabela["tempo_total_s"] / tabela["execucoes"]
+        return tabela.rename_axis("etapa").sort_values("tempo_total_s", ascending=False)
+
+
+acumulado = Acumulado()
+
+
+def medicoes_atuais():
+    """A ``Medicoes`` ativa neste contexto, ou None."""
+    return _atual.get()
+
+
+def etapa(nome):
+    """Mede o bloco na medição ativa (sem medição ativa, não faz nada)."""
+    medicoes = _atual.get()
+    return medicoes.etapa(nome) if medicoes is not None else nullcontext()
+
+
+@contextmanager
+def medir(nome, medir_memoria=False, caminho=None):
+    """Mede o bloco como etapa da medição ativa ou, sem uma, numa ``Medicoes`` própria.
+
+    A medição própria é somada em ``acumulado`` e, com ``caminho``,
+    exportada como as demais.
+    """
+    if _atual.get() is not None:
+        with etapa(nome):
+            yield
+        return
+    with Medicoes(nome, medir_memoria) as medicoes, medicoes.etapa(nome):
+        yield
+    if caminho:
+        medicoes.exportar(caminho)
+
+
+def com_contagem_de_cache(decorador_cache, nome=None):
+    """Aplica ``decorador_cache`` à função e conta acertos e falhas na medição ativa.
+
+    Uma falha é detectada quando o corpo da função chega a executar. A
+    chamada inteira (acerto ou falha) é medida como uma etapa.
+    """
+    def decorar(funcao):
+        rotulo = nome or funcao.__name__
+        executando = threading.local()
+
+        @functools.wraps(funcao)
+        def corpo(*args, **kwargs):
+            executando.falhas = getattr(executando, "falhas", 0) + 1
+            return funcao(*args, **kwargs)
+
+        cacheada = decorador_cache(corpo)
+
+        @functools.wraps(funcao)
+        def chamada(*args, **kwargs):
+            antes = getattr(executando, "falhas", 0)
+            with etapa(f"cache:{rotulo}"):
+                resultado = cacheada(*args, **kwargs)
+            medicoes = _atual.get()
+            if medicoes is not None:
+                medicoes.registrar_cache(rotulo, acerto=getattr(executando, "falhas", 0) == antes)
+            return resultado
+
+        chamada.clear = getattr(cacheada, "clear", None)
+        return chamada
+    return decorar
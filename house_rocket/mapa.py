@@ -0,0 +1,102 @@
+"""Camadas do mapa geográfico com payload reduzido.
+
+Só as colunas usadas na posição e no tooltip são enviadas ao navegador,
+em tipos compactos. Acima de ``LIMITE_PONTOS`` casas, os pontos são
+agregados no servidor numa grade regular e o mapa recebe uma coluna por
+célula (contagem e preço médio) em vez de um ponto por casa. Casas sem
+posição, preço ou preço de referência da região ficam fora do mapa: os
+tipos inteiros compactos não representam valores ausentes.
+"""
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+from house_rocket.espacial import KM_POR_GRAU
+
+
+LIMITE_PONTOS = 20000
+
+TOOLTIP_PONTOS = {
+    "html": "<b>Preço:</b> ${price}<br><b>Média da Região:</b> ${avg_price_region}<br><b>Condição:</b> {condition}<br><b>Quartos:</b> {bedrooms}<br><b>Banheiros:</b> {bathrooms}",
+    "style": {"color": "white"}
+}
+
+TOOLTIP_GRADE = {
+    "html": "<b>Casas:</b> {n}<br><b>Preço Médio:</b> ${price_mean}<br><b>Média da Região:</b> ${avg_price_region}",
+    "style": {"color": "white"}
+}
+
+# Colunas enviadas ao navegador no modo de pontos e seus tipos. As
+# coordenadas vão arredondadas em 5 casas (~1 m): o JSON de um float32
+# convertido teria 17 dígitos.
+COLUNAS_PONTOS = {
+    "long": "float64",
+    "lat": "float64",
+    "price": "int32",
+    "avg_price_region": "int32",
+    "condition": "int8",
+    "bedrooms": "int8",
+    "bathrooms": "int8",
+}
+
+
+def dados_pontos(casas):
+    """Apenas as colunas do tooltip, em tipos compactos."""
+    return pd.DataFrame({
+        c: np.round(casas[c].to_numpy(dtype="float64"), 0 if t.startswith("int") else 5).astype(t)
+        for c, t in COLUNAS_PONTOS.items()
+    })
+
+
+def agregar_em_grade(casas, celula_km=1.0):
+    """Agrupa as casas em células de ``celula_km`` (centroide, contagem e médias)."""
+    lat = casas["lat"].to_numpy(dtype="float64")
+    long = casas["long"].to_numpy(dtype="float64")
+    dlat = celula_km / KM_POR_GRAU
+    dlong = celula_km / (KM_POR_GRAU * np.cos(np.radians(lat.mean())))
+    linha = ((lat - lat.min()) // dlat).astype("int64")
+    coluna = ((long - long.min()) // dlong).astype("int64")
+    _, grupo = np.unique(linha * (coluna.max() + 1) + coluna, return_inverse=True)
+
+    n = np.bincount(grupo)
+    media = lambda v: np.bincount(grupo, weights=v) / n
+    return pd.DataFrame({
+        "long": np.round(media(long), 5),
+        "lat": np.round(media(lat), 5),
+        "n": n.astype("int32"),
+        "price_mean": np.round(media(casas["price"].to_numpy(dtype="float64"))).astype("int32"),
+        "avg_price_region": np.round(media(casas["avg_price_region"].to_numpy(dtype="float64"))).astype("int32"),
+    })
+
+
+def _com_valores(casas):
+    """Casas com todas as colunas enviadas ao mapa preenchidas."""
+    return casas.dropna(subset=list(COLUNAS_PONTOS))
+
+
+def camada_mapa(casas, limite_pontos=LIMITE_PONTOS, celula_km=1.0):
+    """Camada pydeck e tooltip para as casas; agrega em grade acima do limite."""
+    casas = _com_valores(casas)
+    if len(casas) <= limite_pontos:
+        layer = pdk.Layer(
+            "ScatterplotLayer",
+            dados_pontos(casas),
+            get_position=["long", "lat"],
+            get_color=[0, 0, 255, 140],
+            get_radius=100,
+            pickable=True,
+        )
+        return layer, TOOLTIP_PONTOS
+
+    layer = pdk.Layer(
+        "ColumnLayer",
+        agregar_em_grade(casas, celula_km),
+        get_position=["long", "lat"],
+        get_elevation="n",
+        elevation_scale=20,
+        radius=celula_km * 400,
+        get_fill_color=[0, 0, 255, 140],
+        extruded=True,
+        pickable=True,
+    )
+    return layer, TOOLTIP_GRADE
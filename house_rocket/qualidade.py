@@ -0,0 +1,223 @@
+"""Qualidade dos dados e estatísticas robustas por CEP.
+
+``verificar_qualidade`` marca, para cada venda, valores impossíveis (preço
+ou área não positivos, área por quarto irreal, porão e andares que não
+somam a área, reforma antes da construção ...), vendas repetidas da mesma
+casa (``duplicada`` para a mesma data; ``revenda`` para outra data) e
+preços extremos dentro do CEP pelo desvio absoluto mediano (MAD) do log do
+preço.
+
+Os quantis por CEP vêm de um esboço de baldes logarítmicos (no estilo do
+DDSketch): cada preço cai no balde ``ceil(log(preço) / log(gama))``, com
+erro relativo de no máximo ``ALFA_ESBOCO`` nos quantis. O esboço é uma
+contagem por (zipcode, balde), então esboços de partes diferentes dos dados
+(blocos, vendas novas) são combinados somando as contagens, como as somas
+de ``agregados``. Mediana aproximada, percentis e média aparada saem dele.
+
+As estatísticas robustas deixam de fora as vendas excluídas (impossíveis
+ou duplicadas) e as de preço extremo. As excluídas saem já na contagem;
+duplicadas só são reconhecidas dentro da mesma parte dos dados. Os preços
+extremos dependem da mediana e do MAD do CEP inteiro e saem depois de
+combinar as contagens (``nao_extremos``): no esboço, pelo valor de cada
+balde.
+"""
+import numpy as np
+import pandas as pd
+
+
+# Mesma casa: mesmo CEP, posição, áreas e ano de construção
+CHAVE_CASA = ["zipcode", "lat", "long", "sqft_living", "sqft_lot", "yr_built"]
+
+# Escore robusto (|log preço - mediana do CEP| / (1,4826 × MAD)) a partir do qual o preço é extremo
+LIMITE_MAD = 5.0
+AREA_MIN_POR_QUARTO = 100
+
+ALFA_ESBOCO = 0.01
+CORTE_MEDIA_APARADA = 0.1
+
+
+# =========================================
+#           Qualidade por venda
+# =========================================
+
+def valores_impossiveis(df):
+    """Máscara das vendas com algum valor fisicamente impossível ou incoerente."""
+    price = df["price"].to_numpy(dtype="float64")
+    living = df["sqft_living"].to_numpy(dtype="int64")
+    quartos = df["bedrooms"].to_numpy(dtype="int64")
+    yr_built = df["yr_built"].to_numpy(dtype="int64")
+    yr_renovated = df["yr_renovated"].to_numpy(dtype="int64")
+    m = ~np.isfinite(price) | (price <= 0)
+    m |= (living <= 0) | (df["sqft_lot"].to_numpy() <= 0)
+    m |= (quartos > 0) & (living < AREA_MIN_POR_QUARTO * quartos)
+    m |= df["sqft_above"].to_numpy(dtype="int64") + df["sqft_basement"].to_numpy(dtype="int64") != living
+    m |= (yr_renovated > 0) & (yr_renovated < yr_built)
+    m |= ~df["condition"].between(1, 5).to_numpy() | ~df["grade"].between(1, 13).to_numpy()
+    if "date" in df.columns:
+        # casas vendidas na planta podem ficar prontas no ano seguinte
+        m |= yr_built > df["date"].dt.year.to_numpy() + 1
+    return m
+
+
+def escore_robusto(valores, grupos):
+    """|valor - mediana do grupo| / (1,4826 × MAD do grupo); 0 onde o MAD é 0."""
+    valores = pd.Series(np.asarray(valores, dtype="float64"))
+    grupos = np.asarray(grupos)
+    mediana = valores.groupby(grupos).transform("median")
+    desvio = (valores - mediana).abs()
+    mad = desvio.groupby(grupos).transform("median") * 1.4826
+    escore = np.divide(desvio.to_numpy(), mad.to_numpy(), out=np.zeros(len(valores)), where=mad.to_numpy() > 0)
+    return escore
+
+
+def vendas_excluidas(df):
+    """Máscara das vendas impossíveis ou que repetem casa, data e preço de uma venda anterior."""
+    return valores_impossiveis(df) | df.duplicated(CHAVE_CASA + ["date", "price"]).to_numpy()
+
+
+def verificar_qualidade(df):
+    """Marcas de qualidade de cada venda, indexadas como ``df``.
+
+    Colunas: ``valor_impossivel``, ``duplicada`` (repete casa, data e preço
+    de uma venda anterior), ``revenda`` (mesma casa vendida antes em outra
+    data; informativo), ``escore_robusto``, ``preco_extremo`` e ``excluir``
+    (impossível ou duplicada: fora do cálculo do escore robusto).
+    """
+    impossivel = valores_impossiveis(df)
+    duplicada = df.duplicated(CHAVE_CASA + ["date", "price"]).to_numpy()
+    revenda = df.duplicated(CHAVE_CASA).to_numpy() & ~duplicada
+    validas = ~(impossivel | duplicada)
+    escore = np.full(len(df), np.nan)
+    escore[validas] = escore_robusto(np.log(df["price"].to_numpy(dtype="float64")[validas]),
+                                     df["zipcode"].to_numpy()[validas])
+    return pd.DataFrame({
+        "valor_impossivel": impossivel,
+        "duplicada": duplicada,
+        "revenda": revenda,
+        "escore_robusto": escore,
+        "preco_extremo": escore > LIMITE_MAD,
+        "excluir": ~validas,
+    }, index=df.index)
+
+
+def resumo_qualidade(marcas):
+    """Número de vendas em cada marca de qualidade."""
+    return marcas.drop(columns="escore_robusto").sum().astype("int64").rename("vendas")
+
+
+# =========================================
+#      Esboço de quantis por CEP
+# =========================================
+
+def mediana_por_grupo(grupos, valores, pesos):
+    """Mediana de ``valores`` em cada grupo, com ``pesos`` inteiros (contagens de cada valor).
+
+    Como ``median`` do pandas: média dos dois valores do meio quando a
+    contagem do grupo é par. Devolve (grupos únicos, medianas).
+    """
+    ordem = np.lexsort((valores, grupos))
+    grupos, valores = np.asarray(grupos)[ordem], np.asarray(valores)[ordem]
+    acumulado = np.cumsum(np.asarray(pesos)[ordem])
+    unicos, inicio = np.unique(grupos, return_index=True)
+    fim = np.r_[inicio[1:], len(grupos)]
+    antes = np.r_[0, acumulado[fim[:-1] - 1]]
+    n = acumulado[fim - 1] - antes
+
+    def valor_na_posicao(k):
+        # k-ésimo valor (a partir de 0) de cada grupo, em ordem crescente
+        return valores[np.searchsorted(acumulado, antes + k, side="right")]
+
+    return unicos, (valor_na_posicao((n - 1) // 2) + valor_na_posicao(n // 2)) / 2
+
+
+def nao_extremos(grupos, precos, pesos):
+    """Máscara dos preços com escore robusto do log de até ``LIMITE_MAD`` no grupo, a partir de contagens."""
+    grupos, log_preco = np.asarray(grupos), np.log(np.asarray(precos, dtype="float64"))
+    unicos, mediana = mediana_por_grupo(grupos, log_preco, pesos)
+    posicao = np.searchsorted(unicos, grupos)
+    desvio = np.abs(log_preco - mediana[posicao])
+    _, mad = mediana_por_grupo(grupos, desvio, pesos)
+    mad = mad[posicao] * 1.4826
+    return (mad == 0) | (desvio <= LIMITE_MAD * mad)
+
+
+def _gama(alfa=ALFA_ESBOCO):
+    return (1 + alfa) / (1 - alfa)
+
+
+def esboco_por_zipcode(df, alfa=ALFA_ESBOCO):
+    """Contagem de vendas por (zipcode, balde logarítmico do preço).
+
+    Vendas impossíveis ou duplicadas ficam de fora. Esboços de partes dos
+    dados são combinados somando as contagens (``combinar_somas``).
+    """
+    validas = ~vendas_excluidas(df)
+    price = df["price"].to_numpy(dtype="float64")[validas]
+    balde = np.ceil(np.log(price) / np.log(_gama(alfa))).astype("int32")
+    contagem = pd.DataFrame({"n": np.ones(len(price), dtype="int64")})
+    esboco = contagem.groupby([df["zipcode"].to_numpy()[validas], balde]).sum()
+    esboco.index.names = ["zipcode", "balde"]
+    return esboco
+
+
+def _valor_do_balde(balde, alfa=ALFA_ESBOCO):
+    gama = _gama(alfa)
+    return 2 * gama ** np.asarray(balde, dtype="float64") / (gama + 1)
+
+
+def _acumulado(esboco, alfa=ALFA_ESBOCO):
+    """(zipcode, valor do balde, contagem, contagem acumulada, total do CEP) em arrays, sem preços extremos."""
+    esboco = esboco[esboco["n"] > 0].sort_index()
+    zipcode = esboco.index.get_level_values("zipcode").to_numpy()
+    valor = _valor_do_balde(esboco.index.get_level_values("balde"), alfa)
+    n = esboco["n"].to_numpy(dtype="float64")
+    ok = nao_extremos(zipcode, valor, n)
+    zipcode, valor, n = zipcode[ok], valor[ok], n[ok]
+    acumulado = pd.Series(n).groupby(zipcode).cumsum().to_numpy()
+    total = pd.Series(n).groupby(zipcode).transform("sum").to_numpy()
+    return zipcode, valor, n, acumulado, total
+
+
+def quantis_do_esboco(esboco, quantis=(0.5,), alfa=ALFA_ESBOCO):
+    """Quantis aproximados do preço por CEP.
+
+    O erro relativo é de no máximo ``alfa`` em relação à venda de posto
+    ``q·(n-1)`` (arredondado para baixo).
+    """
+    zipcode, valor, _, acumulado, total = _acumulado(esboco, alfa)
+    unicos = np.unique(zipcode)
+    colunas = {q: _valor_no_posto(zipcode, valor, acumulado, q * (total - 1), unicos) for q in quantis}
+    return pd.DataFrame(colunas, index=pd.Index(unicos, name="zipcode"))
+
+
+def mediana_do_esboco(esboco, alfa=ALFA_ESBOCO):
+    """Mediana aproximada do preço por CEP pelo esboço.
+
+    Como ``median`` do pandas: média dos dois postos do meio quando a
+    contagem do CEP é par. Cada posto tem erro relativo de no máximo
+    ``alfa``; como os preços extremos são decididos pelo valor do balde,
+    algumas vendas na fronteira de ``LIMITE_MAD`` podem mudar o posto.
+    """
+    zipcode, valor, _, acumulado, total = _acumulado(esboco, alfa)
+    unicos = np.unique(zipcode)
+    baixo = _valor_no_posto(zipcode, valor, acumulado, (total - 1) // 2, unicos)
+    alto = _valor_no_posto(zipcode, valor, acumulado, total // 2, unicos)
+    return pd.Series((baixo + alto) / 2, index=pd.Index(unicos, name="zipcode"), name="price")
+
+
+def _valor_no_posto(zipcode, valor, acumulado, posto, unicos):
+    # valor do primeiro balde de cada CEP cuja contagem acumulada passa do posto (a partir de 0)
+    atinge = acumulado > posto
+    primeiro = pd.Series(np.where(atinge, np.arange(len(zipcode)), len(zipcode))).groupby(zipcode).min()
+    return valor[primeiro.reindex(unicos).to_numpy()]
+
+
+def media_aparada_do_esboco(esboco, corte=CORTE_MEDIA_APARADA, alfa=ALFA_ESBOCO):
+    """Média do preço por CEP sem a fração ``corte`` de cada ponta, pelo esboço."""
+    zipcode, valor, n, acumulado, total = _acumulado(esboco, alfa)
+    inicio = acumulado - n
+    # parte de cada balde que fica entre os postos corte·n e (1 - corte)·n
+    dentro = np.clip(np.minimum(acumulado, (1 - corte) * total) - np.maximum(inicio, corte * total), 0, None)
+    soma = pd.Series(dentro * valor).groupby(zipcode).sum()
+    peso = pd.Series(dentro).groupby(zipcode).sum()
+    return (soma / peso).rename_axis("zipcode")
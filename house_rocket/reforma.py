@@ -0,0 +1,114 @@
+"""Impacto das reformas a partir de tabelas de consulta por nível.
+
+O preço médio de cada condição e de cada qualidade (grade) fica num array
+NumPy pequeno indexado pelo próprio nível, de modo que o incremento de
+todas as casas — inclusive em cenários de melhoria em vários níveis de
+condição e qualidade ao mesmo tempo — é uma indexação vetorizada, sem
+``merge`` nem cópia do conjunto de vendas.
+
+A valorização estatística de cada caminho de reforma vem de um modelo
+hedônico ajustado aos dados (``estimar_uplift``), com intervalo de confiança.
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from house_rocket.regressao import ModeloHedonico
+from house_rocket.triagem import top_k_decrescente
+
+
+def tabela_por_nivel(medias):
+    """Array indexado pelo nível (0 .. máximo) com NaN nos níveis sem vendas."""
+    tabela = np.full(int(medias.index.max()) + 1, np.nan)
+    tabela[medias.index.to_numpy()] = medias.to_numpy()
+    return tabela
+
+
+class MotorReforma:
+    """Incrementos de preço por melhoria de condição e de qualidade."""
+
+    def __init__(self, df, media_condicao, media_grade):
+        self.indice = df.index.to_numpy()
+        self.price = df["price"].to_numpy(dtype="float64")
+        self.condition = df["condition"].to_numpy().astype("int64")
+        self.grade = df["grade"].to_numpy().astype("int64")
+        self.media_condicao = tabela_por_nivel(media_condicao)
+        self.media_grade = tabela_por_nivel(media_grade)
+
+    def incrementos(self):
+        """Diferença entre o preço médio do nível atual e o preço de cada casa."""
+        return (
+            self.media_condicao[self.condition] - self.price,
+            self.media_grade[self.grade] - self.price,
+        )
+
+    def top_incrementos(self, k=10):
+        """As ``k`` casas com maior incremento pela condição (desempate pela qualidade)."""
+        inc_condicao, inc_grade = self.incrementos()
+        pos = top_k_decrescente(inc_condicao, k, desempate=inc_grade)
+        return pd.DataFrame({
+            "condition": self.condition[pos],
+            "grade": self.grade[pos],
+            "price_increment_condition": inc_condicao[pos],
+            "price_increment_grade": inc_grade[pos],
+        }, index=self.indice[pos])
+
+    def ganho_cenario(self, niveis_condicao=0, niveis_grade=0):
+        """Ganho esperado de subir ``niveis_condicao`` e ``niveis_grade`` ao mesmo tempo.
+
+        O ganho é a soma das diferenças entre o preço médio do nível de
+        destino e o do nível atual. É NaN quando o destino não existe nos dados.
+        """
+        def salto(tabela, nivel, niveis):
+            destino = nivel + niveis
+            ganho = np.full(len(nivel), np.nan)
+            ok = destino < len(tabela)
+            ganho[ok] = tabela[destino[ok]] - tabela[nivel[ok]]
+            return ganho
+
+        return (salto(self.media_condicao, self.condition, niveis_condicao)
+                + salto(self.media_grade, self.grade, niveis_grade))
+
+    def top_cenario(self, niveis_condicao=0, niveis_grade=0, k=10):
+        """As ``k`` casas com maior ganho esperado no cenário."""
+        ganho = self.ganho_cenario(niveis_condicao, niveis_grade)
+        validos = np.flatnonzero(~np.isnan(ganho))
+        pos = validos[top_k_decrescente(ganho[validos], k)]
+        return pd.DataFrame({
+            "price": self.price[pos],
+            "condition": self.condition[pos],
+            "grade": self.grade[pos],
+            "ganho_esperado": ganho[pos],
+            "preco_pos_reforma": self.price[pos] + ganho[pos],
+        }, index=self.indice[pos])
+
+
+def ajustar_modelo_reforma(df):
+    """Modelo hedônico de log(price) com efeitos fixos de CEP, grade, condição e área."""
+    return ModeloHedonico().ajustar(df)
+
+
+def estimar_uplift(modelo, df, niveis_condicao=0, niveis_grade=1, confianca=0.95):
+    """Valorização esperada de cada casa de ``df`` ao subir de nível, com intervalo.
+
+    O efeito em log(price) vem do contraste entre os coeficientes dos níveis
+    de destino e atual; o intervalo de confiança é calculado na escala log e
+    convertido para dólares. Casas sem nível de destino no modelo ficam NaN.
+    """
+    condition = df["condition"].to_numpy().astype("int64")
+    grade = df["grade"].to_numpy().astype("int64")
+    delta, erro = modelo.contraste([
+        ("condition", condition, condition + niveis_condicao),
+        ("grade", grade, grade + niveis_grade),
+    ])
+    z = NormalDist().inv_cdf(0.5 + confianca / 2)
+    price = df["price"].to_numpy(dtype="float64")
+    return pd.DataFrame({
+        "price": price,
+        "percentual_aumento": np.expm1(delta) * 100,
+        "uplift": price * np.expm1(delta),
+        "uplift_ic_inferior": price * np.expm1(delta - z * erro),
+        "uplift_ic_superior": price * np.expm1(delta + z * erro),
+        "preco_pos_reforma": price * np.exp(delta),
+    }, index=df.index)
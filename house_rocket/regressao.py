@@ -0,0 +1,174 @@
+"""Regressão hedônica do log do preço por equações normais.
+
+O modelo é log(price) ~ efeitos fixos de uma categórica (por padrão o CEP)
++ dummies das demais categóricas (nível mais baixo como base) + variáveis
+contínuas. O ajuste acumula X'X, X'y e y'y bloco a bloco, então o custo
+de memória não depende do número de vendas e blocos de partes diferentes
+dos dados podem ser somados antes de resolver o sistema. X nunca é montada
+densa no ajuste nem na previsão: cada linha é guardada pelas posições das
+suas colunas ativas (``termos``).
+"""
+import numpy as np
+
+
+class ModeloHedonico:
+    """Modelo linear de log(price) com efeitos fixos e dummies de nível.
+
+    ``categoricas[0]`` recebe efeitos fixos completos (sem intercepto); as
+    demais usam o menor nível como referência.
+    """
+
+    def __init__(self, categoricas=("zipcode", "grade", "condition"),
+                 continuas=("log_sqft_living", "log_sqft_lot"), niveis=None):
+        self.categoricas = tuple(categoricas)
+        self.continuas = tuple(continuas)
+        self.niveis = dict(niveis) if niveis else {}
+        self.coef = None
+        self.cov = None
+
+    # -------------------------------------------------------------
+    # Matriz de delineamento
+    # -------------------------------------------------------------
+    def definir_niveis(self, df):
+        """Níveis de cada categórica ainda não informados, lidos de ``df``."""
+        for c in self.categoricas:
+            if c not in self.niveis:
+                self.niveis[c] = np.unique(df[c].to_numpy())
+        self._posicoes()
+
+    def _posicoes(self):
+        """Coluna de cada nível na matriz (-1 para o nível de referência)."""
+        self.colunas = {}
+        inicio = 0
+        for i, c in enumerate(self.categoricas):
+            n_niveis = len(self.niveis[c])
+            if i == 0:
+                pos = np.arange(n_niveis) + inicio
+            else:
+                pos = np.r_[-1, np.arange(n_niveis - 1) + inicio]
+            self.colunas[c] = pos
+            inicio += len(pos) - (0 if i == 0 else 1)
+        self.colunas_continuas = {c: inicio + j for j, c in enumerate(self.continuas)}
+        self.p = inicio + len(self.continuas)
+
+    def coluna_do_nivel(self, categorica, valores):
+        """Coluna de cada valor (-1 = referência, -2 = nível desconhecido)."""
+        niveis = np.asarray(self.niveis[categorica])
+        pos = np.searchsorted(niveis, valores)
+        pos = np.minimum(pos, len(niveis) - 1)
+        conhecido = niveis[pos] == valores
+        return np.where(conhecido, self.colunas[categorica][pos], -2)
+
+    def termos(self, df):
+        """Coluna ativa de cada categórica (n × c; -1 = referência), contínuas (n × k) e linhas válidas.
+
+        É a forma esparsa de X: cada linha tem no máximo um 1 por categórica,
+        então basta guardar a posição dele.
+        """
+        n = len(df)
+        validas = np.ones(n, dtype=bool)
+        ativas = np.empty((n, len(self.categoricas)), dtype="int64")
+        for i, c in enumerate(self.categoricas):
+            ativas[:, i] = self.coluna_do_nivel(c, df[c].to_numpy())
+            validas &= ativas[:, i] != -2
+        continuas = np.empty((n, len(self.continuas)))
+        for j, c in enumerate(self.continuas):
+            continuas[:, j] = df[c].to_numpy(dtype="float64")
+        return ativas, continuas, validas
+
+    # -------------------------------------------------------------
+    # Ajuste
+    # -------------------------------------------------------------
+    def acumular(self, df, tamanho_bloco=200_000):
+        """Somas X'X, X'y, y'y e n de ``df``, calculadas em blocos.
+
+        X'X sai de contagens (``bincount``) dos pares de colunas ativas, sem
+        montar a matriz densa de cada bloco.
+        """
+        p = self.p
+        XtX = np.zeros((p, p))
+        Xty = np.zeros(p)
+        yty, n = 0.0, 0
+        cols_cont = list(self.colunas_continuas.values())
+        for inicio in range(0, len(df), tamanho_bloco):
+            bloco = df.iloc[inicio:inicio + tamanho_bloco]
+            ativas, continuas, validas = self.termos(bloco)
+            y = np.log(bloco["price"].to_numpy(dtype="float64"))
+            ativas, continuas, y = ativas[validas], continuas[validas], y[validas]
+            for i in range(ativas.shape[1]):
+                a = ativas[:, i]
+                tem_a = a >= 0
+                for j in range(ativas.shape[1]):
+                    b = ativas[:, j]
+                    tem = tem_a & (b >= 0)
+                    XtX += np.bincount(a[tem] * p + b[tem], minlength=p * p).reshape(p, p)
+                for k, col in enumerate(cols_cont):
+                    soma = np.bincount(a[tem_a], weights=continuas[tem_a, k], minlength=p)
+                    XtX[:, col] += soma
+                    XtX[col, :] += soma
+                Xty += np.bincount(a[tem_a], weights=y[tem_a], minlength=p)
+            XtX[np.ix_(cols_cont, cols_cont)] += continuas.T @ continuas
+            Xty[cols_cont] += continuas.T @ y
+            yty += y @ y
+            n += len(y)
+        return XtX, Xty, yty, n
+
+    def resolver(self, XtX, Xty, yty, n):
+        """Coeficientes e covariância a partir das somas acumuladas."""
+        self.coef = np.linalg.lstsq(XtX, Xty, rcond=None)[0]
+        self.sigma2 = max(yty - self.coef @ Xty, 0.0) / max(n - self.p, 1)
+        self.cov = self.sigma2 * np.linalg.pinv(XtX)
+        self.n = n
+        return self
+
+    def ajustar(self, df, tamanho_bloco=200_000):
+        """Ajusta o modelo a ``df``; devolve o próprio modelo."""
+        self.definir_niveis(df)
+        return self.resolver(*self.acumular(df, tamanho_bloco))
+
+    def prever_log(self, df):
+        """log(price) previsto para cada linha (NaN para níveis desconhecidos).
+
+        Soma os coeficientes das colunas ativas (consulta em tabela) ao termo
+        das contínuas, sem montar X.
+        """
+        ativas, continuas, validas = self.termos(df)
+        coef = np.append(self.coef, 0.0)           # posição p = nível de referência
+        previsto = coef[np.where(ativas >= 0, ativas, self.p)].sum(axis=1)
+        previsto += continuas @ self.coef[list(self.colunas_continuas.values())]
+        return np.where(validas, previsto, np.nan)
+
+    # -------------------------------------------------------------
+    # Contrastes entre níveis
+    # -------------------------------------------------------------
+    def contraste(self, mudancas):
+        """Efeito em log(price) de trocar níveis, com seu erro padrão.
+
+        ``mudancas`` é uma lista de (categorica, niveis_atuais, niveis_novos)
+        com arrays do mesmo tamanho. Devolve (delta, erro_padrao); ambos são
+        NaN onde algum nível não existe no modelo.
+        """
+        coef = np.append(self.coef, 0.0)           # posição p = nível de referência
+        cov = np.zeros((self.p + 1, self.p + 1))
+        cov[:self.p, :self.p] = self.cov
+
+        colunas, sinais, invalido = [], [], None
+        for c, atuais, novos in mudancas:
+            de = self.coluna_do_nivel(c, np.asarray(atuais))
+            para = self.coluna_do_nivel(c, np.asarray(novos))
+            ruim = (de == -2) | (para == -2)
+            invalido = ruim if invalido is None else invalido | ruim
+            colunas += [np.where(para >= 0, para, self.p), np.where(de >= 0, de, self.p)]
+            sinais += [1.0, -1.0]
+
+        # poucas combinações de colunas se repetem em todas as casas: calcula uma vez por combinação
+        todas = np.column_stack(colunas)
+        codigo = todas @ (self.p + 1) ** np.arange(todas.shape[1], dtype="int64")
+        _, primeira, inversa = np.unique(codigo, return_index=True, return_inverse=True)
+        idx = todas[primeira]
+        s = np.array(sinais)
+        delta = (coef[idx] * s).sum(axis=1)[inversa]
+        var = (cov[idx[:, :, None], idx[:, None, :]] * np.outer(s, s)).sum(axis=(1, 2))[inversa]
+        delta[invalido] = np.nan
+        var[invalido] = np.nan
+        return delta, np.sqrt(np.maximum(var, 0))
@@ -0,0 +1,175 @@
+"""Índices de preço semanais e mensais, por CEP e para o mercado todo.
+
+A média simples do preço de um mês mistura o efeito do tempo com o tipo
+de casa vendida naquele mês. Para separar os dois, cada venda recebe o
+resíduo de um modelo hedônico sem termos de tempo (CEP, qualidade,
+condição, área): a média dos resíduos de um período é o índice ajustado
+pelo mix. As somas de preço e de resíduo ficam num cubo CEP × período,
+de modo que qualquer combinação de CEPs e intervalo de datas é respondida
+somando fatias do cubo, sem filtrar nem copiar as vendas.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+GRANULARIDADES = {"mes": "MS", "semana": "W-MON"}
+
+
+def periodos(datas, granularidade="mes", inicio=None, fim=None):
+    """Número do período de cada data e o início de cada período.
+
+    ``inicio`` e ``fim`` fixam o intervalo coberto (por padrão, o das
+    próprias datas), para que partes diferentes dos dados usem os mesmos
+    períodos.
+    """
+    datas = pd.DatetimeIndex(datas)
+    inicio = pd.Timestamp(inicio) if inicio is not None else datas.min()
+    fim = pd.Timestamp(fim) if fim is not None else datas.max()
+    if granularidade == "mes":
+        numero = (datas.year - inicio.year) * 12 + (datas.month - inicio.month)
+        total = (fim.year - inicio.year) * 12 + (fim.month - inicio.month) + 1
+        primeiro = inicio.to_period("M").start_time
+    elif granularidade == "semana":
+        primeiro = (inicio - pd.Timedelta(days=inicio.weekday())).normalize()
+        numero = (datas - primeiro).days // 7
+        total = (fim - primeiro).days // 7 + 1
+    else:
+        raise ValueError(f"granularidade desconhecida: {granularidade!r}")
+    numero = np.asarray(numero, dtype="int64")
+    return numero, pd.date_range(primeiro, periods=int(total), freq=GRANULARIDADES[granularidade])
+
+
+@dataclass
+class CuboSazonal:
+    """Somas por CEP × período: contagem, preço e resíduo do modelo hedônico."""
+    granularidade: str
+    zipcodes: np.ndarray
+    periodos: pd.DatetimeIndex
+    n: np.ndarray
+    soma_price: np.ndarray
+    n_residuo: np.ndarray
+    soma_residuo: np.ndarray
+
+    def _linhas(self, zipcodes):
+        if not zipcodes:
+            return slice(None)
+        return np.flatnonzero(np.isin(self.zipcodes, list(zipcodes)))
+
+    def _colunas(self, inicio, fim):
+        ok = np.ones(len(self.periodos), dtype=bool)
+        if inicio is not None:
+            ok &= self.periodos >= pd.Timestamp(inicio)
+        if fim is not None:
+            ok &= self.periodos <= pd.Timestamp(fim)
+        return ok
+
+    def serie(self, zipcodes=(), inicio=None, fim=None):
+        """Série por período para os CEPs dados (vazio = mercado todo).
+
+        Colunas: ``n``, ``price`` (média simples), ``indice`` (exp da média
+        dos resíduos em relação ao seletor todo) e ``preco_ajustado``
+        (preço médio do seletor × índice). Períodos sem vendas são omitidos.
+        """
+        linhas, colunas = self._linhas(zipcodes), self._colunas(inicio, fim)
+        n = self.n[linhas][:, colunas].sum(axis=0)
+        soma_price = self.soma_price[linhas][:, colunas].sum(axis=0)
+        n_res = self.n_residuo[linhas][:, colunas].sum(axis=0)
+        soma_res = self.soma_residuo[linhas][:, colunas].sum(axis=0)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            price = soma_price / n
+            residuo = soma_res / n_res
+            indice = np.exp(residuo - soma_res.sum() / n_res.sum())
+        serie = pd.DataFrame({
+            "n": n,
+            "price": price,
+            "indice": indice,
+            "preco_ajustado": soma_price.sum() / n.sum() * indice,
+        }, index=pd.Index(self.periodos[colunas], name="periodo"))
+        return serie[serie["n"] > 0]
+
+    def tabela(self):
+        """Cubo em formato longo: uma linha por (CEP, período) com vendas."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            residuo = self.soma_residuo / self.n_residuo
+            media_cep = self.soma_residuo.sum(axis=1) / self.n_residuo.sum(axis=1)
+            price = self.soma_price / self.n
+            indice = np.exp(residuo - media_cep[:, None])
+        linha, coluna = np.nonzero(self.n)
+        return pd.DataFrame({
+            "zipcode": self.zipcodes[linha],
+            "periodo": self.periodos[coluna],
+            "n": self.n[linha, coluna],
+            "price": price[linha, coluna],
+            "indice": indice[linha, coluna],
+        })
+
+    def perfil_mes_do_ano(self, zipcodes=()):
+        """Índice ajustado médio por mês do ano (1 a 12), ponderado pelas vendas."""
+        linhas = self._linhas(zipcodes)
+        mes = self.periodos.month.to_numpy() - 1
+        n_res = np.bincount(mes, weights=self.n_residuo[linhas].sum(axis=0), minlength=12)
+        soma_res = np.bincount(mes, weights=self.soma_residuo[linhas].sum(axis=0), minlength=12)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            indice = np.exp(soma_res / n_res - soma_res.sum() / n_res.sum())
+        return pd.Series(indice, index=pd.RangeIndex(1, 13, name="month"), name="indice")
+
+
+def construir_cubo(df, modelo, granularidade="mes", zipcodes=None, inicio=None, fim=None):
+    """Monta o cubo CEP × período a partir das vendas e do modelo hedônico.
+
+    ``zipcodes`` (em ordem crescente), ``inicio`` e ``fim`` fixam as
+    dimensões do cubo (por padrão, as de ``df``); cubos de mesmas dimensões
+    podem ser somados com ``combinar_cubos``. Vendas de CEPs ou datas fora
+    dessas dimensões levantam ``ValueError``.
+    """
+    numero, inicio_periodos = periodos(df["date"], granularidade, inicio, fim)
+    fora = (numero < 0) | (numero >= len(inicio_periodos))
+    if fora.any():
+        datas = df["date"][fora]
+        raise ValueError(f"{fora.sum()} vendas fora do intervalo do cubo ({datas.min():%Y-%m-%d} a {datas.max():%Y-%m-%d})")
+    if zipcodes is None:
+        zipcodes, linha = np.unique(df["zipcode"].to_numpy(), return_inverse=True)
+    else:
+        zipcodes = np.asarray(zipcodes)
+        cep = df["zipcode"].to_numpy()
+        linha = np.searchsorted(zipcodes, cep)
+        conhecido = linha < len(zipcodes)
+        conhecido[conhecido] = zipcodes[linha[conhecido]] == cep[conhecido]
+        if not conhecido.all():
+            raise ValueError(f"CEPs fora do cubo: {np.unique(cep[~conhecido]).tolist()}")
+    celula = linha * len(inicio_periodos) + numero
+    tamanho = len(zipcodes) * len(inicio_periodos)
+    forma = (len(zipcodes), len(inicio_periodos))
+
+    price = df["price"].to_numpy(dtype="float64")
+    residuo = np.log(price) - modelo.prever_log(df)
+    valido = ~np.isnan(residuo)
+
+    def somar(pesos=None, mascara=slice(None)):
+        return np.bincount(celula[mascara], weights=pesos, minlength=tamanho).reshape(forma)
+
+    return CuboSazonal(
+        granularidade=granularidade,
+        zipcodes=zipcodes,
+        periodos=inicio_periodos,
+        n=somar().astype("int32"),
+        soma_price=somar(price),
+        n_residuo=somar(mascara=valido).astype("int32"),
+        soma_residuo=somar(residuo[valido], valido),
+    )
+
+
+def combinar_cubos(a, b):
+    """Soma dois cubos com os mesmos CEPs e períodos."""
+    return CuboSazonal(
+        granularidade=a.granularidade,
+        zipcodes=a.zipcodes,
+        periodos=a.periodos,
+        n=a.n + b.n,
+        soma_price=a.soma_price + b.soma_price,
+        n_residuo=a.n_residuo + b.n_residuo,
+        soma_residuo=a.soma_residuo + b.soma_residuo,
+    )
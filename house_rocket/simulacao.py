@@ -0,0 +1,206 @@
+"""Simulação de Monte Carlo do lucro de revenda.
+
+Cada caminho sorteia o preço de revenda a partir do valor previsto pelo
+modelo hedônico mais um resíduo empírico de casas do mesmo CEP e grade
+(ou só do mesmo CEP, ou do mercado, quando o grupo tem poucas vendas), o
+tempo até a revenda, o efeito sazonal do mês de venda, a valorização no
+período e a reforma: a valorização da reforma vem do contraste entre os
+níveis de destino e atual no mesmo modelo hedônico (como em
+``reforma.estimar_uplift``), sorteada com o seu erro padrão, e o custo é
+sorteado em torno do custo médio. As casas são simuladas em blocos NumPy; com
+muitos caminhos, os blocos são distribuídos num pool de processos, cada
+um com sua semente derivada de ``SeedSequence``, então o resultado é o
+mesmo com ou sem paralelismo. Os resíduos e o perfil sazonal vão para os
+trabalhadores uma única vez, na criação do pool; cada tarefa leva só os
+dados das suas casas e a semente.
+"""
+import itertools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+
+MIN_RESIDUOS = 20
+AMOSTRAS_POR_BLOCO = 2_000_000
+LIMIAR_PARALELO = 20_000_000
+PERCENTIS = (5, 50, 95)
+
+# Trabalhadores -> (chave do simulador cujos resíduos o pool recebeu, pool)
+_pools = {}
+_trava_pools = threading.Lock()
+_chaves = itertools.count()
+
+# No processo trabalhador: (resíduos, log do perfil sazonal) recebidos na criação do pool
+_compartilhado = None
+
+
+@dataclass(frozen=True)
+class ParametrosSimulacao:
+    """Premissas da simulação; valores monetários em dólares.
+
+    A reforma sobe ``niveis_condicao`` e ``niveis_grade`` (casas sem o
+    nível de destino não valorizam) e custa ``custo_reforma`` em média.
+    """
+    caminhos: int = 10_000
+    mes_compra: int = 1
+    meses_min: int = 3
+    meses_max: int = 12
+    niveis_condicao: int = 0
+    niveis_grade: int = 0
+    custo_reforma: float = 0.0
+    dispersao_reforma: float = 0.25
+    valorizacao_anual: float = 0.0
+    custo_mensal: float = 0.0
+    semente: int = 0
+
+
+def _grupos(chaves, minimo):
+    """Início e tamanho, na ordem de ``chaves``, do grupo de cada linha (0 se pequeno)."""
+    _, inverso, contagem = np.unique(chaves, return_inverse=True, return_counts=True)
+    inicio = np.r_[0, np.cumsum(contagem)[:-1]]
+    tamanho = np.where(contagem >= minimo, contagem, 0)
+    return inicio[inverso], tamanho[inverso]
+
+
+class SimuladorRevenda:
+    """Guarda os resíduos do modelo por (CEP, grade) e simula o lucro de revenda.
+
+    ``perfil_sazonal`` é o índice por mês do ano (1 a 12), como o de
+    ``CuboSazonal.perfil_mes_do_ano``.
+    """
+
+    def __init__(self, df, modelo, perfil_sazonal, minimo=MIN_RESIDUOS):
+        self.df = df
+        self.modelo = modelo
+        self.chave = next(_chaves)
+        self.log_sazonal = np.log(np.asarray(perfil_sazonal.reindex(range(1, 13)).fillna(1.0), dtype="float64"))
+
+        residuo = np.log(df["price"].to_numpy(dtype="float64")) - modelo.prever_log(df)
+        ok = ~np.isnan(residuo)
+        zipcode = df["zipcode"].to_numpy()[ok].astype("int64")
+        grade = df["grade"].to_numpy()[ok].astype("int64")
+        residuo = residuo[ok]
+
+        # Três níveis de pool concatenados: (CEP, grade), CEP e mercado
+        ordem_zg = np.lexsort((grade, zipcode))
+        ordem_z = np.argsort(zipcode, kind="stable")
+        n = len(residuo)
+        self.residuos = np.concatenate([residuo[ordem_zg], residuo[ordem_z], residuo])
+        self.pools = {}
+        chave_zg = zipcode[ordem_zg] * 100 + grade[ordem_zg]
+        inicio_zg, tamanho_zg = _grupos(chave_zg, minimo)
+        inicio_z, tamanho_z = _grupos(zipcode[ordem_z], minimo)
+        for z, g, i, t in zip(zipcode[ordem_zg], grade[ordem_zg], inicio_zg, tamanho_zg):
+            if t:
+                self.pools[(z, g)] = (i, t)
+        for z, i, t in zip(zipcode[ordem_z], inicio_z + n, tamanho_z):
+            if t:
+                self.pools.setdefault((z, None), (i, t))
+        self.pool_mercado = (2 * n, n)
+
+    def _pool_de(self, zipcode, grade):
+        return self.pools.get((zipcode, grade)) or self.pools.get((zipcode, None)) or self.pool_mercado
+
+    def simular(self, indices, parametros=ParametrosSimulacao(), processos=None):
+        """Percentis do lucro por casa e da carteira formada por ``indices``.
+
+        Devolve (por_casa, carteira): ``por_casa`` é indexado por ``indices``
+        com ``lucro_p5``, ``lucro_p50``, ``lucro_p95``, ``lucro_medio`` e
+        ``prob_prejuizo``; ``carteira`` é uma Series com os mesmos campos
+        para a soma dos lucros das casas em cada caminho.
+        """
+        casas = self.df.loc[list(indices)]
+        previsto = self.modelo.prever_log(casas)
+        price = casas["price"].to_numpy(dtype="float64")
+        previsto = np.where(np.isnan(previsto), np.log(price), previsto)
+        zipcode = casas["zipcode"].to_numpy().astype("int64")
+        grade = casas["grade"].to_numpy().astype("int64")
+        pools = np.array([self._pool_de(z, g) for z, g in zip(zipcode, grade)], dtype="int64").reshape(-1, 2)
+        uplift = self._uplift_log(casas, grade, parametros)
+
+        por_bloco = max(1, AMOSTRAS_POR_BLOCO // parametros.caminhos)
+        blocos = [slice(i, i + por_bloco) for i in range(0, len(casas), por_bloco)]
+        sementes = np.random.SeedSequence(parametros.semente).spawn(len(blocos))
+        tarefas = [(previsto[b], price[b], pools[b], uplift[:, b], parametros, s) for b, s in zip(blocos, sementes)]
+
+        paralelo = (processos or os.cpu_count() or 1) > 1
+        if paralelo and len(casas) * parametros.caminhos >= LIMIAR_PARALELO and len(tarefas) > 1:
+            resultados = list(_executor(processos, self).map(_simular_no_trabalhador, tarefas))
+        else:
+            resultados = [_simular_bloco(t, self.residuos, self.log_sazonal) for t in tarefas]
+
+        resumo = np.concatenate([r[0] for r in resultados]) if resultados else np.empty((0, 5))
+        total = np.sum([r[1] for r in resultados], axis=0) if resultados else np.zeros(parametros.caminhos)
+        colunas = [f"lucro_p{p}" for p in PERCENTIS] + ["lucro_medio", "prob_prejuizo"]
+        por_casa = pd.DataFrame(resumo, index=casas.index, columns=colunas)
+        carteira = pd.Series(_resumir(total[None, :])[0], index=colunas)
+        return por_casa, carteira
+
+    def _uplift_log(self, casas, grade, parametros):
+        """Efeito da reforma em log(price) e seu erro padrão, por casa (0 sem reforma ou sem nível de destino)."""
+        if parametros.niveis_condicao == 0 and parametros.niveis_grade == 0:
+            return np.zeros((2, len(casas)))
+        condition = casas["condition"].to_numpy().astype("int64")
+        delta, erro = self.modelo.contraste([
+            ("condition", condition, condition + parametros.niveis_condicao),
+            ("grade", grade, grade + parametros.niveis_grade),
+        ])
+        return np.nan_to_num(np.vstack([delta, erro]))
+
+
+def _executor(processos, simulador):
+    """Pool de processos com ``processos`` trabalhadores que já recebeu os resíduos de ``simulador``.
+
+    Há um pool por tamanho; um simulador novo (outra versão dos dados)
+    troca o pool, e as tarefas já enviadas ao anterior terminam nele.
+    """
+    tamanho = processos or os.cpu_count()
+    with _trava_pools:
+        chave, executor = _pools.get(tamanho, (None, None))
+        if chave != simulador.chave:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            executor = ProcessPoolExecutor(max_workers=tamanho, mp_context=get_context("spawn"),
+                                           initializer=_iniciar_trabalhador,
+                                           initargs=(simulador.residuos, simulador.log_sazonal))
+            _pools[tamanho] = (simulador.chave, executor)
+        return executor
+
+
+def _iniciar_trabalhador(residuos, log_sazonal):
+    global _compartilhado
+    _compartilhado = (residuos, log_sazonal)
+
+
+def _resumir(lucro):
+    percentis = np.percentile(lucro, PERCENTIS, axis=1).T
+    return np.column_stack([percentis, lucro.mean(axis=1), (lucro < 0).mean(axis=1)])
+
+
+def _simular_no_trabalhador(tarefa):
+    return _simular_bloco(tarefa, *_compartilhado)
+
+
+def _simular_bloco(tarefa, residuos, log_sazonal):
+    """Lucro simulado de um bloco de casas: (resumo por casa, soma por caminho)."""
+    previsto, price, pools, uplift, p, semente = tarefa
+    rng = np.random.default_rng(semente)
+    forma = (len(price), p.caminhos)
+
+    sorteio = pools[:, :1] + (rng.random(forma) * pools[:, 1:]).astype("int64")
+    meses = rng.integers(p.meses_min, p.meses_max + 1, size=forma)
+    mes_revenda = (p.mes_compra - 1 + meses) % 12
+    log_revenda = (previsto[:, None] + residuos[sorteio] + log_sazonal[mes_revenda]
+                   + meses * (np.log1p(p.valorizacao_anual) / 12))
+    if uplift.any():
+        log_revenda += uplift[0][:, None] + uplift[1][:, None] * rng.standard_normal(forma)
+    lucro = np.exp(log_revenda) - price[:, None] * (1 + p.custo_mensal * meses)
+    if p.custo_reforma > 0:
+        s = p.dispersao_reforma
+        lucro -= p.custo_reforma * rng.lognormal(-s * s / 2, s, size=forma)
+    return _resumir(lucro), lucro.sum(axis=0)
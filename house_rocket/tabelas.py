@@ -0,0 +1,104 @@
+"""Tabelas grandes consultadas no servidor: ordenação, filtro e paginação.
+
+Uma ``TabelaPaginada`` guarda o DataFrame completo e devolve só as linhas
+da página pedida, de modo que o navegador recebe dezenas de linhas em vez
+da tabela inteira. A ordem de cada coluna é calculada uma vez (argsort
+estável sobre os arrays NumPy) e reaproveitada nas páginas seguintes;
+filtros são máscaras vetorizadas aplicadas sobre essa ordem.
+
+Filtros são tuplas (coluna, operador, valor) com os operadores de
+``OPERADORES``.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+OPERADORES = ("==", "!=", ">", ">=", "<", "<=", "em", "contem")
+
+
+@dataclass
+class Pagina:
+    """Linhas de uma página e a contagem total depois dos filtros."""
+
+    linhas: pd.DataFrame
+    total: int
+    pagina: int
+    total_paginas: int
+
+
+class TabelaPaginada:
+    """Ordenação, filtro e paginação sobre as colunas de ``tabela``."""
+
+    def __init__(self, tabela):
+        self.tabela = tabela
+        self._ordens = {}
+
+    def __len__(self):
+        return len(self.tabela)
+
+    @property
+    def colunas(self):
+        return list(self.tabela.columns)
+
+    def ordem(self, coluna=None, decrescente=False):
+        """Posições das linhas ordenadas por ``coluna`` (estável, NaN no fim)."""
+        if coluna is None:
+            return np.arange(len(self.tabela))
+        chave = (coluna, decrescente)
+        if chave not in self._ordens:
+            serie = self.tabela[coluna]
+            if pd.api.types.is_datetime64_any_dtype(serie):
+                valores = np.where(serie.isna(), np.nan, serie.to_numpy().view("int64"))
+            elif pd.api.types.is_numeric_dtype(serie):
+                valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+            else:
+                codigos, _ = pd.factorize(serie, sort=True)
+                valores = np.where(codigos >= 0, codigos, np.nan)
+            self._ordens[chave] = np.argsort(-valores if decrescente else valores, kind="stable")
+        return self._ordens[chave]
+
+    def mascara(self, filtros):
+        """Máscara booleana das linhas que passam em todos os ``filtros``."""
+        mascara = np.ones(len(self.tabela), dtype=bool)
+        for coluna, operador, valor in filtros:
+            valores = self.tabela[coluna].to_numpy()
+            if operador == "==":
+                mascara &= valores == valor
+            elif operador == "!=":
+                mascara &= valores != valor
+            elif operador == ">":
+                mascara &= valores > valor
+            elif operador == ">=":
+                mascara &= valores >= valor
+            elif operador == "<":
+                mascara &= valores < valor
+            elif operador == "<=":
+                mascara &= valores <= valor
+            elif operador == "em":
+                mascara &= np.isin(valores, list(valor))
+            elif operador == "contem":
+                mascara &= self.tabela[coluna].astype(str).str.contains(str(valor), case=False, regex=False).to_numpy()
+            else:
+                raise ValueError(f"operador de filtro desconhecido: {operador!r}")
+        return mascara
+
+    def posicoes(self, filtros=(), ordenar_por=None, decrescente=False):
+        """Posições das linhas filtradas, na ordem pedida."""
+        ordem = self.ordem(ordenar_por, decrescente)
+        if filtros:
+            ordem = ordem[self.mascara(filtros)[ordem]]
+        return ordem
+
+    def consultar(self, pagina=1, tamanho=50, ordenar_por=None, decrescente=False, filtros=(), colunas=None):
+        """A ``pagina`` (a partir de 1) de ``tamanho`` linhas; páginas fora do intervalo são ajustadas."""
+        posicoes = self.posicoes(filtros, ordenar_por, decrescente)
+        total = len(posicoes)
+        total_paginas = max(1, -(-total // tamanho))
+        pagina = min(max(1, int(pagina)), total_paginas)
+        inicio = (pagina - 1) * tamanho
+        linhas = self.tabela.iloc[posicoes[inicio:inicio + tamanho]]
+        if colunas is not None:
+            linhas = linhas[list(colunas)]
+        return Pagina(linhas, total, pagina, total_paginas)
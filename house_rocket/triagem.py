@@ -0,0 +1,178 @@
+"""Triagem de imóveis candidatos à compra.
+
+O motor guarda as colunas relevantes como arrays NumPy ordenados por
+(zipcode, price). Cada consulta avalia todos os critérios numa única
+máscara booleana, restrita às faixas contíguas dos CEPs pedidos, e só
+calcula o ROI e o ranking para as linhas aprovadas.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class CriteriosCompra:
+    """Parâmetros da triagem. Tuplas vazias significam "sem restrição"."""
+    grade_min: int = 7
+    condition_min: int = 3
+    quartos: tuple = (3, 4)
+    banheiros_min: int = 2
+    abaixo_da_media: bool = True
+    roi_min: float = 0.0
+    zipcodes: tuple = ()
+    top_k_por_zipcode: int = 0
+    limite: int = 0
+
+
+# Entradas guardadas no ``memo`` de ``MotorTriagem.aprovadas`` antes de recomeçar
+LIMITE_MEMO = 4096
+
+COLUNAS_SAIDA = [
+    "price", "avg_price_region", "zipcode", "bedrooms",
+    "bathrooms", "condition", "grade", "view", "waterfront",
+]
+
+
+def top_k_decrescente(valores, k, desempate=None):
+    """Posições dos ``k`` maiores valores, em ordem decrescente.
+
+    Empates são resolvidos pelo maior ``desempate`` (se informado) e depois
+    pela posição original, como numa ordenação estável.
+    """
+    n = len(valores)
+    if k <= 0 or k >= n:
+        candidatos = np.arange(n)
+    else:
+        limiar = np.partition(valores, n - k)[n - k]
+        candidatos = np.flatnonzero(valores >= limiar)
+    if desempate is None:
+        ordem = np.argsort(-valores[candidatos], kind="stable")
+    else:
+        ordem = np.lexsort((-desempate[candidatos], -valores[candidatos]))
+    return candidatos[ordem[:k]] if k > 0 else candidatos[ordem]
+
+
+def posicao_no_grupo(grupos):
+    """Posição (0, 1, ...) de cada elemento dentro de seu grupo contíguo."""
+    if len(grupos) == 0:
+        return np.empty(0, dtype="int64")
+    inicio = np.empty(len(grupos), dtype=bool)
+    inicio[0] = True
+    np.not_equal(grupos[1:], grupos[:-1], out=inicio[1:])
+    primeiros = np.flatnonzero(inicio)
+    return np.arange(len(grupos)) - primeiros[np.cumsum(inicio) - 1]
+
+
+class MotorTriagem:
+    """Seleciona e ranqueia candidatos à compra a partir de ``CriteriosCompra``.
+
+    ``referencia_log`` é o log1p do preço de referência de cada linha (por
+    padrão a média do log1p do preço no CEP); o ROI é calculado contra ela.
+    """
+
+    def __init__(self, df, referencia_log):
+        ordem = np.lexsort((df["price"].to_numpy(), df["zipcode"].to_numpy()))
+        self.indice = df.index.to_numpy()[ordem]
+        self.colunas = {c: df[c].to_numpy()[ordem] for c in COLUNAS_SAIDA if c != "avg_price_region"}
+        self.log_price = np.log1p(self.colunas["price"].astype("float64"))
+        self.referencia_log = np.asarray(referencia_log, dtype="float64")[ordem]
+
+        zipcodes = self.colunas["zipcode"]
+        self.zipcodes, self._inicio_zipcode = np.unique(zipcodes, return_index=True)
+        self._fim_zipcode = np.r_[self._inicio_zipcode[1:], len(zipcodes)]
+
+    def _faixas(self, zipcodes):
+        if not zipcodes:
+            return [slice(0, len(self.indice))]
+        zipcodes = np.asarray(zipcodes)
+        pos = np.searchsorted(self.zipcodes, zipcodes)
+        validos = pos < len(self.zipcodes)
+        pos = pos[validos][self.zipcodes[pos[validos]] == zipcodes[validos]]
+        return [slice(self._inicio_zipcode[p], self._fim_zipcode[p]) for p in np.sort(pos)]
+
+    def _mascara(self, criterios, faixa):
+        c = self.colunas
+        m = c["grade"][faixa] >= criterios.grade_min
+        m &= c["condition"][faixa] >= criterios.condition_min
+        m &= c["bathrooms"][faixa] >= criterios.banheiros_min
+        if criterios.quartos:
+            quartos = c["bedrooms"][faixa]
+            tabela = np.zeros(max(int(quartos.max(initial=0)), max(criterios.quartos)) + 1, dtype=bool)
+            tabela[list(criterios.quartos)] = True
+            m &= tabela[quartos]
+        if criterios.abaixo_da_media:
+            m &= self.log_price[faixa] < self.referencia_log[faixa]
+        return m
+
+    def aprovadas(self, criterios, memo=None):
+        """Posições internas que passam nos filtros de ``criterios``, CEP a CEP.
+
+        ``memo`` (um dicionário ou um ``cache.MemoLimitado``, se o motor é
+        usado por várias threads) guarda o resultado de cada faixa de CEP por
+        filtro; numa consulta seguinte só as faixas ou filtros novos são
+        avaliados.
+        """
+        filtros = (criterios.grade_min, criterios.condition_min, tuple(criterios.quartos),
+                   criterios.banheiros_min, criterios.abaixo_da_media)
+        if memo is not None and len(memo) > LIMITE_MEMO:
+            memo.clear()
+        partes = []
+        for faixa in self._faixas(tuple(int(z) for z in criterios.zipcodes)):
+            chave = (filtros, faixa.start, faixa.stop)
+            parte = memo.get(chave) if memo is not None else None
+            if parte is None:
+                parte = np.flatnonzero(self._mascara(criterios, faixa)) + faixa.start
+                if memo is not None:
+                    memo[chave] = parte
+            partes.append(parte)
+        return np.concatenate(partes) if partes else np.empty(0, dtype="int64")
+
+    def pontuar(self, criterios=CriteriosCompra(), memo=None):
+        """(posições internas, preço, referência, ROI) dos aprovados, antes do ranking.
+
+        Aplica o ROI mínimo e o limite por CEP, mas não ``limite`` nem a
+        ordenação. ``memo`` é repassado a ``aprovadas``.
+        """
+        sel = self.aprovadas(criterios, memo)
+
+        # preço guardado para a saída; o ROI segue a conta original, sobre os logs
+        price = self.colunas["price"][sel].astype("float64")
+        price_log = np.expm1(self.log_price[sel])
+        referencia = np.expm1(self.referencia_log[sel])
+        roi = (referencia - price_log) / price_log * 100
+
+        if criterios.roi_min > 0:
+            ok = roi >= criterios.roi_min
+            sel, price, referencia, roi = sel[ok], price[ok], referencia[ok], roi[ok]
+
+        if criterios.top_k_por_zipcode > 0:
+            # sel já está agrupado por CEP; ordenar só as linhas aprovadas
+            zip_sel = self.colunas["zipcode"][sel]
+            ordem = np.lexsort((-roi, zip_sel))
+            ok = ordem[posicao_no_grupo(zip_sel[ordem]) < criterios.top_k_por_zipcode]
+            ok.sort()
+            sel, price, referencia, roi = sel[ok], price[ok], referencia[ok], roi[ok]
+        return sel, price, referencia, roi
+
+    def tabela(self, sel, price, referencia, roi):
+        """DataFrame de saída (índice original das vendas) para as posições internas ``sel``."""
+        resultado = pd.DataFrame(
+            {c: self.colunas[c][sel] for c in COLUNAS_SAIDA if c != "avg_price_region"},
+            index=pd.Index(self.indice[sel]),
+        )
+        resultado["price"] = price
+        resultado.insert(1, "avg_price_region", referencia)
+        resultado["ROI (%)"] = roi
+        return resultado
+
+    def selecionar(self, criterios=CriteriosCompra(), memo=None):
+        """Candidatos aprovados, ranqueados por ROI decrescente.
+
+        Devolve um DataFrame indexado pelo índice original das vendas, com as
+        colunas de ``COLUNAS_SAIDA`` e ``ROI (%)``. ``memo`` é repassado a
+        ``aprovadas``.
+        """
+        sel, price, referencia, roi = self.pontuar(criterios, memo)
+        ordem = top_k_decrescente(roi, criterios.limite)
+        return self.tabela(sel[ordem], price[ordem], referencia[ordem], roi[ordem])
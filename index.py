@@ -1,13 +1,40 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
-import seaborn as sns
 from datetime import datetime 
 from streamlit_folium import folium_static
 import pydeck as pdk
+import os
+
+from dataclasses import replace
+
+from house_rocket.analise import selecao_geografica, vendas_marcadas
+from house_rocket.cache import cache_compartilhado, compartilhado
+from house_rocket.carteira import carteira_de_candidatos
+from house_rocket.cenarios import Cenario, HistoricoCenarios, MotorCenarios
+from house_rocket.comparaveis import AvaliadorComparaveis
+from house_rocket.dados import carregar_dados as carregar_base, versao_dados
+from house_rocket.espacial import IndiceEspacial
+from house_rocket.graficos import (
+    grafico_incrementos,
+    grafico_pos_reforma,
+    grafico_preco_medio,
+    grafico_roi,
+    grafico_top_regioes,
+    grafico_valorizacao,
+    renderizar,
+)
+from house_rocket.ingestao import agregados_armazenados, ingerir_novas_vendas
+from house_rocket.instrumentacao import Medicoes, acumulado, com_contagem_de_cache, etapa, medir
+from house_rocket.mapa import LIMITE_PONTOS, camada_mapa
+from house_rocket.qualidade import LIMITE_MAD, resumo_qualidade, verificar_qualidade
+from house_rocket.reforma import MotorReforma, ajustar_modelo_reforma, estimar_uplift
+from house_rocket.sazonalidade import construir_cubo
+from house_rocket.simulacao import ParametrosSimulacao, SimuladorRevenda
+from house_rocket.tabelas import TabelaPaginada
+from house_rocket.triagem import CriteriosCompra, MotorTriagem, top_k_decrescente
 
 
 # Configuração da Página
@@ -31,23 +58,159 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-  # Carregar os dados
-@st.cache_data
-def carregar_dados():
-    df = pd.read_csv("kc_house_data_updat.csv")
-    df["date"] = pd.to_datetime(df["date"], format="%d-%m-%Y")
-    df["year"] = df["date"].dt.year  # Garanta que esta linha existe
-    return df
-
-df = carregar_dados()
- 
-# Criar abas
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["📌 Contexto do Negócio", "🏡 Estratégia de Compra", "📈 Melhor Momento para Compra e Venda", "🛠️ Impacto das Reformas", "🗺️ Análise Geográfica", "🎯 Insights"])
+# Fragmentos reexecutados sozinhos (paginação, cenários) ficam fora da medição do rerun e abrem a sua
+def medir_fragmento(nome):
+    return medir(f"fragmento:{nome}", st.session_state.get("medir_memoria", False),
+                 os.environ.get("HOUSE_ROCKET_METRICAS"))
+
+# Cache de resultados derivados compartilhado entre sessões (limite de memória, LRU/TTL, disco opcional).
+# Motores, modelos e índices também ficam nele, só em memória: versões antigas dos dados são
+# despejadas pelo LRU em vez de ficarem para sempre em cache_resource.
+resultados = cache_compartilhado()
+
+# Carregar os dados (arquivo Arrow tipado, mapeado em memória e invalidado quando o CSV muda).
+# cache_resource devolve o mesmo DataFrame somente leitura a todas as sessões, sem a cópia
+# que cache_data faria a cada acesso; as abas criam colunas derivadas em DataFrames próprios.
+# As páginas mapeadas não contam no limite do cache de resultados; guarda-se só a versão
+# atual e a anterior (sessões abertas antes de uma ingestão). Motores que guardam o DataFrame
+# não o contam no próprio tamanho (``compartilhado``).
+@com_contagem_de_cache(st.cache_resource(max_entries=2))
+def carregar_dados(versao):
+    return compartilhado(carregar_base())
+
+# Agregados por CEP, condição, qualidade e mês (somas persistidas, atualizadas a cada ingestão)
+@com_contagem_de_cache(resultados.memorizar)
+def carregar_agregados(versao):
+    return agregados_armazenados()
+
+# Valor justo de cada venda pelos k comparáveis mais parecidos
+@com_contagem_de_cache(resultados.memorizar)
+def carregar_avaliacao_comparaveis(versao):
+    df = carregar_dados(versao)
+    return AvaliadorComparaveis(df).avaliar(df, excluir_proprio=True)
+
+# Base do ROI: rótulo na barra lateral -> (estatística de house_rocket.analise, título da coluna)
+BASES_ROI = {
+    "Média do CEP": ("media", "Média da Região ($)"),
+    "Mediana do CEP": ("mediana", "Mediana da Região ($)"),
+    "Média aparada do CEP (10%)": ("media_aparada", "Média Aparada da Região ($)"),
+    "Vendas comparáveis (k-NN)": ("comparaveis", "Valor Justo - Comparáveis ($)"),
+}
+
+# Motor de triagem de compra (arrays ordenados por CEP e preço, sem cópia por sessão)
+@com_contagem_de_cache(resultados.memorizar(em_disco=False))
+def carregar_motor_triagem(versao, base_roi):
+    df = carregar_dados(versao)
+    estatistica = BASES_ROI[base_roi][0]
+    if estatistica == "comparaveis":
+        referencia_log = np.log1p(carregar_avaliacao_comparaveis(versao)['valor_justo'].to_numpy())
+    else:
+        referencia_log = carregar_agregados(versao).referencia_log(df['zipcode'], estatistica)
+    return MotorTriagem(df, referencia_log)
+
+# Marcas de qualidade de cada venda (valores impossíveis, vendas repetidas, preços extremos no CEP)
+@com_contagem_de_cache(resultados.memorizar)
+def carregar_qualidade(versao):
+    return verificar_qualidade(carregar_dados(versao))
+
+# CSV das vendas marcadas para o botão de download (montado uma vez por versão dos dados)
+@com_contagem_de_cache(resultados.memorizar)
+def carregar_csv_qualidade(versao):
+    return vendas_marcadas(carregar_dados(versao), carregar_qualidade(versao)).to_csv().encode("utf-8")
+
+# Índice espacial sobre lat/long de todas as vendas
+@com_contagem_de_cache(resultados.memorizar(em_disco=False))
+def carregar_indice_espacial(versao):
+    df = carregar_dados(versao)
+    return IndiceEspacial(df['lat'], df['long'])
+
+# Tabelas de preço médio por condição e qualidade para o impacto das reformas
+@com_contagem_de_cache(resultados.memorizar(em_disco=False))
+def carregar_motor_reforma(versao):
+    agregados = carregar_agregados(versao)
+    return MotorReforma(carregar_dados(versao), agregados.por_condicao['price_mean'], agregados.por_grade['price_mean'])
+
+# Modelo hedônico (efeitos fixos de CEP) para a valorização esperada de cada reforma
+# e para o ajuste de mix dos índices sazonais
+@com_contagem_de_cache(resultados.memorizar(em_disco=False))
+def carregar_modelo_reforma(versao):
+    return ajustar_modelo_reforma(carregar_dados(versao))
+
+@com_contagem_de_cache(resultados.memorizar)
+def carregar_uplift(versao, niveis_condicao, niveis_grade):
+    return estimar_uplift(carregar_modelo_reforma(versao), carregar_dados(versao), niveis_condicao, niveis_grade)
+
+# Cubo CEP × período (semanal ou mensal) com preços e resíduos do modelo hedônico
+@com_contagem_de_cache(resultados.memorizar(em_disco=False))
+def carregar_cubo_sazonal(versao, granularidade):
+    return construir_cubo(carregar_dados(versao), carregar_modelo_reforma(versao), granularidade)
+
+# Simulação de Monte Carlo do lucro de revenda (resíduos do modelo por CEP e grade)
+@com_contagem_de_cache(resultados.memorizar(em_disco=False))
+def carregar_simulador(versao):
+    perfil = carregar_cubo_sazonal(versao, "mes").perfil_mes_do_ano()
+    return SimuladorRevenda(carregar_dados(versao), carregar_modelo_reforma(versao), perfil)
+
+@com_contagem_de_cache(resultados.memorizar)
+def carregar_simulacao(versao, indices, parametros):
+    return carregar_simulador(versao).simular(indices, parametros)
+
+# Candidatos da triagem para os critérios da barra lateral
+@com_contagem_de_cache(resultados.memorizar)
+def carregar_selecao(versao, base_roi, criterios):
+    return carregar_motor_triagem(versao, base_roi).selecionar(criterios)
+
+# Tabelas paginadas no servidor (a ordem de cada coluna é calculada uma vez e reaproveitada)
+@com_contagem_de_cache(resultados.memorizar)
+def carregar_tabela_selecao(versao, base_roi, criterios):
+    return TabelaPaginada(carregar_selecao(versao, base_roi, criterios))
+
+@com_contagem_de_cache(resultados.memorizar(em_disco=False))
+def carregar_tabela_reforma(versao):
+    df = carregar_dados(versao)
+    agregados = carregar_agregados(versao)
+    return TabelaPaginada(df[['price', 'zipcode', 'condition', 'grade']].assign(
+        avg_price_region_log=agregados.mapear(df['zipcode'], 'log_price_mean')
+    ))
+
+# Motor de cenários "e se" (guarda a triagem por CEP e os ganhos de reforma já calculados)
+@com_contagem_de_cache(resultados.memorizar(em_disco=False))
+def carregar_motor_cenarios(versao, base_roi):
+    return MotorCenarios(carregar_motor_triagem(versao, base_roi), carregar_motor_reforma(versao))
+
+# Exibe uma página da tabela; ordenar e paginar roda só este fragmento, sem refazer a página inteira
+@st.fragment
+def tabela_paginada(tabela, chave, colunas=None, filtros=(), ordenar_por=None, decrescente=False,
+                    renomear=None, column_config=None):
+    with medir_fragmento(chave):
+        colunas = list(colunas or tabela.colunas)
+        nomes = renomear or {}
+        col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+        with col1:
+            ordenar_por = st.selectbox("Ordenar por:", colunas, index=colunas.index(ordenar_por) if ordenar_por else 0,
+                                       format_func=lambda c: nomes.get(c, c), key=f"{chave}_ordem")
+        with col2:
+            decrescente = st.toggle("Decrescente", value=decrescente, key=f"{chave}_decrescente")
+        with col3:
+            tamanho = st.selectbox("Linhas por página:", [25, 50, 100, 250], index=1, key=f"{chave}_tamanho")
+        total_paginas = max(1, -(-len(tabela.posicoes(filtros)) // tamanho))
+        if st.session_state.get(f"{chave}_pagina", 1) > total_paginas:
+            st.session_state[f"{chave}_pagina"] = total_paginas
+        with col4:
+            pagina = st.number_input(f"Página (de {total_paginas}):", min_value=1, max_value=total_paginas,
+                                     value=1, key=f"{chave}_pagina")
+        with etapa(f"tabela:{chave}"):
+            resultado = tabela.consultar(pagina, tamanho, ordenar_por, decrescente, filtros, colunas)
+            st.dataframe(resultado.linhas.rename(columns=nomes), column_config=column_config, width="stretch")
+        st.caption(f"{resultado.total} linhas · página {resultado.pagina} de {resultado.total_paginas}")
+
+
+# Cada aba é uma função chamada só quando a aba está aberta (ver o final do arquivo)
 
 # =========================================
 #        ABA 1: Contexto do Negócio
 # =========================================
-with tab1:
+def aba_contexto():
     st.title("🏠 House Rocket - Contexto do Negócio e Resultados")
     st.markdown("---")
 
@@ -74,120 +237,39 @@ with tab1:
 # =========================================
 #         ABA 2: Estratégia de Compra
 # =========================================
-with tab2:
+def aba_estrategia_compra():
     st.title("🏡 Estratégia de Compra - House Rocket")
     st.markdown("---")
 
-   
+    # Filtrar, calcular ROI e ranquear (critérios da barra lateral)
+    with etapa("triagem"):
+        final_selection_filtered = carregar_selecao(versao, base_roi, criterios)
 
-    
-    # Tabela das casas recomendadas
+    # Tabela das casas recomendadas (paginada no servidor)
     st.subheader("📋 Lista de Casas Recomendadas")
-    casas_recomendadas = {
-        "Índice": [8978, 9077, 7178, 16580, 18102, 434, 8846, 892, 19687, 1752,
-                   1868, 11754, 2205, 8676, 3821, 5598, 15579, 19367, 20631, 19757],
-        "Preço ($)": [169100, 182500, 190000, 190000, 194250, 196000, 204700, 205000,
-                      205000, 206000, 210000, 210000, 213550, 214000, 215000, 215000,
-                      215000, 215000, 215000, 216000],
-        "Média da Região ($)": [267711.90] * 20,
-        "Zipcode": [98001] * 20,
-        "Quartos": [3, 3, 3, 4, 3, 3, 4, 3, 4, 4, 3, 4, 3, 3, 4, 4, 3, 4, 3, 4],
-        "Banheiros": [2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2],
-        "Condição": [4, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 3, 5, 3, 3, 3],
-        "Construção (Grade)": [7, 7, 7, 7, 7, 7, 7, 7, 8, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7, 7],
-        "Vista (View)": [0] * 20,
-        "Frente d’água (Waterfront)": [0] * 20
-    }
-    df_recomendadas = pd.DataFrame(casas_recomendadas)
-    st.dataframe(df_recomendadas)
-
- 
-# --------------------------------------------
-# Pré-processamento (igual ao do Jupyter)
-# --------------------------------------------
-
-    # 1. Calcular média regional (log)
-    df['log_price'] = np.log1p(df['price'])
-    df['avg_price_region_log'] = df.groupby('zipcode')['log_price'].transform('mean')
-
-    # 2. Filtrar imóveis
-    below_avg_price = df['log_price'] < df['avg_price_region_log']
-    good_houses = df[
-        below_avg_price &
-        (df['grade'] >= 7) &
-        (df['condition'] >= 3) &
-        (df['bedrooms'].isin([3, 4])) &
-        (df['bathrooms'] >= 2)
-    ].copy()
-
-    # 3. Converter valores
-    good_houses['price'] = np.expm1(good_houses['log_price'])
-    good_houses['avg_price_region'] = np.expm1(good_houses['avg_price_region_log'])
-
-    # 4. Ordenar e selecionar colunas
-    final_selection = good_houses.sort_values(['zipcode', 'price'])[[
-        'price', 'avg_price_region', 'zipcode', 'bedrooms', 
-        'bathrooms', 'condition', 'grade', 'view', 'waterfront'
-    ]]
-
-    # 5. Calcular ROI
-    indices_desejados = [8978, 9077, 7178, 16580, 18102, 434, 8846, 892,
-                        19687, 1752, 1868, 11754, 2205, 8676, 3821, 5598,
-                        15579, 19367, 20631, 19757]
-
-    final_selection_filtered = final_selection.loc[indices_desejados].copy()
-    final_selection_filtered['ROI (%)'] = ((final_selection_filtered['avg_price_region'] - 
-                                          final_selection_filtered['price']) / 
-                                         final_selection_filtered['price']) * 100
+    tabela_selecao = carregar_tabela_selecao(versao, base_roi, criterios)
+    tabela_paginada(
+        tabela_selecao, "recomendadas",
+        colunas=[c for c in tabela_selecao.colunas if c != "ROI (%)"],
+        renomear={
+            "price": "Preço ($)",
+            "avg_price_region": BASES_ROI[base_roi][1],
+            "zipcode": "Zipcode",
+            "bedrooms": "Quartos",
+            "bathrooms": "Banheiros",
+            "condition": "Condição",
+            "grade": "Construção (Grade)",
+            "view": "Vista (View)",
+            "waterfront": "Frente d’água (Waterfront)",
+        },
+    )
 
-    # --------------------------------------------
-    # Gráfico de ROI Original
-    # --------------------------------------------
-    st.header("Retorno sobre Investimento (ROI)")
-    with st.container():
-        fig, ax = plt.subplots(figsize=(14, 6))
-        ax.scatter(
-            range(len(final_selection_filtered.index)),
-            final_selection_filtered['ROI (%)'],
-            color='#2ecc71',
-            s=150,
-            alpha=0.7,
-            edgecolor='black'
-        )
-        
-        for i, roi in enumerate(final_selection_filtered['ROI (%)']):
-            ax.text(
-                x=i,
-                y=roi + 1.5,
-                s=f"{roi:.1f}%",
-                ha='center',
-                fontsize=10,
-                fontweight='bold'
-            )
-        
-        ax.set_ylim(0, final_selection_filtered['ROI (%)'].max() + 10)
-        ax.set_title("Potencial de Retorno por Propriedade", fontsize=16, pad=20)
-        ax.set_xlabel("Índice da Propriedade", fontsize=12)
-        ax.set_ylabel("ROI Esperado (%)", fontsize=12)
-        ax.grid(axis='y', linestyle='--', alpha=0.7)
-        ax.set_facecolor('#f5f6fa')
-        plt.xticks(
-            range(len(final_selection_filtered.index)),
-            labels=final_selection_filtered.index,
-            rotation=45,
-            fontsize=10
-        )
-        st.pyplot(fig)
+    roi_max = 0.0 if final_selection_filtered.empty else final_selection_filtered['ROI (%)'].max()
+    if final_selection_filtered.empty:
+        st.warning("Nenhuma casa atende aos critérios de compra selecionados.")
 
-    # =========================================
-    #       NOVOS GRÁFICOS ADICIONADOS
-    # =========================================
-    
-    # Gráfico 1: Comparação de Preços Médios
-    st.subheader("📊 Comparação de Preços Médios por Região")
-    
     # Cálculo dos preços médios
-    region_prices = df.groupby('zipcode')['price'].mean().reset_index()
+    region_prices = agregados.por_zipcode['price_mean'].rename('price').reset_index()
     region_prices_sorted = region_prices.sort_values(by='price', ascending=False)
     top_10_regions = region_prices_sorted.head(10)
 
@@ -196,32 +278,8 @@ with tab2:
         region_98001 = region_prices[region_prices['zipcode'] == 98001]
         top_10_regions = pd.concat([top_10_regions, region_98001])
 
-    # Configurar cores
-    colors = ['#FF6B6B' if zipcode == 98001 else '#4ECDC4' for zipcode in top_10_regions['zipcode']]
-
-    # Plotar com Matplotlib
-    fig1, ax1 = plt.subplots(figsize=(10, 5))
-    ax1.bar(
-        top_10_regions['zipcode'].astype(str), 
-        top_10_regions['price'],
-        color=colors,
-        edgecolor='grey'
-    )
-    
-    # Customização do gráfico
-    ax1.set_title('Top 10 Regiões com Maiores Preços Médios vs Região 98001', pad=20)
-    ax1.set_xlabel('CEP da Região', labelpad=10)
-    ax1.set_ylabel('Preço Médio (US$)', labelpad=10)
-    ax1.grid(axis='y', alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    st.pyplot(fig1)
-    
-    # Gráfico 2: Taxa de Valorização Histórica
-    st.subheader("📈 Taxa de Valorização Anual por Região")
-    
     # Cálculo da valorização
-    price_by_year = df.groupby(['zipcode', 'year'])['price'].mean().reset_index()
+    price_by_year = agregados.por_ano['price_mean'].rename('price').reset_index()
     price_by_year['pct_change'] = price_by_year.groupby('zipcode')['price'].pct_change()
     
     # Dados para 98001
@@ -231,37 +289,110 @@ with tab2:
     # Comparação com outras regiões
     comparison = price_by_year.groupby('zipcode')['pct_change'].mean().reset_index()
     comparison = comparison.sort_values('pct_change', ascending=False)
-    
-    # Criar figura
-    fig2, ax2 = plt.subplots(figsize=(12, 6))
-    
-    # Plotar com Seaborn
-    sns.barplot(
-        data=comparison.head(10),
-        x='zipcode',
-        y='pct_change',
-        palette='Blues_d',
-        ax=ax2
+
+    # Renderizar os gráficos em paralelo (reaproveitados do cache se os dados não mudaram)
+    png_roi = renderizar(grafico_roi, final_selection_filtered['ROI (%)'].to_numpy(), final_selection_filtered.index.to_numpy())
+    png_regioes = renderizar(grafico_top_regioes, top_10_regions, 98001)
+    png_valorizacao = renderizar(grafico_valorizacao, comparison.head(10), avg_pct_change_98001, 98001)
+
+    # --------------------------------------------
+    # Gráfico de ROI Original
+    # --------------------------------------------
+    st.header("Retorno sobre Investimento (ROI)")
+    with st.container():
+        with etapa("grafico:roi"):
+            st.image(png_roi.result(), width="stretch")
+
+    # --------------------------------------------
+    # Carteira de compra sob orçamento
+    # --------------------------------------------
+    st.header("💼 Carteira de Compra")
+    perfil_sazonal = carregar_cubo_sazonal(versao, "mes").perfil_mes_do_ano(criterios.zipcodes)
+    col1, col2, col3 = st.columns(3)
+    orcamento = col1.number_input("Capital disponível ($)", min_value=0, value=5_000_000, step=250_000)
+    max_por_zipcode = col2.number_input("Máximo de casas por CEP na carteira (0 = sem limite)", min_value=0, value=0)
+    meses_revenda = perfil_sazonal.dropna().index.tolist()
+    mes_revenda = col3.selectbox("Mês previsto de revenda", meses_revenda,
+                                 index=meses_revenda.index(perfil_sazonal.idxmax()))
+
+    # Todos os candidatos aprovados na triagem, não só os exibidos acima
+    candidatos_carteira = carregar_selecao(versao, base_roi, replace(criterios, limite=0))
+    carteira_df, carteira = carteira_de_candidatos(
+        candidatos_carteira, orcamento, max_por_zipcode, perfil_sazonal[mes_revenda])
+
+    cols = st.columns(3)
+    cols[0].metric("Casas na Carteira", len(carteira_df))
+    cols[1].metric("Capital Investido", f"${carteira.custo_total:,.0f}")
+    cols[2].metric("Lucro Esperado (preço de referência)", f"${carteira.lucro_total:,.0f}")
+    st.dataframe(carteira_df.sort_values('lucro_esperado', ascending=False), width="stretch")
+    st.caption(f"Revenda estimada pelo preço de referência ({BASES_ROI[base_roi][1].removesuffix(' ($)')}) "
+               f"× índice sazonal do mês {mes_revenda} ({perfil_sazonal[mes_revenda]:.3f}), "
+               f"entre {len(candidatos_carteira)} candidatos da triagem.")
+
+    # --------------------------------------------
+    # Simulação de Monte Carlo do lucro da carteira
+    # --------------------------------------------
+    st.subheader("🎲 Simulação do Lucro de Revenda (Monte Carlo)")
+    col1, col2, col3, col4 = st.columns(4)
+    caminhos = col1.number_input("Caminhos simulados", min_value=1_000, max_value=1_000_000, value=10_000, step=1_000)
+    meses_min, meses_max = col2.slider("Meses até a revenda", 1, 36, (3, 12))
+    custo_reforma = col3.number_input("Custo médio de reforma por casa ($)", min_value=0, value=0, step=5_000)
+    valorizacao_anual = col4.number_input("Valorização anual do mercado (%)", value=0.0, step=0.5) / 100
+    col1, col2, _, _ = st.columns(4)
+    niveis_condicao = col1.number_input("Reforma: níveis de condição", min_value=0, max_value=4, value=0, key="simulacao_niveis_condicao")
+    niveis_grade = col2.number_input("Reforma: níveis de qualidade", min_value=0, max_value=4, value=0, key="simulacao_niveis_grade")
+    parametros = ParametrosSimulacao(
+        caminhos=int(caminhos), mes_compra=datetime.now().month, meses_min=meses_min, meses_max=meses_max,
+        niveis_condicao=int(niveis_condicao), niveis_grade=int(niveis_grade),
+        custo_reforma=float(custo_reforma), valorizacao_anual=valorizacao_anual,
     )
+
+    if carteira_df.empty:
+        st.info("A carteira está vazia; ajuste o capital ou os critérios para simular.")
+    else:
+        simulacao_casas, simulacao_carteira = carregar_simulacao(versao, tuple(carteira_df.index), parametros)
+        cols = st.columns(4)
+        cols[0].metric("Lucro P5 da Carteira (modelo hedônico)", f"${simulacao_carteira['lucro_p5']:,.0f}")
+        cols[1].metric("Lucro P50 da Carteira (modelo hedônico)", f"${simulacao_carteira['lucro_p50']:,.0f}")
+        cols[2].metric("Lucro P95 da Carteira (modelo hedônico)", f"${simulacao_carteira['lucro_p95']:,.0f}")
+        cols[3].metric("Probabilidade de Prejuízo", f"{simulacao_carteira['prob_prejuizo']:.1%}")
+        # Os dois valores vêm de modelos diferentes; a legenda deixa a diferença explícita
+        st.caption(f"A simulação estima a revenda pelo modelo hedônico: o preço previsto para cada casa pelo CEP, "
+                   f"qualidade, condição e áreas, mais resíduos de vendas parecidas. O lucro esperado acima "
+                   f"(${carteira.lucro_total:,.0f}) usa o preço de referência da Base do ROI, que não considera "
+                   f"as áreas e o padrão de cada casa; lucro médio simulado: "
+                   f"${simulacao_carteira['lucro_medio']:,.0f}.")
+        st.dataframe(
+            carteira_df[['price', 'zipcode', 'grade']].join(simulacao_casas),
+            column_config={
+                'price': st.column_config.NumberColumn(format="$%,.0f"),
+                'lucro_p5': st.column_config.NumberColumn(format="$%,.0f"),
+                'lucro_p50': st.column_config.NumberColumn(format="$%,.0f"),
+                'lucro_p95': st.column_config.NumberColumn(format="$%,.0f"),
+                'lucro_medio': st.column_config.NumberColumn(format="$%,.0f"),
+                'prob_prejuizo': st.column_config.NumberColumn(format="percent"),
+            },
+            width="stretch",
+        )
+
+    # --------------------------------------------
+    # Cenários "e se"
+    # --------------------------------------------
+    secao_cenarios(orcamento, max_por_zipcode, perfil_sazonal[mes_revenda])
+
+    # =========================================
+    #       NOVOS GRÁFICOS ADICIONADOS
+    # =========================================
     
-    # Linha de referência
-    ax2.axhline(
-        avg_pct_change_98001,
-        color='#FF6B6B',
-        linestyle='--',
-        linewidth=2,
-        label=f'CEP 98001 ({avg_pct_change_98001:.1%})'
-    )
+    # Gráfico 1: Comparação de Preços Médios
+    st.subheader("📊 Comparação de Preços Médios por Região")
+    with etapa("grafico:regioes"):
+        st.image(png_regioes.result(), width="stretch")
     
-    # Customização
-    ax2.set_title('Taxa Média de Valorização Anual Comparativa', pad=15)
-    ax2.set_xlabel('CEP da Região', labelpad=10)
-    ax2.set_ylabel('Valorização Média Anual', labelpad=10)
-    ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.0%}'))
-    plt.xticks(rotation=45)
-    plt.legend()
-    plt.tight_layout()
-    st.pyplot(fig2)
+    # Gráfico 2: Taxa de Valorização Histórica
+    st.subheader("📈 Taxa de Valorização Anual por Região")
+    with etapa("grafico:valorizacao"):
+        st.image(png_valorizacao.result(), width="stretch")
 
     # Exibir métrica destacada
     st.metric(label="**Valorização Média Anual do CEP 98001**", 
@@ -278,7 +409,7 @@ with tab2:
         min_roi = st.slider(
             "Filtrar por ROI Mínimo (%):",
             min_value=0,
-            max_value=int(final_selection_filtered['ROI (%)'].max()),
+            max_value=max(1, int(roi_max)),
             value=0
         )
 
@@ -288,66 +419,140 @@ with tab2:
             options=['Todas'] + list(final_selection_filtered['zipcode'].unique())
         )
 
-    # Aplicar filtros
-    filtered_data = final_selection_filtered
+    # Aplicar filtros (no servidor) e exibir só a página visível, com formatação feita no navegador
+    filtros = [('ROI (%)', '>=', min_roi)]
     if selected_zipcode != 'Todas':
-        filtered_data = filtered_data[filtered_data['zipcode'] == selected_zipcode]
-    filtered_data = filtered_data[filtered_data['ROI (%)'] >= min_roi]
-
-    # Exibir tabela
-    st.dataframe(
-        filtered_data.style.format({
-            'price': '${:,.2f}',
-            'avg_price_region': '${:,.2f}',
-            'ROI (%)': '{:.1f}%'
-        }),
-        height=400,
-        use_container_width=True
+        filtros.append(('zipcode', '==', selected_zipcode))
+    tabela_paginada(
+        tabela_selecao, "roi_filtrado", filtros=filtros, ordenar_por='ROI (%)', decrescente=True,
+        column_config={
+            'price': st.column_config.NumberColumn(format="$%,.2f"),
+            'avg_price_region': st.column_config.NumberColumn(format="$%,.2f"),
+            'ROI (%)': st.column_config.NumberColumn(format="%.1f%%"),
+        },
     )
+    roi_filtrado = final_selection_filtered['ROI (%)'].to_numpy()[tabela_selecao.posicoes(filtros)]
 
     # Estatísticas Resumidas
     st.subheader("📊 Estatísticas Chave")
     cols = st.columns(3)
-    cols[0].metric("Maior ROI", f"{filtered_data['ROI (%)'].max():.1f}%")
-    cols[1].metric("ROI Médio", f"{filtered_data['ROI (%)'].mean():.1f}%")
-    cols[2].metric("Propriedades Filtradas", filtered_data.shape[0])
+    cols[0].metric("Maior ROI", f"{roi_filtrado.max() if len(roi_filtrado) else float('nan'):.1f}%")
+    cols[1].metric("ROI Médio", f"{roi_filtrado.mean() if len(roi_filtrado) else float('nan'):.1f}%")
+    cols[2].metric("Propriedades Filtradas", len(roi_filtrado))
+
+# Cenários "e se" sobre a carteira: só este fragmento roda quando um parâmetro muda
+@st.fragment
+def secao_cenarios(orcamento, max_por_zipcode, fator_revenda):
+    with medir_fragmento("cenarios"):
+        st.header("🧪 Cenários: e se os parâmetros mudarem?")
+        historico = st.session_state.setdefault("historico_cenarios", HistoricoCenarios())
+        col1, col2, col3, col4 = st.columns(4)
+        roi_min = col1.number_input("ROI mínimo (%)", min_value=0.0, value=float(criterios.roi_min), step=5.0, key="cenario_roi")
+        grade_min = col2.number_input("Qualidade mínima (grade)", min_value=1, max_value=13, value=criterios.grade_min, key="cenario_grade")
+        capital = col3.number_input("Capital de compra ($, 0 = sem limite)", min_value=0, value=int(orcamento), step=250_000, key="cenario_capital")
+        por_zipcode = col4.number_input("Máximo de casas por CEP (0 = sem limite)", min_value=0, value=int(max_por_zipcode), key="cenario_por_zipcode")
+        col1, col2, col3, col4 = st.columns(4)
+        niveis_condicao = col1.number_input("Reforma: níveis de condição", min_value=0, max_value=4, value=0, key="cenario_niveis_condicao")
+        niveis_grade = col2.number_input("Reforma: níveis de qualidade", min_value=0, max_value=4, value=0, key="cenario_niveis_grade")
+        capital_reforma = col3.number_input("Capital para reformas ($, 0 = sem limite)", min_value=0, value=0, step=50_000, key="cenario_capital_reforma")
+        custo_reforma = col4.number_input("Custo por reforma ($)", min_value=0, value=25_000, step=5_000, key="cenario_custo_reforma")
+
+        cenario = Cenario(
+            criterios=replace(criterios, roi_min=float(roi_min), grade_min=int(grade_min), limite=0),
+            orcamento=float(capital), max_por_zipcode=int(por_zipcode), fator_revenda=float(fator_revenda),
+            niveis_condicao=int(niveis_condicao), niveis_grade=int(niveis_grade),
+            orcamento_reforma=float(capital_reforma), custo_reforma=float(custo_reforma),
+        )
+        with etapa("cenario"):
+            resultado = carregar_motor_cenarios(versao, base_roi).avaliar(cenario)
+
+        col1, col2 = st.columns(2)
+        if col1.button("💾 Guardar no histórico", key="cenario_guardar"):
+            historico.registrar(resultado)
+        if col2.button("📌 Guardar como base", key="cenario_base"):
+            historico.registrar(resultado, como_base=True)
+
+        # Totais do cenário, com a diferença para a base quando houver uma
+        comparacao, entraram, sairam = historico.comparar(resultado)
+        cols = st.columns(5)
+        for col, (chave, rotulo, formato) in zip(cols, [
+            ("casas_carteira", "Casas na Carteira", "{:,.0f}"),
+            ("casas_reformadas", "Casas Reformadas", "{:,.0f}"),
+            ("capital_investido", "Capital Investido", "${:,.0f}"),
+            ("lucro_esperado", "Lucro Esperado", "${:,.0f}"),
+            ("retorno_pct", "Retorno (%)", "{:.1f}%"),
+        ]):
+            diferenca = comparacao.loc[chave, "diferenca"] if historico.base is not None else None
+            col.metric(rotulo, formato.format(resultado.resumo[chave]),
+                       delta=formato.format(diferenca) if diferenca else None)
+        st.caption(f"Avaliado em {resultado.tempo_s * 1000:.0f} ms entre {resultado.resumo['candidatos']} candidatos."
+                   + (f" Em relação à base: {len(entraram)} casas entraram e {len(sairam)} saíram da carteira."
+                      if historico.base is not None else " Guarde um cenário como base para comparar."))
+
+        if historico.resultados:
+            st.dataframe(historico.tabela(), hide_index=True, width="stretch", column_config={
+                "capital_investido": st.column_config.NumberColumn(format="$%,.0f"),
+                "custo_reformas": st.column_config.NumberColumn(format="$%,.0f"),
+                "lucro_esperado": st.column_config.NumberColumn(format="$%,.0f"),
+                "retorno_pct": st.column_config.NumberColumn(format="%.1f%%"),
+                "tempo_ms": st.column_config.NumberColumn(format="%.0f"),
+            })
 
 # =========================================
 #          ABA 3: Melhor Momento para Venda
 # =========================================
-with tab3:
+def aba_sazonalidade():
     st.title("📈 Análise de Sazonalidade")
     st.markdown("---")
 
-    # Criar coluna de ano
-    df['year'] = df['date'].dt.year
+    GRANULARIDADES = {"Mensal": "mes", "Semanal": "semana"}
+    col1, col2, col3 = st.columns(3)
+    granularidade = GRANULARIDADES[col3.radio('Granularidade', list(GRANULARIDADES), horizontal=True)]
+    cubo = carregar_cubo_sazonal(versao, granularidade)
 
-    anos_disponiveis = sorted(df['year'].unique())
-    selected_year = st.selectbox('Selecione o ano', anos_disponiveis)
+    anos_disponiveis = sorted(set(cubo.periodos.year))
+    selected_year = col1.selectbox('Selecione o ano', anos_disponiveis)
+    selected_zipcode = col2.selectbox('CEP', ['Todos'] + cubo.zipcodes.tolist())
+    zipcodes_serie = () if selected_zipcode == 'Todos' else (selected_zipcode,)
 
-    df_filtered = df[df['year'] == selected_year].copy()
+    serie = cubo.serie(zipcodes_serie, inicio=f'{selected_year}-01-01', fim=f'{selected_year}-12-31')
 
-    if df_filtered.empty:
+    if serie.empty:
         st.error(f"Não há dados para o ano {selected_year}.")
     else:
-        df_filtered['month'] = df_filtered['date'].dt.month
-        monthly_avg_price = df_filtered.groupby('month', as_index=False)['price'].mean()
-
-        if not monthly_avg_price.empty:
-            best_month_sell = monthly_avg_price.loc[monthly_avg_price['price'].idxmax()]
-            best_month_buy = monthly_avg_price.loc[monthly_avg_price['price'].idxmin()]
-
-            fig = px.line(monthly_avg_price, x='month', y='price', markers=True, title=f'Análise Sazonal de Preços em {selected_year}')
-            fig.add_vline(x=best_month_sell['month'], line_dash='dash', line_color='red', annotation_text=f'Melhor Mês para Vender ({int(best_month_sell["month"])})')
-            fig.add_vline(x=best_month_buy['month'], line_dash='dash', line_color='green', annotation_text=f'Melhor Mês para Comprar ({int(best_month_buy["month"])})')
-
+        # Melhor momento pelo índice ajustado pelo mix de casas vendidas em cada período
+        ajustado = serie['indice'].dropna()
+        periodo_venda = ajustado.idxmax() if not ajustado.empty else serie['price'].idxmax()
+        periodo_compra = ajustado.idxmin() if not ajustado.empty else serie['price'].idxmin()
+        if granularidade == "mes":
+            x = serie.index.month
+            pos_venda, pos_compra = periodo_venda.month, periodo_compra.month
+            rotulo, rotulo_venda, rotulo_compra = 'month', f'{periodo_venda.month}', f'{periodo_compra.month}'
+        else:
+            x = serie.index
+            pos_venda, pos_compra = periodo_venda, periodo_compra
+            rotulo = 'semana'
+            rotulo_venda, rotulo_compra = f'{periodo_venda:%d/%m}', f'{periodo_compra:%d/%m}'
+        unidade = 'Mês' if granularidade == "mes" else 'Semana'
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=x, y=serie['price'], mode='lines+markers', name='Preço médio'))
+        fig.add_trace(go.Scatter(x=x, y=serie['preco_ajustado'], mode='lines+markers', name='Ajustado pelo mix'))
+        fig.update_layout(title=f'Análise Sazonal de Preços em {selected_year}' + ('' if not zipcodes_serie else f' - CEP {selected_zipcode}'),
+                          xaxis_title=rotulo, yaxis_title='price')
+        fig.add_vline(x=pos_venda, line_dash='dash', line_color='red', annotation_text=f'Melhor {unidade} para Vender ({rotulo_venda})')
+        fig.add_vline(x=pos_compra, line_dash='dash', line_color='green', annotation_text=f'Melhor {unidade} para Comprar ({rotulo_compra})')
+
+        with etapa("grafico:sazonalidade"):
             st.plotly_chart(fig)
+        st.caption("O preço ajustado pelo mix usa os resíduos de um modelo hedônico (CEP, qualidade, condição e área), "
+                   "separando a variação de preço no tempo da mudança no tipo de casa vendida em cada período.")
 
 
 # =========================================
 #         ABA 4: Impacto das Reformas
 # =========================================
-with tab4:
+def aba_reformas():
     st.title("🛠️ Análise do Impacto das Reformas")
     st.markdown("---")
 
@@ -356,215 +561,186 @@ with tab4:
     # ============================
     st.subheader("🏠 Casas com Potencial para Reforma")
 
-    # Criar a coluna `avg_price_region_log` caso necessário
-    if 'avg_price_region_log' not in df.columns:
-        df['avg_price_region_log'] = df.groupby('condition')['price'].transform('mean')
+    motor_reforma = carregar_motor_reforma(versao)
 
-    # Filtrar as casas que têm potencial para reforma
-    casas_reforma = df[['price', 'avg_price_region_log', 'condition', 'grade']].sort_values('condition')
-
-    # Exibir a tabela no Streamlit
-    st.dataframe(casas_reforma)
+    # Exibir as casas ordenadas por condição, uma página por vez (ordenação e paginação no servidor)
+    tabela_paginada(
+        carregar_tabela_reforma(versao), "casas_reforma",
+        colunas=['price', 'avg_price_region_log', 'condition', 'grade'], ordenar_por='condition',
+        column_config={'price': st.column_config.NumberColumn(format="$%,.0f")},
+    )
 
     # ==============================
     # 📌 **Impacto da Condição e Qualidade**
     # ==============================
     st.subheader("📊 Impacto da Condição e Qualidade no Preço")
 
-    # Calcular impacto da condição no preço
-    condition_impact = df.groupby('condition')['price'].mean().reset_index()
-    condition_impact.rename(columns={'price': 'avg_price_condition'}, inplace=True)
-    condition_impact = condition_impact.sort_values(by='condition')  # Garantir ordem correta
+    # Impacto da condição e da qualidade (grade) no preço, dos agregados
+    condition_impact = agregados.por_condicao['price_mean'].rename('avg_price_condition').reset_index()
+    grade_impact = agregados.por_grade['price_mean'].rename('avg_price_grade').reset_index()
 
-    # Calcular impacto da qualidade (grade) no preço
-    grade_impact = df.groupby('grade')['price'].mean().reset_index()
-    grade_impact.rename(columns={'price': 'avg_price_grade'}, inplace=True)
-    grade_impact = grade_impact.sort_values(by='grade')  # Garantir ordem correta
+    png_condicao = renderizar(grafico_preco_medio, condition_impact['condition'].to_numpy(), condition_impact['avg_price_condition'].to_numpy(),
+                              'skyblue', "Impacto da Condição no Preço Médio", "Condição")
+    png_grade = renderizar(grafico_preco_medio, grade_impact['grade'].to_numpy(), grade_impact['avg_price_grade'].to_numpy(),
+                           'salmon', "Impacto da Qualidade no Preço Médio", "Qualidade (Grade)")
 
     col1, col2 = st.columns(2)
 
     # **Gráfico: Impacto da Condição no Preço**
     with col1:
-        fig, ax = plt.subplots(figsize=(8, 6))  # Ajustar tamanho do gráfico
-        ax.bar(condition_impact['condition'], condition_impact['avg_price_condition'], color='skyblue')
-        ax.set_title("Impacto da Condição no Preço Médio")
-        ax.set_xlabel("Condição")
-        ax.set_ylabel("Preço Médio (R$)")
-        ax.grid(axis='y', linestyle='--', alpha=0.7)
-        ax.ticklabel_format(style='plain', axis='y')  # Remover notação científica
-        st.pyplot(fig)
+        with etapa("grafico:condicao"):
+            st.image(png_condicao.result(), width="stretch")
 
     # **Gráfico: Impacto da Qualidade no Preço**
     with col2:
-        fig, ax = plt.subplots(figsize=(8, 6))  # Ajustar tamanho do gráfico
-        ax.bar(grade_impact['grade'], grade_impact['avg_price_grade'], color='salmon')
-        ax.set_title("Impacto da Qualidade no Preço Médio")
-        ax.set_xlabel("Qualidade (Grade)")
-        ax.set_ylabel("Preço Médio (R$)")
-        ax.grid(axis='y', linestyle='--', alpha=0.7)
-        ax.ticklabel_format(style='plain', axis='y')  # Remover notação científica
-        st.pyplot(fig)
-
-    # ==============================
-    # 📌 **Calcular Incrementos de Preço**
-    # ==============================
-
-    # **Adicionar o incremento estimado ao melhorar a condição**
-    df = df.merge(condition_impact, on='condition', how='left')
-    df['price_increment_condition'] = df['avg_price_condition'] - df['price']
-
-    # **Adicionar o incremento estimado ao melhorar a qualidade**
-    df = df.merge(grade_impact, on='grade', how='left')
-    df['price_increment_grade'] = df['avg_price_grade'] - df['price']
-
-    # **Gerar a tabela de sugestões de melhoria**
-    improvement_suggestions = df[['condition', 'grade', 'price_increment_condition', 'price_increment_grade']].sort_values(
-        by=['price_increment_condition', 'price_increment_grade'], ascending=False
-    )
+        with etapa("grafico:grade"):
+            st.image(png_grade.result(), width="stretch")
 
     # ==============================
     # 📌 **Incremento do Preço por Condição e Qualidade**
     # ==============================
     st.subheader("📈 Incremento do Preço por Melhoria de Condição e Qualidade")
 
-    # Selecionar as 10 casas com maior impacto na reforma
-    top_improvements = improvement_suggestions.head(10)
-
-    # Criando o gráfico de barras
-    fig, ax = plt.subplots(figsize=(10, 6))
+    # As 10 casas com maior impacto na reforma (consulta nas tabelas por nível, sem merge)
+    top_improvements = motor_reforma.top_incrementos(10)
 
-    # Criar o gráfico de barras comparando os incrementos
-    sns.barplot(data=top_improvements, 
-                x='condition', 
-                y='price_increment_condition', 
-                color='skyblue', 
-                label='Incremento pela Condição', 
-                alpha=0.7, ax=ax)
+    # Gráfico de barras comparando os incrementos
+    with etapa("grafico:incrementos"):
+        st.image(renderizar(grafico_incrementos, top_improvements).result(), width="stretch")
 
-    sns.barplot(data=top_improvements, 
-                x='condition', 
-                y='price_increment_grade', 
-                color='orange', 
-                label='Incremento pela Qualidade (Grau)', 
-                alpha=0.7, ax=ax)
-
-    # Adicionando título e rótulos
-    ax.set_title('Incremento no Preço de Casas por Melhoria de Condição e Qualidade (Grau)', fontsize=14)
-    ax.set_xlabel('Condição', fontsize=12)
-    ax.set_ylabel('Incremento no Preço (R$)', fontsize=12)
-    ax.legend(title='Tipo de Melhoria')
-
-    # Ajustando o layout
-    plt.tight_layout()
-
-    # Exibir o gráfico no Streamlit
-    st.pyplot(fig)
+    # ==============================
+    # 📌 **Cenários de Reforma**
+    # ==============================
+    st.subheader("🔧 Cenários de Reforma")
+    col1, col2 = st.columns(2)
+    with col1:
+        niveis_condicao = st.number_input("Níveis de melhoria na condição:", min_value=0, max_value=4, value=1)
+    with col2:
+        niveis_grade = st.number_input("Níveis de melhoria na qualidade (grade):", min_value=0, max_value=6, value=1)
+    ganho_cenario = motor_reforma.ganho_cenario(niveis_condicao, niveis_grade)
+    st.metric("Ganho Médio Esperado por Casa", f"${np.nanmean(ganho_cenario):,.0f}" if np.isfinite(ganho_cenario).any() else "-")
+    st.dataframe(motor_reforma.top_cenario(niveis_condicao, niveis_grade, k=10))
 
     # ==============================
     # 📌 **Percentual de Aumento Pós-Reforma**
     # ==============================
     st.subheader("📊 Percentual de Aumento do Valor Potencial Pós-Reforma")
 
-    # Dados fornecidos
-    top_10_pos_reforma = pd.DataFrame({
-        'price': [7062500.0, 5570000.0, 5350000.0, 5110800.0, 4668000.0, 4500000.0, 4489000.0, 4208000.0, 3800000.0, 4000000.0],
-        'preco_pos_reforma': [13418750.0, 11697000.0, 10700000.0, 10221600.0, 9336000.0, 9000000.0, 8978000.0, 8416000.0, 8360000.0, 8000000.0],
-        'price_increment_condition': [1412500.0, 1114000.0, 1070000.0, 1022160.0, 933600.0, 900000.0, 897800.0, 841600.0, 1140000.0, 800000.0],
-        'price_increment_grade': [4943750.0, 5013000.0, 4280000.0, 4088640.0, 3734400.0, 3600000.0, 3591200.0, 3366400.0, 3420000.0, 3200000.0]
-    }, index=[3801, 4280, 1414, 1139, 7878, 2556, 8401, 12031, 6847, 4025])
-
-    # Calcular o percentual de aumento para cada casa
-    top_10_pos_reforma['percentual_aumento'] = (
-        (top_10_pos_reforma['preco_pos_reforma'] - top_10_pos_reforma['price']) / top_10_pos_reforma['price'] * 100
-    )
+    # Valorização estimada pelo modelo hedônico para o cenário escolhido acima
+    uplift = carregar_uplift(versao, niveis_condicao, niveis_grade)
+    uplift_valido = uplift['uplift'].fillna(-np.inf).to_numpy()
+    top_10_pos_reforma = uplift.iloc[top_k_decrescente(uplift_valido, 10)]
+    top_10_pos_reforma = top_10_pos_reforma[np.isfinite(top_10_pos_reforma['uplift'])]
 
     # Garantir que os índices sejam strings para o eixo X
     top_10_pos_reforma = top_10_pos_reforma.reset_index()
     top_10_pos_reforma.rename(columns={'index': 'indice'}, inplace=True)
     top_10_pos_reforma['indice'] = top_10_pos_reforma['indice'].astype(str)
 
-    # Criar o gráfico de barras com tamanho e DPI ajustados
-    fig, ax = plt.subplots(figsize=(12, 6), dpi=80)  # Tamanho menor e DPI ajustado
+    # Gráfico de barras com o valor pós-reforma no topo de cada barra
+    with etapa("grafico:pos_reforma"):
+        st.image(renderizar(grafico_pos_reforma, top_10_pos_reforma).result(), width="stretch")
 
-    # Plotar o gráfico de barras
-    sns.barplot(
-        x=top_10_pos_reforma['indice'], 
-        y=top_10_pos_reforma['percentual_aumento'], 
-        palette='viridis', dodge=False, ax=ax
+    # Intervalo de confiança de 95% da valorização de cada casa
+    st.dataframe(
+        top_10_pos_reforma[['indice', 'price', 'uplift', 'uplift_ic_inferior', 'uplift_ic_superior', 'preco_pos_reforma']],
+        hide_index=True
     )
 
-    # Adicionar rótulos com o valor pós-reforma no topo das barras
-    for i, row in top_10_pos_reforma.iterrows():
-        ax.text(i, row['percentual_aumento'] + 2, f"R${row['preco_pos_reforma']:,.0f}", ha='center', fontsize=9)
-
-    # Configurar título, eixos e limites
-    ax.set_title('Percentual de Aumento do Valor Potencial Pós-Reforma', fontsize=14)
-    ax.set_xlabel('Casas (Índice)', fontsize=12)
-    ax.set_ylabel('Percentual de Aumento (%)', fontsize=12)
-    ax.grid(axis='y', linestyle='--', alpha=0.7)
-
-    # Ajustar layout para Streamlit
-    plt.tight_layout()
-
-    # Exibir o gráfico no Streamlit
-    st.pyplot(fig)
-
 
 # =========================================
 #         ABA 5: Análise Geográfica
 # =========================================
-with tab5:
+def aba_geografica():
     st.title("🏡 Análise Geográfica ")
     st.markdown("---")
 
-    # Carregar os dados
-    df = pd.read_csv("kc_house_data_updat.csv")
-    df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y')
-    df['year'] = df['date'].dt.year
+    # Carregar os dados e o índice espacial (mesmo cache das demais abas)
+    df = carregar_dados(versao)
+    indice_espacial = carregar_indice_espacial(versao)
 
-    # Calcular a média de preço por região
-    df['avg_price_region'] = df.groupby('zipcode')['price'].transform('mean')  
+    # Área do mapa (consulta no índice espacial)
+    st.write("### Área do Mapa")
+    col1, col2 = st.columns(2)
+    with col1:
+        lat_min, lat_max = st.slider(
+            "Latitude:",
+            min_value=float(df['lat'].min()),
+            max_value=float(df['lat'].max()),
+            value=(float(df['lat'].min()), float(df['lat'].max())),
+            step=0.01
+        )
+    with col2:
+        long_min, long_max = st.slider(
+            "Longitude:",
+            min_value=float(df['long'].min()),
+            max_value=float(df['long'].max()),
+            value=(float(df['long'].min()), float(df['long'].max())),
+            step=0.01
+        )
 
-    # Filtrar as melhores casas abaixo do preço médio
-    below_avg_price = df['price'] < df['avg_price_region']  
-    best_houses = df[below_avg_price & (df['condition'] >= 3) & (df['grade'] >= 7)]
+    # Filtrar as melhores casas abaixo do preço de referência da região (estatística regional da barra lateral)
+    estatistica = BASES_ROI[base_roi][0] if BASES_ROI[base_roi][0] != "comparaveis" else "media"
+    best_houses = selecao_geografica(
+        df, agregados.referencia(df['zipcode'], estatistica),
+        janela=(lat_min, lat_max, long_min, long_max), indice=indice_espacial,
+    )
 
     # Criar um mapa interativo com PyDeck
     st.write("### Mapa Interativo das Casas com Melhor Custo-Benefício")
-    layer = pdk.Layer(
-        "ScatterplotLayer",
-        best_houses,
-        get_position=["long", "lat"],
-        get_color=[0, 0, 255, 140],
-        get_radius=100,
-        pickable=True,
-        tooltip=True,
+    limite_pontos = st.number_input(
+        "Máximo de casas exibidas individualmente (acima disso o mapa agrega em grade):",
+        min_value=100,
+        value=LIMITE_PONTOS,
+        step=1000
     )
+    layer, tooltip = camada_mapa(best_houses, limite_pontos)
     view_state = pdk.ViewState(
-        latitude=df['lat'].mean(),
-        longitude=df['long'].mean(),
+        latitude=(lat_min + lat_max) / 2,
+        longitude=(long_min + long_max) / 2,
         zoom=10,
         pitch=0,
     )
     r = pdk.Deck(
         layers=[layer], 
         initial_view_state=view_state,
-        tooltip={
-            "html": "<b>Preço:</b> ${price}<br><b>Média da Região:</b> ${avg_price_region}<br><b>Condição:</b> {condition}<br><b>Quartos:</b> {bedrooms}<br><b>Banheiros:</b> {bathrooms}",
-            "style": {"color": "white"}
-        }
+        tooltip=tooltip
     )
-    st.pydeck_chart(r)
+    with etapa("mapa:pydeck"):
+        st.pydeck_chart(r)
 
     # Mostrar DataFrame com os imóveis selecionados
     st.write("### Casas Selecionadas para Compra")
-    st.dataframe(best_houses[['price', 'avg_price_region', 'zipcode', 'bedrooms', 'bathrooms', 'condition', 'grade', 'view', 'waterfront']].head(20))
+    with etapa("tabela:melhores_casas"):
+        st.dataframe(best_houses[['price', 'avg_price_region', 'zipcode', 'bedrooms', 'bathrooms', 'condition', 'grade', 'view', 'waterfront']].head(20))
+
+    # Vendas comparáveis próximas de uma casa recomendada
+    final_selection_filtered = carregar_selecao(versao, base_roi, criterios)
+    st.write("### Vendas Comparáveis num Raio")
+    if final_selection_filtered.empty:
+        st.info("Nenhuma casa recomendada para comparar com os critérios atuais.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            casa = st.selectbox("Casa recomendada (índice):", final_selection_filtered.index.tolist())
+        with col2:
+            raio_km = st.slider("Raio (km):", min_value=0.5, max_value=10.0, value=2.0, step=0.5)
+
+        posicoes, distancias = indice_espacial.raio(float(df.at[casa, 'lat']), float(df.at[casa, 'long']), raio_km)
+        comparaveis = df.iloc[posicoes].assign(distancia_km=distancias)
+        comparaveis = comparaveis[comparaveis.index != casa]
+
+        cols = st.columns(3)
+        cols[0].metric("Vendas no Raio", comparaveis.shape[0])
+        cols[1].metric("Preço Médio no Raio", f"${comparaveis['price'].mean():,.0f}" if not comparaveis.empty else "-")
+        cols[2].metric("Preço da Casa", f"${df.at[casa, 'price']:,.0f}")
+        st.dataframe(comparaveis[['distancia_km', 'price', 'sqft_living', 'bedrooms', 'bathrooms', 'condition', 'grade', 'zipcode']].head(20))
 
 # =========================================
 #         ABA 6: Insights 
 # =========================================
 
-with tab6:
+def aba_insights():
     st.title("📊 Insights e Recomendações")
     st.markdown("---")
     
@@ -572,7 +748,8 @@ with tab6:
     st.write("O CEO da House Rocket pode focar em adquirir imóveis que ofereçam boas características (qualidade de construção e condições favoráveis) a preços abaixo da média regional. As casas recomendadas para compra, localizadas no CEP 98001, apresentam preços abaixo da média regional, o que representa uma excelente oportunidade de investimento, com boas margens de valorização. As propriedades são consistentes em termos de características, com predominância de 3 ou 4 quartos e pelo menos 2 banheiros, o que atende a uma grande demanda do mercado, especialmente para famílias.")
 
     st.subheader("Valorização e Reforma")
-    st.write("Com relação ao impacto das reformas, é importante considerar que melhorias na qualidade (grau) têm um impacto muito maior no preço do que as melhorias na condição do imóvel. As reformas de qualidade podem resultar em aumentos significativos no valor das propriedades, especialmente para casas com classificação baixa, como grau 5, que podem ser elevadas para grau 6, com um incremento médio no preço de até $219.000.")
+    uplift_grau_5 = carregar_uplift(versao, 0, 1)[df['grade'].to_numpy() == 5]['uplift'].mean()
+    st.write("Com relação ao impacto das reformas, é importante considerar que melhorias na qualidade (grau) têm um impacto muito maior no preço do que as melhorias na condição do imóvel. As reformas de qualidade podem resultar em aumentos significativos no valor das propriedades, especialmente para casas com classificação baixa, como grau 5, que podem ser elevadas para grau 6, com um incremento médio estimado no preço de $" + f"{uplift_grau_5:,.0f}".replace(",", ".") + ".")
 
     st.subheader("Melhor Momento para Venda e Compra")
     st.write("A análise sazonal revela que o melhor mês para vender é abril, quando os preços médios atingem seu pico, e o melhor mês para compra é Dezembro a Fevereiro. Isso indica uma janela estratégica para maximizar o lucro na revenda das propriedades adquiridas.")
@@ -582,3 +759,87 @@ with tab6:
     st.write("- Reformas focadas na qualidade (grau) são mais rentáveis e devem ser priorizadas, pois têm um impacto substancial no preço.")
     st.write("- Monitorar o mercado e vender em abril pode otimizar os retornos, aproveitando a valorização sazonal do mercado imobiliário.")
     st.write("Com essas estratégias, o CEO da House Rocket pode maximizar seus lucros, investindo em propriedades com alto potencial de valorização e aproveitando as melhores condições do mercado.")
+
+
+# =========================================
+#     Navegação: só a aba aberta executa
+# =========================================
+ABAS = {
+    "📌 Contexto do Negócio": aba_contexto,
+    "🏡 Estratégia de Compra": aba_estrategia_compra,
+    "📈 Melhor Momento para Compra e Venda": aba_sazonalidade,
+    "🛠️ Impacto das Reformas": aba_reformas,
+    "🗺️ Análise Geográfica": aba_geografica,
+    "🎯 Insights": aba_insights,
+}
+
+# Medição de tempo, memória e cache deste rerun (painel de diagnóstico na barra lateral).
+# Um rerun interrompido por outro evento de widget termina com exceção (RerunException/StopException):
+# o finally garante que a medição seja encerrada e o tracemalloc liberado mesmo assim.
+medicoes = Medicoes("painel", medir_memoria=st.session_state.get("medir_memoria", False)).iniciar()
+try:
+    # Anexar vendas novas da pasta de entrada antes de resolver a versão dos dados
+    with etapa("ingestao"):
+        ingerir_novas_vendas()
+    with etapa("versao"):
+        versao = versao_dados()
+    df = carregar_dados(versao)
+    agregados = carregar_agregados(versao)
+
+    # Critérios de compra (barra lateral)
+    st.sidebar.header("🔎 Critérios de Compra")
+    base_roi = st.sidebar.selectbox("Base do ROI", list(BASES_ROI))
+    motor_triagem = carregar_motor_triagem(versao, base_roi)
+    criterios = CriteriosCompra(
+        grade_min=st.sidebar.slider("Qualidade mínima (Grade)", 1, 13, 7),
+        condition_min=st.sidebar.slider("Condição mínima", 1, 5, 3),
+        quartos=tuple(st.sidebar.multiselect("Quartos", np.unique(motor_triagem.colunas["bedrooms"]).tolist(), default=[3, 4])),
+        banheiros_min=st.sidebar.slider("Banheiros mínimos", 0, 6, 2),
+        zipcodes=tuple(st.sidebar.multiselect("CEPs (vazio = todos)", agregados.por_zipcode.index.tolist(), default=[98001])),
+        top_k_por_zipcode=st.sidebar.number_input("Máximo de casas por CEP (0 = sem limite)", min_value=0, value=0),
+        limite=st.sidebar.number_input("Quantidade de casas recomendadas", min_value=1, value=20),
+    )
+
+    for (nome_aba, desenhar_aba), aba in zip(ABAS.items(), st.tabs(list(ABAS), key="aba", on_change="rerun")):
+        with aba:
+            if aba.open:
+                with etapa(f"aba:{nome_aba}"):
+                    desenhar_aba()
+
+    # =========================================
+    #   Qualidade dos dados (barra lateral)
+    # =========================================
+    with st.sidebar.expander("🧹 Qualidade dos dados"):
+        with etapa("qualidade"):
+            marcas = carregar_qualidade(versao)
+        st.dataframe(resumo_qualidade(marcas), width="stretch")
+        st.caption("Vendas impossíveis, duplicadas ou de preço extremo ficam fora da mediana, da média aparada "
+                   "e dos percentis por CEP (a média usa todas); "
+                   f"preço extremo = mais de {LIMITE_MAD:g} desvios absolutos medianos do log do preço no CEP.")
+        st.download_button("Exportar vendas marcadas (CSV)", carregar_csv_qualidade(versao),
+                            file_name="qualidade_house_rocket.csv", mime="text/csv")
+finally:
+    # Fim da parte medida: o painel de diagnóstico só exibe as medições deste rerun
+    medicoes.finalizar()
+
+if os.environ.get("HOUSE_ROCKET_METRICAS"):
+    medicoes.exportar(os.environ["HOUSE_ROCKET_METRICAS"])
+
+# =========================================
+#   Painel de diagnóstico (barra lateral)
+# =========================================
+with st.sidebar.expander("🛠️ Diagnóstico de desempenho"):
+    st.checkbox("Medir memória alocada (tracemalloc, mais lento)", key="medir_memoria")
+    st.metric("Tempo deste rerun", f"{medicoes.total_s:.2f} s")
+    st.dataframe(medicoes.tabela_etapas(), hide_index=True, width="stretch",
+                 column_config={c: st.column_config.NumberColumn(format="%.3f") for c in ("tempo_s", "rss_pico_mb", "alocado_pico_processo_mb")})
+    st.write("Cache neste rerun")
+    st.dataframe(medicoes.tabela_cache(), width="stretch")
+    uso = resultados.uso()
+    st.write(f"Cache de resultados: {uso['itens']} itens, {uso['bytes'] / 2**20:.1f} de {uso['limite_bytes'] / 2**20:.0f} MB, "
+             f"{uso['acertos']} acertos em memória, {uso['acertos_disco']} em disco, {uso['falhas']} falhas, "
+             f"{uso['despejos']} despejos")
+    st.write(f"Acumulado do processo ({acumulado.execucoes} reruns)")
+    st.dataframe(acumulado.tabela().head(15), width="stretch")
+    st.download_button("Exportar medições (JSON)", medicoes.para_json(), file_name="metricas_house_rocket.json",
+                       mime="application/json")